@@ -0,0 +1,227 @@
+"""
+Pre-generates QR codes in bulk from a CSV or JSONL file, without going through the API.
+
+Usage:
+    python -m app.bulk INPUT [--format csv|jsonl] [--workers N] [--checkpoint PATH]
+
+Every row is a QRCodeRequest: CSV files need a header row with a `url` column
+and may have fill_color, back_color, size, format, error_correction, mask and
+ttl columns; JSONL files hold one JSON object per line. Pass "-" as INPUT to read
+from stdin.
+
+Codes are rendered on a process pool using every core, stored in the storage backend
+under the same names the API uses, and recorded in the index. Codes that
+already exist are skipped, and progress is checkpointed next to the input
+so an interrupted run resumes where it stopped. The input is streamed, with
+a bounded number of rows in flight, so memory stays flat however large it is.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple, Union
+from pydantic import ValidationError
+from app.config import settings
+from app.schema import QRCodeRequest
+from app.services.qr_index import QRCodeIndex, is_expired
+from app.services.qr_service import generate_qr_code
+from app.services.storage import write_file_atomic
+from app.utils.common import qr_code_filename
+
+logger = logging.getLogger(__name__)
+
+
+def read_rows(stream: TextIO, format: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the rows of a CSV or JSONL stream one at a time.
+    Empty CSV cells are left out so the QRCodeRequest defaults apply.
+    """
+    if format == "csv":
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if key and value not in (None, "")}
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _render_rows(rows: List[Tuple[str, str, str, str, int, str, str, Union[str, int]]]) -> List[Union[int, str]]:
+    """
+    Renders and stores a chunk of QR codes in a pool worker.
+    Only the image size, or the error message, of each code travels back, never the image.
+    """
+    results = []
+    for data, qr_filename, fill_color, back_color, size, format, error_correction, mask in rows:
+        try:
+            results.append(len(generate_qr_code(
+                data, qr_filename, fill_color, back_color, size, format=format, error_correction=error_correction, mask=mask
+            )))
+        except Exception as e:
+            results.append(str(e))
+    return results
+
+
+class Checkpoint:
+    """
+    Number of leading input rows that have been fully processed, persisted to a file.
+
+    Rows finish out of order, so the checkpoint only advances past a row once
+    every row before it has finished too.
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.rows = 0
+        if path is not None and path.exists():
+            self.rows = json.loads(path.read_text())["rows"]
+
+    def save(self, rows: int):
+        self.rows = rows
+        if self.path is not None:
+            write_file_atomic(self.path, json.dumps({"rows": rows}).encode())
+
+
+def run(stream: TextIO, format: str, index: QRCodeIndex, workers: int, checkpoint: Checkpoint,
+        chunk_size: int = 32, progress_interval: float = 5.0) -> Dict[str, int]:
+    """
+    Renders every row of `stream` that does not exist yet.
+    Parameters:
+    - stream (TextIO): The CSV or JSONL input.
+    - format (str): "csv" or "jsonl".
+    - index (QRCodeIndex): The index of stored QR codes, used to skip existing ones and updated with new ones.
+    - workers (int): Number of render processes.
+    - chunk_size (int): Number of rows sent to a worker at once.
+    - checkpoint (Checkpoint): Where to resume from, and where progress is recorded.
+    - progress_interval (float): Seconds between progress reports and checkpoint saves.
+
+    Returns:
+    - Counts of "rendered", "skipped" (already existing) and "failed" rows.
+    """
+    counts = {"rendered": 0, "skipped": 0, "failed": 0}
+    # Rows are sent to the workers in chunks to spread the cost of each round trip, and
+    # only read while fewer than `max_in_flight` chunks are pending, which bounds memory
+    max_in_flight = workers * 2
+    chunk: List[Tuple[int, str, QRCodeRequest]] = []
+    in_flight: Dict[Future, List[Tuple[int, str, QRCodeRequest]]] = {}
+    in_flight_rows = set()
+    in_flight_filenames = set()
+    start = last_report = time.monotonic()
+    next_row = checkpoint.rows
+
+    def finish(done):
+        entries = []
+        for future in done:
+            rows = in_flight.pop(future)
+            in_flight_rows.discard(rows[0][0])
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [str(e)] * len(rows)
+            for (row_number, qr_filename, request), result in zip(rows, results):
+                in_flight_filenames.discard(qr_filename)
+                if isinstance(result, int):
+                    entries.append((qr_filename, request.url, request.fill_color, request.back_color, request.size, result,
+                                    request.error_correction, str(request.mask),
+                                    time.time() + request.ttl if request.ttl else None))
+                    counts["rendered"] += 1
+                else:
+                    logger.error(f"Row {row_number + 1}: failed to render {request.url}: {result}")
+                    counts["failed"] += 1
+        index.add_many(entries)
+
+    def submit():
+        if len(in_flight) >= max_in_flight:
+            finish(wait(in_flight, return_when=FIRST_COMPLETED).done)
+        future = executor.submit(_render_rows, [
+            (request.url, qr_filename,
+             request.fill_color, request.back_color, request.size, request.format, request.error_correction, request.mask)
+            for _, qr_filename, request in chunk
+        ])
+        in_flight[future] = list(chunk)
+        in_flight_rows.add(chunk[0][0])
+        chunk.clear()
+
+    def report(final: bool = False):
+        processed = sum(counts.values())
+        elapsed = max(time.monotonic() - start, 1e-9)
+        checkpoint.save(min(in_flight_rows, default=chunk[0][0] if chunk else next_row))
+        logger.info(
+            f"{'Finished' if final else 'Progress'}: {processed} row(s) in {elapsed:.1f}s "
+            f"({processed / elapsed:.0f} rows/s), {counts['rendered']} rendered, "
+            f"{counts['skipped']} skipped, {counts['failed']} failed"
+        )
+
+    rows = read_rows(stream, format)
+    if checkpoint.rows:
+        logger.info(f"Resuming after row {checkpoint.rows}")
+        for _ in zip(range(checkpoint.rows), rows):
+            pass
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for row in rows:
+            row_number = next_row
+            next_row += 1
+            try:
+                request = QRCodeRequest.model_validate(row)
+            except ValidationError as e:
+                logger.error(f"Row {row_number + 1}: invalid QR code request: {e.errors(include_url=False)}")
+                counts["failed"] += 1
+                continue
+
+            qr_filename = qr_code_filename(request.url, request.fill_color, request.back_color, request.size,
+                                           request.format, request.error_correction, request.mask)
+            entry = index.get(qr_filename)
+            if qr_filename in in_flight_filenames or (entry is not None and not is_expired(entry)):
+                counts["skipped"] += 1
+                continue
+
+            chunk.append((row_number, qr_filename, request))
+            in_flight_filenames.add(qr_filename)
+            if len(chunk) >= chunk_size:
+                submit()
+
+            if time.monotonic() - last_report >= progress_interval:
+                last_report = time.monotonic()
+                report()
+
+        if chunk:
+            submit()
+        finish(wait(in_flight).done)
+    report(final=True)
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate QR codes from a CSV or JSONL file.")
+    parser.add_argument("input", help='CSV or JSONL file of QR code requests, or "-" for stdin')
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input format (default: from the file extension)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of render processes (default: all cores)")
+    parser.add_argument("--checkpoint", type=Path, help="progress file (default: INPUT.checkpoint; none for stdin)")
+    parser.add_argument("--chunk-size", type=int, default=32, help="rows sent to a render process at once")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between progress reports")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # Per-code log lines from the render workers would drown out the progress reports
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    format = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    checkpoint_path = args.checkpoint or (None if args.input == "-" else Path(args.input + ".checkpoint"))
+    index = QRCodeIndex(settings.QR_INDEX_PATH, settings.QR_DIRECTORY)
+    try:
+        with (sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")) as stream:
+            counts = run(stream, format, index, max(1, args.workers), Checkpoint(checkpoint_path),
+                         max(1, args.chunk_size), args.progress_interval)
+    finally:
+        index.close()
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ from pathlib import Path
 import os
 from pydantic_settings import BaseSettings
 import secrets
+from typing import List, Literal, Optional
 
 class Settings(BaseSettings):
     # Base directory for the project
@@ -11,15 +12,108 @@ class Settings(BaseSettings):
     QR_DIRECTORY: Path = BASE_DIR / "qr_codes"
     SERVER_BASE_URL: str = os.getenv("SERVER_BASE_URL", "http://localhost:8000")
     SERVER_DOWNLOAD_FOLDER: str = "downloads"
+    # "flat" stores every QR code directly in QR_DIRECTORY under a URL-derived name,
+    # "sharded" stores them as ab/cd/<hash>.png (see `python -m app.migrate_storage`)
+    QR_STORAGE_LAYOUT: Literal["flat", "sharded"] = "flat"
+    # Durability of stored QR codes: "none" leaves flushing to the OS, "file" fsyncs each image
+    # before renaming it into place, "full" also fsyncs the directory so the rename survives a crash
+    QR_FSYNC: Literal["none", "file", "full"] = "file"
+    # "directory" stores each QR code as a file in QR_DIRECTORY, served by nginx; "segments" packs
+    # them into append-only segment files in QR_SEGMENT_DIRECTORY, served by the app's download route
+    QR_STORAGE_BACKEND: Literal["directory", "segments"] = "directory"
+    QR_SEGMENT_DIRECTORY: Path = BASE_DIR / "qr_segments"
+    # Size after which a new segment is started
+    QR_SEGMENT_MAX_BYTES: int = 64 * 1024 * 1024
+    # Fraction of a segment taken by deleted codes from which the sweeper compacts it
+    QR_SEGMENT_COMPACT_RATIO: float = 0.5
+    # SQLite index of stored QR codes, used for listing
+    QR_INDEX_PATH: Path = BASE_DIR / "qr_index.sqlite"
+    # Page sizes for listing QR codes
+    LIST_DEFAULT_LIMIT: int = 100
+    LIST_MAX_LIMIT: int = 1000
     
     # Authentication settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # bcrypt cost factor used when hashing passwords (each step doubles the verification time)
+    BCRYPT_ROUNDS: int = 12
+    # Password verifications allowed to run at once, and how long a login may wait for one (seconds)
+    LOGIN_POOL_SIZE: int = 2
+    LOGIN_QUEUE_TIMEOUT: float = 2.0
+    # Number of verified access tokens remembered so their signature is not checked on every request
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
     
     # Admin credentials
     ADMIN_USER: str = os.getenv("ADMIN_USER", "admin")
     ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD", "admin123")
+    # Precomputed bcrypt hash of ADMIN_PASSWORD; when unset it is computed once per worker at startup
+    ADMIN_PASSWORD_HASH: Optional[str] = None
+
+    # "fast" rasterizes QR codes with array operations, "pil" draws them through qrcode's PIL image factory
+    QR_RENDER_ENGINE: Literal["fast", "pil"] = "fast"
+
+    # Also store a gzip-compressed copy of every SVG QR code, for nginx gzip_static
+    QR_SVG_GZIP_SIDECAR: bool = False
+
+    # Render pool settings
+    # Number of worker processes used to render QR codes (0 renders on a thread in-process)
+    RENDER_POOL_SIZE: int = os.cpu_count() or 1
+    # Number of renders allowed to wait for a free worker before new ones are rejected
+    RENDER_QUEUE_DEPTH: int = 64
+    # Memory cap for the in-process cache of recently rendered QR codes (0 disables it)
+    RENDER_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Memory cap for each render worker's cache of computed QR module matrices, which lets
+    # the same data rendered in other colors, sizes or formats skip encoding (0 disables it)
+    MATRIX_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    # Cache-Control header sent with images from the on-the-fly render endpoint
+    RENDER_CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+    # Lock files that let workers on the same host coalesce identical renders (unset to disable),
+    # and how many of them keys are spread over
+    RENDER_LOCK_DIR: Optional[Path] = BASE_DIR / "locks"
+    RENDER_LOCK_STRIPES: int = 1024
+    # Maximum number of items of one batch request rendered concurrently
+    BATCH_MAX_CONCURRENCY: int = 16
+    # Longest line accepted in an NDJSON batch request, in bytes
+    BATCH_MAX_LINE_BYTES: int = 64 * 1024
+
+    # Admission control settings, per worker
+    # Requests handled at once before new ones are shed with 503 (0 disables admission control)
+    ADMISSION_MAX_IN_FLIGHT: int = 512
+    # Share of those slots kept for cheap requests, which render requests may not take
+    ADMISSION_RESERVED_SHARE: float = 0.25
+    # Bounds of the adaptive limit on render requests handled at once, which shrinks while their
+    # recent average latency is above the target (seconds) and grows back while it is below
+    ADMISSION_RENDER_MIN_IN_FLIGHT: int = 4
+    ADMISSION_RENDER_MAX_IN_FLIGHT: int = 128
+    ADMISSION_RENDER_TARGET_LATENCY: float = 1.0
+    # Routes of the render class, as "METHOD /path"
+    ADMISSION_RENDER_ROUTES: List[str] = ["POST /qr-codes/", "POST /qr-codes/batch", "GET /qr-codes/render"]
+
+    # Retention settings
+    # Total size of stored QR codes above which the least recently used ones are evicted (unset for no quota)
+    QR_DISK_QUOTA_BYTES: Optional[int] = None
+    # Longest TTL a QR code may be created with, in seconds
+    QR_MAX_TTL: int = 365 * 24 * 3600
+    # Seconds between two sweeps for expired QR codes and quota overruns
+    SWEEP_INTERVAL: float = 60.0
+    # Codes removed per batch, and seconds of rest between batches, so a large backlog is worked
+    # off gradually instead of holding up requests
+    SWEEP_BATCH_SIZE: int = 100
+    SWEEP_BATCH_PAUSE: float = 0.1
+
+    # Metrics settings
+    # Directory where each worker shares its metrics with the others; unset for a single process
+    METRICS_DIR: Optional[Path] = None
+    # Minimum number of seconds between two metrics snapshots of a worker
+    METRICS_FLUSH_INTERVAL: float = 5.0
+
+    # Profiling settings
+    # Directory where profile reports are written, keeping only the newest PROFILE_MAX_REPORTS
+    PROFILE_DIR: Path = BASE_DIR / "profiles"
+    PROFILE_MAX_REPORTS: int = 50
+    # Profile 1 in N QR code creations (0 disables sampling)
+    PROFILE_SAMPLE_RATE: int = 0
 
     class Config:
         env_file = ".env"
@@ -27,9 +121,6 @@ class Settings(BaseSettings):
 # Create settings instance
 settings = Settings()
 
-# Create QR code directory if it doesn't exist
-settings.QR_DIRECTORY.mkdir(parents=True, exist_ok=True)
-
 # Export commonly used settings
 QR_DIRECTORY = settings.QR_DIRECTORY
 SERVER_BASE_URL = settings.SERVER_BASE_URL
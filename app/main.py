@@ -1,19 +1,32 @@
+import asyncio
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import qr_code, oauth
+from fastapi.responses import ORJSONResponse
+from app.middleware import AdmissionMiddleware, MetricsMiddleware, RequestIdMiddleware
+from app.routers import downloads, metrics, profiles, qr_code, oauth
 from app.config import settings
+from app.services.render_executor import render_executor
+from app.services.qr_index import qr_index
+from app.services.storage import get_storage
+from app.services.sweeper import sweeper
+from app.services.metrics import metrics as metrics_registry
+from app.utils.common import setup_logging, stop_logging
 import logging
 
-# Configure logging
+# Logging until setup_logging configures it from logging.conf at startup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="QR Code Generator API",
     description="An API for generating, managing, and retrieving QR codes",
-    version="1.0.0"
+    version="1.0.0",
+    # Responses are serialized with orjson, which is several times faster than the json module
+    default_response_class=ORJSONResponse
 )
 
+# Innermost, so requests it sheds still get CORS headers and are timed by MetricsMiddleware
+app.add_middleware(AdmissionMiddleware)
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -22,20 +35,44 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
+# Added last so it wraps every other middleware and times the whole request
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(oauth.router, tags=["Authentication"])
 app.include_router(qr_code.router, prefix="/qr-codes", tags=["QR Codes"])
+app.include_router(metrics.router, tags=["Metrics"])
+app.include_router(profiles.router, prefix="/profiles", tags=["Profiling"])
+app.include_router(downloads.router, prefix=f"/{settings.SERVER_DOWNLOAD_FOLDER}", tags=["Downloads"])
 
 @app.on_event("startup")
 async def startup_event():
-    """Create necessary directories on startup"""
+    """Configure logging, create necessary directories, start hashing the admin password, create the login semaphore in this worker's loop, backfill the QR code index and start the sweeper on startup"""
+    setup_logging()
     try:
         settings.QR_DIRECTORY.mkdir(parents=True, exist_ok=True)
         logger.info(f"QR code directory created/verified at {settings.QR_DIRECTORY}")
     except Exception as e:
         logger.error(f"Failed to create QR code directory: {e}")
         raise
+    # Runs on the password pool, so the worker starts serving before the hash is ready
+    oauth.hash_admin_password()
+    oauth.password_slots()
+    # Indexes codes stored before the index existed; a no-op once done, and other workers
+    # starting meanwhile wait for the first one's scan instead of repeating it
+    await asyncio.get_running_loop().run_in_executor(None, qr_index.backfill, get_storage())
+    sweeper.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the sweeper and the render pool workers, close the QR code index and storage, withdraw this worker's metrics and write out queued log records"""
+    await sweeper.stop()
+    render_executor.shutdown()
+    qr_index.close()
+    get_storage().close()
+    metrics_registry.remove_snapshot()
+    stop_logging()
 
 @app.get("/", tags=["Root"])
 async def root():
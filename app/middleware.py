@@ -0,0 +1,134 @@
+import time
+import uuid
+from typing import Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.services.admission import AdmissionController, admission
+from app.services.metrics import metrics, request_latency
+from app.utils.log_handlers import request_id
+
+# Body of the 503 responses of shed requests, shaped like HTTPException responses
+SHED_BODY = b'{"detail":"The server is overloaded, please retry shortly"}'
+# Longest X-Request-ID accepted from clients; longer or non-printable ones are replaced
+MAX_REQUEST_ID_LENGTH = 64
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording the latency of every HTTP request by method, route and status.
+
+    Routes are labelled with their path template (e.g. /qr-codes/{qr_filename}) rather than
+    the requested path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            request_latency.observe(
+                time.perf_counter() - start,
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            )
+            metrics.maybe_flush()
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware giving every HTTP request an id, which is attached to the log records
+    written while handling it and returned in the X-Request-ID response header.
+
+    The id comes from the X-Request-ID request header when there is a sensible one (nginx sets
+    it from $request_id), so log lines of the proxy and the app can be matched up.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = next((value for name, value in scope["headers"] if name == b"x-request-id"), b"")
+        if incoming and len(incoming) <= MAX_REQUEST_ID_LENGTH and incoming.isascii() and incoming.decode().isprintable():
+            current = incoming.decode()
+        else:
+            current = uuid.uuid4().hex
+        header = (b"x-request-id", current.encode())
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), header]
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware applying admission control: requests the controller does not admit
+    are answered right away with 503 and a Retry-After header, before any work is done for them.
+    Admitted requests report back, when they finish, how long it took until their response
+    started: queueing plus rendering for single renders, but not the streaming of a batch's
+    results. 5xx responses are left out, as their latency says nothing about queueing.
+
+    Parameters:
+    - controller (Optional[AdmissionController]): Defaults to this worker's controller.
+    """
+
+    def __init__(self, app: ASGIApp, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.controller.route_class(scope["method"], scope["path"])
+        if self.controller.admit(route_class) is not None:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(self.controller.retry_after(route_class)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": SHED_BODY})
+            return
+
+        start = time.perf_counter()
+        latency = None
+
+        async def send_wrapper(message: Message):
+            nonlocal latency
+            if message["type"] == "http.response.start" and message["status"] < 500:
+                latency = time.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.controller.release(route_class, latency)
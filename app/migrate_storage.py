@@ -0,0 +1,104 @@
+"""
+Moves QR codes stored in the flat layout into the sharded layout.
+
+Usage:
+    python -m app.migrate_storage [--dry-run]
+
+Run it once after switching QR_STORAGE_LAYOUT to "sharded". It is safe to run
+while the API is serving: every file is moved with a single atomic rename,
+and until a file has been moved the API keeps resolving its old flat name.
+"""
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+from app.config import settings
+from app.services.qr_index import QRCodeIndex
+from app.utils.common import QR_CODE_EXTENSIONS, decode_qr_code_filename, is_sharded_filename, qr_code_filename, qr_code_relpath
+
+
+def _sharded_filename(qr_filename: str, index: QRCodeIndex) -> Optional[str]:
+    """
+    Works out the sharded name of a flat QR code file, or None if its style is unknown.
+    """
+    format = qr_filename.rsplit(".", 1)[1]
+    entry = index.get(qr_filename)
+    if entry is not None and entry["size"] is not None:
+        return qr_code_filename(
+            entry["url"], entry["fill_color"], entry["back_color"], entry["size"], format,
+            entry["error_correction"] or "M", entry["mask"] or "auto", layout="sharded"
+        )
+    if qr_filename.count(".") == 1:
+        # Flat names without a style hash are always in the default style
+        return qr_code_filename(decode_qr_code_filename(qr_filename), format=format, layout="sharded")
+    return None
+
+
+def migrate(directory: Path, index: QRCodeIndex, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Moves every flat QR code in `directory` to its sharded location and updates the index.
+    Parameters:
+    - directory (Path): The QR code directory.
+    - index (QRCodeIndex): The index describing the directory.
+    - dry_run (bool): Only report what would be moved.
+
+    Returns:
+    - Counts of "moved", "duplicates" (already present in the sharded layout) and "skipped" files.
+    """
+    counts = {"moved": 0, "duplicates": 0, "skipped": 0}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(QR_CODE_EXTENSIONS) or not entry.is_file() or is_sharded_filename(entry.name):
+                continue
+            try:
+                new_filename = _sharded_filename(entry.name, index)
+            except Exception:
+                new_filename = None
+            if new_filename is None:
+                logging.warning(f"Skipping {entry.name}: its URL or style is unknown")
+                counts["skipped"] += 1
+                continue
+            target = directory / qr_code_relpath(new_filename)
+            if dry_run:
+                counts["moved"] += 1
+                continue
+            stat = entry.stat()
+            sidecar = Path(entry.path + ".gz")
+            if target.exists():
+                os.unlink(entry.path)
+                sidecar.unlink(missing_ok=True)
+                counts["duplicates"] += 1
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if sidecar.exists():
+                    os.replace(sidecar, target.with_name(target.name + ".gz"))
+                os.replace(entry.path, target)
+                counts["moved"] += 1
+            if index.get(entry.name) is None and index.get(new_filename) is None:
+                # Never indexed, e.g. stored before the index was backfilled; indexed like the backfill would
+                index.add_existing(entry.name, stat.st_size, stat.st_mtime)
+            index.rename(entry.name, new_filename)
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Move QR codes from the flat layout into the sharded layout.")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be moved")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if settings.QR_STORAGE_LAYOUT != "sharded":
+        logging.warning("QR_STORAGE_LAYOUT is not 'sharded'; new QR codes will still be stored flat")
+    index = QRCodeIndex(settings.QR_INDEX_PATH, settings.QR_DIRECTORY)
+    try:
+        counts = migrate(settings.QR_DIRECTORY, index, dry_run=args.dry_run)
+    finally:
+        index.close()
+    logging.info(f"Moved {counts['moved']}, removed {counts['duplicates']} duplicate(s), skipped {counts['skipped']} QR code(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import Response
+from app.config import settings
+from app.services.qr_index import qr_index
+from app.services.storage import get_storage
+from app.utils.common import QR_CODE_MEDIA_TYPES, etag_matches, qr_code_etag, qr_code_relpath
+from app.utils.responses import FileRegionResponse
+
+router = APIRouter()
+
+
+@router.api_route("/{qr_path:path}", methods=["GET", "HEAD"], response_class=FileRegionResponse)
+async def download_qr_code(qr_path: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Serves a stored QR code image at its download URL.
+    With the directory backend nginx serves these URLs straight from QR_DIRECTORY; with the
+    segments backend they reach the app, which streams the image's region of its segment file.
+    """
+    qr_filename = qr_path.rsplit("/", 1)[-1]
+    media_type = QR_CODE_MEDIA_TYPES.get(qr_filename.rsplit(".", 1)[-1])
+    # Only the path a code is linked under is accepted, never other files
+    if media_type is None or qr_code_relpath(qr_filename) != qr_path:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR code not found")
+    headers = {"Cache-Control": settings.RENDER_CACHE_CONTROL}
+    # The ETag names the stored version, which only the index knows, as a later renderer may
+    # store different bytes under the same name. Looked up first, so that if the code is stored
+    # again meanwhile the ETag is the older one and the client revalidates.
+    entry = qr_index.get(qr_filename)
+    if entry is not None:
+        headers["ETag"] = qr_code_etag(qr_filename, entry["created_at"])
+    try:
+        file, offset, length = get_storage().open_region(qr_filename)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR code not found")
+    if entry is not None and etag_matches(if_none_match, headers["ETag"]):
+        file.close()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileRegionResponse(file, offset, length, headers=headers, media_type=media_type)
@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.matrix_cache import worker_stats_total
+from app.services.metrics import metrics
+from app.services.qr_index import qr_index
+from app.services.render_executor import render_executor
+
+router = APIRouter()
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+metrics.gauge(
+    "qr_render_queue_depth", "Number of renders running or waiting for a render worker",
+    lambda: render_executor.pending
+)
+# Read from the index instead of scanning QR_DIRECTORY, and only by the worker answering the scrape
+metrics.gauge("qr_codes_stored", "Number of QR codes stored in QR_DIRECTORY", lambda: qr_index.totals()[0], shared=True)
+metrics.gauge("qr_codes_stored_bytes", "Total size of the QR codes stored in QR_DIRECTORY", lambda: qr_index.totals()[1], shared=True)
+# Reported by the render workers with every render; the hit rate is
+# rate(qr_matrix_cache_hits_total) / (rate(qr_matrix_cache_hits_total) + rate(qr_matrix_cache_misses_total))
+metrics.gauge("qr_matrix_cache_hits_total", "Renders that reused a cached QR module matrix", lambda: worker_stats_total("hits"), kind="counter")
+metrics.gauge("qr_matrix_cache_misses_total", "Renders that had to compute the QR module matrix", lambda: worker_stats_total("misses"), kind="counter")
+metrics.gauge("qr_matrix_cache_entries", "Number of QR module matrices cached by the render workers", lambda: worker_stats_total("entries"))
+metrics.gauge("qr_matrix_cache_bytes", "Memory used by the render workers' QR module matrix caches", lambda: worker_stats_total("bytes"))
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Exposes the application's metrics, merged across workers, for Prometheus to scrape.
+    """
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
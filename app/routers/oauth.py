@@ -1,38 +1,108 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.config import settings
+from app.services.metrics import auth_latency, token_cache_requests
+from app.services.token_cache import token_cache
 
 router = APIRouter()
 
 # Security setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt is deliberately slow, so password checks run on a small dedicated thread pool
+# (bcrypt releases the GIL) and at most LOGIN_POOL_SIZE of them run at once
+password_executor = ThreadPoolExecutor(max_workers=settings.LOGIN_POOL_SIZE, thread_name_prefix="password")
+_password_slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
 # Simulated user database
+# Unless ADMIN_PASSWORD_HASH is configured, the admin's hash is filled in by hash_admin_password
+# once per process instead of at import time, so importing the app stays cheap
 fake_users_db = {
     settings.ADMIN_USER: {
         "username": settings.ADMIN_USER,
-        "hashed_password": pwd_context.hash(settings.ADMIN_PASSWORD),
+        "hashed_password": settings.ADMIN_PASSWORD_HASH,
     }
 }
+_admin_password_hash: Optional[Future] = None
+
+def hash_admin_password() -> Future:
+    """
+    Makes the admin password hash available, hashing ADMIN_PASSWORD on the password
+    thread pool the first time it is called. Returns a future resolving to the hash.
+    """
+    global _admin_password_hash
+    if _admin_password_hash is None:
+        user = fake_users_db[settings.ADMIN_USER]
+        if user["hashed_password"]:
+            _admin_password_hash = Future()
+            _admin_password_hash.set_result(user["hashed_password"])
+        else:
+            _admin_password_hash = password_executor.submit(pwd_context.hash, settings.ADMIN_PASSWORD)
+            _admin_password_hash.add_done_callback(lambda future: user.update(hashed_password=future.result()))
+    return _admin_password_hash
+
+def password_slots() -> asyncio.Semaphore:
+    """
+    Returns the semaphore that bounds concurrent password checks, created in the running event loop.
+    It is not created at import time: with preload_app the app is imported in the gunicorn master,
+    and before Python 3.10 a semaphore is bound to the loop current when it is constructed.
+    """
+    global _password_slots
+    loop = asyncio.get_running_loop()
+    if _password_slots is None or _password_slots[0] is not loop:
+        _password_slots = (loop, asyncio.Semaphore(settings.LOGIN_POOL_SIZE))
+    return _password_slots[1]
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """
+    Verifies a password on the password thread pool without blocking the event loop.
+
+    Raises:
+    - HTTPException (503): If no verification slot frees up within LOGIN_QUEUE_TIMEOUT seconds.
+    """
+    slots = password_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=settings.LOGIN_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logging.warning("Rejected login: too many password verifications in progress")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+    finally:
+        slots.release()
+
 def get_user(username: str):
     if username in fake_users_db:
         return fake_users_db[username]
     return None
 
-def authenticate_user(username: str, password: str):
+async def authenticate_user(username: str, password: str):
+    """
+    Checks a username and password without blocking the event loop, waiting for the admin
+    password hash if it is still being computed. Returns the user, or False if the credentials are wrong.
+    """
+    await asyncio.wrap_future(hash_admin_password())
     user = get_user(username)
     if not user:
         return False
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password_async(password, user["hashed_password"]):
         return False
     return user
 
@@ -46,9 +116,48 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+    Resolves the user behind a bearer token, verifying its signature and expiry.
+    Tokens that were already verified are answered from the token cache until they expire.
+    It is async so that FastAPI runs it inline instead of on the thread pool.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    start = time.perf_counter()
+    username = token_cache.get(token)
+    token_cache_requests.inc("miss" if username is None else "hit")
+    if username is None:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            raise credentials_exception
+        username = payload.get("sub")
+        if username is None or "exp" not in payload:
+            raise credentials_exception
+        token_cache.put(token, username, payload["exp"])
+        auth_latency.observe(time.perf_counter() - start, "miss")
+    else:
+        auth_latency.observe(time.perf_counter() - start, "hit")
+    user = get_user(username)
+    if user is None:
+        raise credentials_exception
+    return user
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    """
+    Like get_current_user, but only lets the admin user through.
+    """
+    if current_user["username"] != settings.ADMIN_USER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
 @router.post("/token")
 async def login_for_access_token(username: str = Form(), password: str = Form()):
-    user = authenticate_user(username, password)
+    user = await authenticate_user(username, password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
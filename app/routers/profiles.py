@@ -0,0 +1,28 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from app.config import settings
+from app.routers.oauth import get_admin_user
+from app.services.profiler import PROFILE_EXTENSION
+
+router = APIRouter()
+
+@router.get("/", response_model=List[str])
+async def list_profile_reports(current_user: dict = Depends(get_admin_user)):
+    """
+    Lists the saved profile reports, newest first.
+    """
+    if not settings.PROFILE_DIR.is_dir():
+        return []
+    return sorted((path.name for path in settings.PROFILE_DIR.glob(f"*{PROFILE_EXTENSION}")), reverse=True)
+
+@router.get("/{report_name}", response_class=PlainTextResponse)
+async def get_profile_report(report_name: str, current_user: dict = Depends(get_admin_user)):
+    """
+    Returns a saved profile report in the collapsed-stack format, ready for flamegraph.pl or speedscope.
+    """
+    report_path = settings.PROFILE_DIR / report_name
+    # Only plain report names are accepted, never paths
+    if report_path.name != report_name or not report_name.endswith(PROFILE_EXTENSION) or not report_path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile report not found")
+    return PlainTextResponse(report_path.read_text())
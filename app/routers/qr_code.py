@@ -1,108 +1,534 @@
 # Import necessary modules and functions from FastAPI and other standard libraries
-from fastapi import APIRouter, HTTPException, Depends, Response, status
-from fastapi.responses import JSONResponse
-from fastapi.security import OAuth2PasswordBearer
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, List, Optional, Tuple, Union
+from datetime import datetime, timezone
+from email.utils import formatdate
+from functools import lru_cache
+import asyncio
 import logging
+import time
+import orjson
 from pathlib import Path
 
 # Import classes and functions from our application's modules
-from app.schema import QRCodeRequest, QRCodeResponse
-from app.services.qr_service import generate_qr_code, list_qr_codes, delete_qr_code
-from app.utils.common import decode_filename_to_url, encode_url_to_filename
+from app.schema import QRCodeMetadata, QRCodeRequest, QRCodeResponse
+from app.routers.oauth import get_current_user
+from app.services.qr_service import render_qr_code, save_qr_code, delete_qr_code, with_stage_timings
+from app.services.matrix_cache import record_worker_stats
+from app.services.metrics import render_coalesced, render_stage_latency
+from app.services.profiler import profiled_call, sample_profile
+from app.services.qr_index import is_expired, qr_index
+from app.services.render_executor import render_executor, RenderQueueFullError
+from app.services.render_cache import render_cache
+from app.services.storage import get_storage
+from app.services.single_flight import host_lock, render_flights
+from app.utils.common import (
+    QR_CODE_MEDIA_TYPES, RangeNotSatisfiableError, etag_matches, not_modified, parse_byte_range, qr_code_etag,
+    qr_code_filename, qr_code_relpath
+)
+from app.utils.responses import FileRegionResponse
 from app.config import settings
 
 # Create an APIRouter instance to register our endpoints
 router = APIRouter()
 
-# Setup OAuth2 with Password (and hashing), using a simple OAuth2PasswordBearer scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# A named logger, so its success messages can be sampled in logging.conf
+logger = logging.getLogger(__name__)
+
+# Media type of newline-delimited JSON batch requests and results
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+@lru_cache(maxsize=1)
+def _link_prefixes(server_base_url: str, download_folder: str) -> Tuple[str, str]:
+    """
+    Returns the URL prefixes of QR code downloads and of the QR code resources, built once per configuration.
+    """
+    return f"{server_base_url}/{download_folder}/", f"{server_base_url}/qr-codes/"
+
+def _qr_code_links(qr_filename: str) -> Tuple[str, dict]:
+    """
+    Returns the download URL and the HATEOAS (Hypermedia As The Engine Of Application State) links for a QR code.
+    """
+    download_prefix, self_prefix = _link_prefixes(settings.SERVER_BASE_URL, settings.SERVER_DOWNLOAD_FOLDER)
+    qr_code_download_url = download_prefix + qr_code_relpath(qr_filename)
+    links = {
+        "self": self_prefix + qr_filename,
+        "download": qr_code_download_url
+    }
+    return qr_code_download_url, links
+
+def _render_queue_full_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many QR codes are being rendered, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
+async def _render(func, profile: Optional[str] = None, **kwargs) -> Tuple[bytes, Optional[str]]:
+    """
+    Runs a render function on the render pool and records how long each of its stages took.
+    Time not spent in any stage (waiting for a free worker, sending the work and result) is recorded as "queue",
+    and the state of the worker's matrix cache is kept for /metrics.
+
+    Parameters:
+    - func (Callable): The render function, called with `kwargs`.
+    - profile (Optional[str]): If set, the render is profiled in the worker and the report is saved under this label.
+
+    Returns:
+    - A (image bytes, profile report filename or None) tuple.
+    """
+    start = time.perf_counter()
+    report = None
+    if profile:
+        (image_bytes, timings, matrix_stats), report = await render_executor.submit(
+            profiled_call, profile, settings.PROFILE_DIR, settings.PROFILE_MAX_REPORTS, with_stage_timings, func, **kwargs
+        )
+    else:
+        image_bytes, timings, matrix_stats = await render_executor.submit(with_stage_timings, func, **kwargs)
+    record_worker_stats(matrix_stats)
+    for stage, seconds in timings.items():
+        render_stage_latency.observe(seconds, stage)
+    render_stage_latency.observe(max(0.0, time.perf_counter() - start - sum(timings.values())), "queue")
+    return image_bytes, report
+
+async def _profiling_requested(
+    profile: bool = Query(False, description="Profile this request (admin only); the report name is returned in X-Profile-Report"),
+    x_profile: Optional[str] = Header(None, description="Set to 1 to profile this request, like the profile query flag"),
+    current_user: dict = Depends(get_current_user),
+) -> bool:
+    """
+    Tells whether the client asked for this request to be profiled, which only the admin may do.
+    """
+    if not profile and x_profile not in ("1", "true"):
+        return False
+    if current_user["username"] != settings.ADMIN_USER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the admin may profile requests")
+    return True
+
+def _existing_qr_code_result(qr_filename: str) -> Tuple[int, dict, None]:
+    qr_code_download_url, links = _qr_code_links(qr_filename)
+    return status.HTTP_200_OK, {
+        "message": "QR code already exists.",
+        "qr_code_url": qr_code_download_url,
+        "links": links
+    }, None
+
+def _stored_entry(qr_filename: str) -> Optional[dict]:
+    """
+    Returns the index entry of a QR code if it is stored and not expired, noting the access for LRU eviction.
+    """
+    entry = qr_index.get(qr_filename)
+    if entry is None or is_expired(entry):
+        return None
+    qr_index.touch(qr_filename)
+    return entry
+
+def _forget(qr_filename: str):
+    """
+    Drops the index entry and cached image of a QR code whose image is gone from storage,
+    e.g. deleted outside the API, so that it is rendered again by the next create.
+    """
+    logger.warning(f"QR code {qr_filename} is indexed but missing from storage, dropping its index entry")
+    render_cache.invalidate(qr_filename)
+    qr_index.remove(qr_filename)
+
+def _stored(qr_filename: str) -> bool:
+    """
+    Tells whether a QR code is stored and not expired, noting the access for LRU eviction if it is.
+    The storage is checked too, so a code whose image went missing is created again
+    instead of being reported with a dead download URL.
+    """
+    if _stored_entry(qr_filename) is None:
+        return False
+    if not get_storage().exists(qr_filename):
+        _forget(qr_filename)
+        return False
+    return True
+
+async def _create_qr_code(request: QRCodeRequest, profile: bool = False) -> Tuple[int, dict, Optional[str]]:
+    """
+    Creates the QR code described by `request` unless it already exists.
+    Shared by the single and batch create endpoints.
+    The render is profiled if `profile` is set, or when it is picked by PROFILE_SAMPLE_RATE sampling.
+
+    Returns:
+    - A (status_code, QRCodeResponse-shaped dict, profile report filename or None) tuple:
+      201 if the QR code was rendered, 200 if it already existed.
+    """
+    # Generate filename from the full cache key (URL and style)
+    qr_filename = qr_code_filename(
+        str(request.url), request.fill_color, request.back_color, request.size, request.format, request.error_correction, request.mask
+    )
+    
+    # Check if the QR code already exists before doing any rendering work.
+    # The index records every stored code, so codes that were never created need no
+    # storage call; the render cache is not enough on its own because /render caches
+    # images it never stores.
+    if _stored(qr_filename):
+        logger.info("QR code already exists.")
+        return _existing_qr_code_result(qr_filename)
+
+    # Identical creations arriving while this one is in flight share its render and its result
+    return await render_flights.do(qr_filename, lambda: _store_new_qr_code(request, qr_filename, profile))
+
+async def _store_new_qr_code(request: QRCodeRequest, qr_filename: str, profile: bool) -> Tuple[int, dict, Optional[str]]:
+    """
+    Renders and stores a QR code that was not in the index.
+    A worker creating the same code at the same time holds the host lock, so
+    this waits for it and reports its result instead of rendering again.
+    """
+    async with host_lock(qr_filename):
+        if _stored(qr_filename):
+            render_coalesced.inc("host")
+            return _existing_qr_code_result(qr_filename)
+
+        # Generate QR code on the render pool so the event loop stays responsive
+        profile_label = "create" if profile else "create-sampled" if sample_profile() else None
+        image_bytes, report = await _render(
+            render_qr_code,
+            profile=profile_label,
+            data=str(request.url),
+            fill_color=request.fill_color,
+            back_color=request.back_color,
+            size=request.size,
+            format=request.format,
+            error_correction=request.error_correction,
+            mask=request.mask
+        )
+        # Stored on the thread pool; the directory backend writes through a temporary file and a rename,
+        # so nginx never serves a partial image
+        start = time.perf_counter()
+        await save_qr_code(qr_filename, image_bytes, request.format)
+        render_stage_latency.observe(time.perf_counter() - start, "write")
+        render_cache.put(qr_filename, image_bytes)
+        qr_index.add(
+            qr_filename, str(request.url), request.fill_color, request.back_color, request.size, len(image_bytes),
+            error_correction=request.error_correction, mask=request.mask,
+            expires_at=time.time() + request.ttl if request.ttl else None
+        )
+
+    # Generate download URL and HATEOAS links
+    qr_code_download_url, links = _qr_code_links(qr_filename)
+    return status.HTTP_201_CREATED, {
+        "message": "QR code created successfully",
+        "qr_code_url": qr_code_download_url,
+        "links": links
+    }, report
 
 # Define an endpoint to create QR codes
 # It responds to POST requests at "/" and returns data matching the QRCodeResponse model
 # This endpoint is tagged as "QR Codes" in the API docs and returns HTTP 201 when a QR code is created successfully
 @router.post("/", response_model=QRCodeResponse, status_code=status.HTTP_201_CREATED, tags=["QR Codes"])
-async def create_qr_code(request: QRCodeRequest, token: str = Depends(oauth2_scheme)):
+async def create_qr_code(
+    request: QRCodeRequest,
+    response: Response,
+    profile: bool = Depends(_profiling_requested),
+    current_user: dict = Depends(get_current_user),
+):
     try:
-        # Create QR code directory if it doesn't exist
-        settings.QR_DIRECTORY.mkdir(parents=True, exist_ok=True)
-        
-        # Generate filename from URL
-        encoded_url = encode_url_to_filename(str(request.url))
-        qr_filename = f"{encoded_url}.png"
-        qr_code_path = settings.QR_DIRECTORY / qr_filename
-        
-        # Generate QR code
-        generate_qr_code(
-            data=str(request.url),
-            path=qr_code_path,
-            fill_color=request.fill_color,
-            back_color=request.back_color,
-            size=request.size
-        )
-        
-        # Generate download URL
-        qr_code_download_url = f"{settings.SERVER_BASE_URL}/{settings.SERVER_DOWNLOAD_FOLDER}/{qr_filename}"
-        
-        # Generate HATEOAS (Hypermedia As The Engine Of Application State) links for this resource
-        links = {
-            "self": f"{settings.SERVER_BASE_URL}/qr-codes/{qr_filename}",
-            "download": qr_code_download_url
-        }
-        
-        # Check if the QR code already exists to prevent duplicates
-        if qr_code_path.exists():
-            logging.info("QR code already exists.")
-            # If it exists, return a conflict response
-            return JSONResponse(
-                status_code=status.HTTP_200_OK,
-                content={
-                    "message": "QR code already exists.",
-                    "qr_code_url": qr_code_download_url,
-                    "links": links
-                }
-            )
+        status_code, content, report = await _create_qr_code(request, profile=profile)
+        if status_code == status.HTTP_200_OK:
+            # The QR code already exists, so report it instead of a new creation
+            return JSONResponse(status_code=status_code, content=content)
 
+        if profile and report:
+            response.headers["X-Profile-Report"] = report
         # Return a response indicating successful creation
-        return {
-            "message": "QR code created successfully",
-            "qr_code_url": qr_code_download_url,
-            "links": links
-        }
+        return content
+    except RenderQueueFullError as e:
+        logger.warning(f"Rejected QR code creation: {e}")
+        raise _render_queue_full_exception()
+    except Exception as e:
+        logger.error(f"Error creating QR code: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+class _RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for bodies that are produced while the request body is still being read.
+    Starlette's disconnect listener would consume those request body messages, so it is
+    skipped here; a disconnect surfaces through request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+class BatchLineTooLongError(Exception):
+    """Raised when a line of an NDJSON batch request is longer than BATCH_MAX_LINE_BYTES."""
+
+    def __init__(self, index: int):
+        super().__init__(f"Line of item {index} is longer than {settings.BATCH_MAX_LINE_BYTES} bytes")
+        self.index = index
+
+async def _iter_batch_items(request: Request, items: Optional[list]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (index, raw item) pairs from a batch request body, either from an
+    already parsed JSON list or line by line from an NDJSON stream.
+    Lines that are not valid JSON are yielded as the ValueError they raised.
+
+    Raises:
+    - BatchLineTooLongError: If an NDJSON line is longer than BATCH_MAX_LINE_BYTES.
+    """
+    if items is not None:
+        for index, item in enumerate(items):
+            yield index, item
+        return
+
+    index = 0
+    buffer = bytearray()
+    async for chunk in request.stream():
+        # What is left of the buffer holds no newline, so only the new chunk is searched
+        searched = len(buffer)
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", searched)
+            if newline < 0:
+                break
+            if newline - start > settings.BATCH_MAX_LINE_BYTES:
+                raise BatchLineTooLongError(index)
+            line = buffer[start:newline]
+            start = searched = newline + 1
+            if line.strip():
+                yield index, _parse_ndjson_line(line)
+                index += 1
+        del buffer[:start]
+        if len(buffer) > settings.BATCH_MAX_LINE_BYTES:
+            raise BatchLineTooLongError(index)
+    if buffer.strip():
+        yield index, _parse_ndjson_line(buffer)
+
+async def _prepend(first: Optional[Tuple[int, Any]], items: AsyncIterator[Tuple[int, Any]]) -> AsyncIterator[Tuple[int, Any]]:
+    if first is not None:
+        yield first
+    async for item in items:
+        yield item
+
+def _parse_ndjson_line(line: Union[bytes, bytearray]) -> Any:
+    try:
+        return orjson.loads(line)
+    except ValueError as e:
+        return e
+
+async def _create_batch_item(index: int, item: Any) -> bytes:
+    """
+    Creates a single batch item and returns its NDJSON result line.
+    Failures are reported in the line instead of being raised.
+    """
+    if isinstance(item, ValueError):
+        result = {"index": index, "status": status.HTTP_422_UNPROCESSABLE_ENTITY, "message": "Invalid JSON", "detail": str(item)}
+        return orjson.dumps(result, option=orjson.OPT_APPEND_NEWLINE)
+    try:
+        status_code, content, _ = await _create_qr_code(QRCodeRequest.model_validate(item))
+        result = {"index": index, "status": status_code, **content}
+    except ValidationError as e:
+        result = {"index": index, "status": status.HTTP_422_UNPROCESSABLE_ENTITY, "message": "Invalid QR code request",
+                  "detail": e.errors(include_url=False, include_context=False)}
+    except RenderQueueFullError as e:
+        result = {"index": index, "status": status.HTTP_503_SERVICE_UNAVAILABLE, "message": "Render queue is full", "detail": str(e)}
     except Exception as e:
-        logging.error(f"Error creating QR code: {e}")
+        logger.error(f"Error creating QR code in batch: {e}")
+        result = {"index": index, "status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Error creating QR code", "detail": str(e)}
+    return orjson.dumps(result, option=orjson.OPT_APPEND_NEWLINE)
+
+async def _stream_batch_results(items: AsyncIterator[Tuple[int, Any]]) -> AsyncIterator[bytes]:
+    """
+    Renders batch items concurrently, at most BATCH_MAX_CONCURRENCY at a time,
+    and yields each result line as soon as it finishes. Only the in-flight
+    window is held in memory, never the whole batch.
+    """
+    pending = set()
+    too_long = None
+    try:
+        try:
+            async for index, item in items:
+                if len(pending) >= settings.BATCH_MAX_CONCURRENCY:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+                pending.add(asyncio.ensure_future(_create_batch_item(index, item)))
+        except BatchLineTooLongError as e:
+            # The response has started, so the rest of the body is refused in a last result line
+            too_long = e
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+        if too_long is not None:
+            result = {"index": too_long.index, "status": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                      "message": "Line too long", "detail": str(too_long)}
+            yield orjson.dumps(result, option=orjson.OPT_APPEND_NEWLINE)
+    finally:
+        # Stop outstanding renders if the client goes away mid-stream
+        for task in pending:
+            task.cancel()
+
+# Define an endpoint to create many QR codes in one request
+# It accepts a JSON list or an NDJSON stream of QRCodeRequest items and streams back one NDJSON result line per item
+@router.post(
+    "/batch",
+    tags=["QR Codes"],
+    response_class=StreamingResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/QRCodeRequest"}}},
+                NDJSON_MEDIA_TYPE: {"schema": {"$ref": "#/components/schemas/QRCodeRequest"}},
+            },
+        },
+        "responses": {"200": {"description": "One QRCodeResponse-shaped result per item, in completion order",
+                              "content": {NDJSON_MEDIA_TYPE: {}}}},
+    },
+)
+async def create_qr_codes_batch(request: Request, current_user: dict = Depends(get_current_user)):
+    if request.headers.get("content-type", "").split(";")[0].strip() == NDJSON_MEDIA_TYPE:
+        # Items are parsed and rendered as the NDJSON body streams in. The first one is read
+        # before the response starts, so a body that is one overlong line gets a plain 413.
+        items = _iter_batch_items(request, None)
+        try:
+            first = await items.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BatchLineTooLongError as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+        return _RequestStreamingResponse(_stream_batch_results(_prepend(first, items)), media_type=NDJSON_MEDIA_TYPE)
+
+    try:
+        items = await request.json()
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Request body must be a JSON list or an {NDJSON_MEDIA_TYPE} stream of QR code requests"
+        )
+    return StreamingResponse(_stream_batch_results(_iter_batch_items(request, items)), media_type=NDJSON_MEDIA_TYPE)
+
+def _render_request(
+    url: str = Query(..., description="The URL to encode in the QR code"),
+    fill_color: str = Query("black", description="Color of the QR code"),
+    back_color: str = Query("white", description="Background color of the QR code"),
+    size: int = Query(10, ge=1, le=100, description="Size of the QR code (1-100)"),
+    format: str = Query("png", description="Output format: a two-color PNG or an SVG"),
+    error_correction: str = Query("M", description="Error correction level: L, M, Q or H"),
+    mask: str = Query("auto", description='Mask pattern: "auto", "fast" or a fixed pattern 0-7'),
+) -> QRCodeRequest:
+    """
+    Builds a QRCodeRequest from query parameters, reporting validation errors as a 422 like a request body would.
+    """
+    try:
+        return QRCodeRequest(
+            url=url, fill_color=fill_color, back_color=back_color, size=size, format=format,
+            error_correction=error_correction, mask=mask
+        )
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+# Define an endpoint that renders a QR code on the fly without storing it
+# It responds to GET requests at "/render" with the PNG or SVG image itself, and supports conditional requests through its ETag
+@router.get(
+    "/render",
+    response_class=Response,
+    tags=["QR Codes"],
+    responses={
+        200: {"content": {media_type: {} for media_type in QR_CODE_MEDIA_TYPES.values()}, "description": "The rendered QR code image"},
+        304: {"description": "The cached copy identified by If-None-Match is still current"},
+    },
+)
+async def render_qr_code_endpoint(
+    qr_request: QRCodeRequest = Depends(_render_request),
+    if_none_match: Optional[str] = Header(None),
+    profile: bool = Depends(_profiling_requested),
+    current_user: dict = Depends(get_current_user),
+):
+    # The image is fully determined by its parameters, so the ETag can be derived from them without rendering
+    qr_filename = qr_code_filename(
+        str(qr_request.url), qr_request.fill_color, qr_request.back_color, qr_request.size, qr_request.format,
+        qr_request.error_correction, qr_request.mask
+    )
+    headers = {"ETag": qr_code_etag(qr_filename), "Cache-Control": settings.RENDER_CACHE_CONTROL}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        # A profiled request always renders, so there is something to profile
+        image_bytes = None if profile else render_cache.get(qr_filename)
+        if image_bytes is None:
+            image_bytes, report = await _render(
+                render_qr_code,
+                profile="render" if profile else None,
+                data=str(qr_request.url),
+                fill_color=qr_request.fill_color,
+                back_color=qr_request.back_color,
+                size=qr_request.size,
+                format=qr_request.format,
+                error_correction=qr_request.error_correction,
+                mask=qr_request.mask
+            )
+            render_cache.put(qr_filename, image_bytes)
+            if report:
+                headers["X-Profile-Report"] = report
+        return Response(content=image_bytes, media_type=QR_CODE_MEDIA_TYPES[qr_request.format], headers=headers)
+    except RenderQueueFullError as e:
+        logger.warning(f"Rejected QR code render: {e}")
+        raise _render_queue_full_exception()
+    except Exception as e:
+        logger.error(f"Error rendering QR code: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
-# Define an endpoint to list all QR codes
-# It responds to GET requests at "/" and returns a list of QRCodeResponse objects
+# Define an endpoint to list QR codes
+# It responds to GET requests at "/" and returns one page of QRCodeResponse objects from the metadata index
+# The cursor for the next page, if any, is returned in the X-Next-Cursor header and as a Link header
 @router.get("/", response_model=List[QRCodeResponse], tags=["QR Codes"])
-async def list_qr_codes_endpoint(token: str = Depends(oauth2_scheme)):
+async def list_qr_codes_endpoint(
+    request: Request,
+    limit: int = Query(settings.LIST_DEFAULT_LIMIT, ge=1, le=settings.LIST_MAX_LIMIT, description="Maximum number of QR codes to return"),
+    cursor: Optional[str] = Query(None, description="Cursor returned with the previous page"),
+    url_prefix: Optional[str] = Query(None, description="Only list QR codes whose URL starts with this prefix"),
+    created_since: Optional[datetime] = Query(None, description="Only list QR codes created at or after this time"),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        entries, next_cursor = qr_index.list(
+            limit,
+            cursor=cursor,
+            url_prefix=url_prefix,
+            created_since=created_since.timestamp() if created_since else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     try:
-        qr_files = list_qr_codes(settings.QR_DIRECTORY)
+        # The items are built here from the index, so they are serialized directly instead of
+        # being validated against the response model again; the model still documents them
+        download_prefix, self_prefix = _link_prefixes(settings.SERVER_BASE_URL, settings.SERVER_DOWNLOAD_FOLDER)
         responses = []
-        
-        for qr_file in qr_files:
-            url = decode_filename_to_url(qr_file.replace(".png", ""))
-            qr_code_download_url = f"{settings.SERVER_BASE_URL}/{settings.SERVER_DOWNLOAD_FOLDER}/{qr_file}"
-            
-            # Generate HATEOAS (Hypermedia As The Engine Of Application State) links for this resource
-            links = {
-                "self": f"{settings.SERVER_BASE_URL}/qr-codes/{qr_file}",
-                "download": qr_code_download_url
-            }
-            
+        for entry in entries:
+            qr_filename = entry["filename"]
+            qr_code_download_url = download_prefix + qr_code_relpath(qr_filename)
             responses.append({
                 "message": "QR code found",
                 "qr_code_url": qr_code_download_url,
-                "links": links
+                "links": {"self": self_prefix + qr_filename, "download": qr_code_download_url}
             })
-        
-        return responses
+
+        headers = {}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+            headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+        return ORJSONResponse(responses, headers=headers)
     except Exception as e:
-        logging.error(f"Error listing QR codes: {e}")
+        logger.error(f"Error listing QR codes: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -111,22 +537,137 @@ async def list_qr_codes_endpoint(token: str = Depends(oauth2_scheme)):
 # Define an endpoint to delete a QR code
 # It responds to DELETE requests at "/{qr_filename}" and returns HTTP 204 when a QR code is deleted successfully
 @router.delete("/{qr_filename}", status_code=status.HTTP_204_NO_CONTENT, tags=["QR Codes"])
-async def delete_qr_code_endpoint(qr_filename: str, token: str = Depends(oauth2_scheme)):
+async def delete_qr_code_endpoint(qr_filename: str, current_user: dict = Depends(get_current_user)):
     try:
-        qr_code_path = settings.QR_DIRECTORY / qr_filename
-        if not qr_code_path.exists():
+        try:
+            await delete_qr_code(qr_filename)
+        except FileNotFoundError:
+            # Drop any stale index entry so the code can be created again
+            qr_index.remove(qr_filename)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"QR code {qr_filename} not found"
             )
-        
-        delete_qr_code(qr_code_path)
+        render_cache.invalidate(qr_filename)
+        qr_index.remove(qr_filename)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error deleting QR code: {e}")
+        logger.error(f"Error deleting QR code: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+def _wants_image(accept: Optional[str]) -> bool:
+    """
+    Tells whether the Accept header asks for the image of a QR code rather than its JSON metadata.
+    """
+    return accept is not None and "image/" in accept and "application/json" not in accept
+
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+# Define an endpoint to get a QR code
+# It responds to GET and HEAD requests at "/{qr_filename}" with the QR code's metadata, or with its image when
+# the Accept header asks for one; both honour If-None-Match and If-Modified-Since, and images honour Range
+@router.api_route(
+    "/{qr_filename}",
+    methods=["GET", "HEAD"],
+    response_model=QRCodeMetadata,
+    tags=["QR Codes"],
+    responses={
+        200: {
+            "content": {media_type: {} for media_type in QR_CODE_MEDIA_TYPES.values()},
+            "description": "The QR code's metadata, or its image when the Accept header asks for an image",
+        },
+        206: {"description": "The requested byte range of the image"},
+        304: {"description": "The client's cached copy is still current"},
+        404: {"description": "The QR code does not exist or has expired"},
+        416: {"description": "The requested byte range is past the end of the image"},
+    },
+)
+async def get_qr_code_endpoint(
+    qr_filename: str,
+    request: Request,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    range: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    # Everything but the image bytes comes from the index entry, so metadata, HEAD and 304
+    # responses never touch the storage, and image bodies take a single open of the stored file
+    entry = _stored_entry(qr_filename)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"QR code {qr_filename} not found")
+    format = qr_filename.rsplit(".", 1)[-1]
+    media_type = QR_CODE_MEDIA_TYPES.get(format)
+    last_modified = formatdate(entry["created_at"], usegmt=True)
+    wants_image = media_type is not None and _wants_image(accept)
+    if wants_image:
+        # The stored image changes only when the code is stored again
+        etag = qr_code_etag(qr_filename, entry["created_at"])
+    else:
+        # The metadata changes whenever the code is stored again, e.g. with another TTL
+        etag = qr_code_etag(f"{qr_filename}|{entry['created_at']!r}|{entry['expires_at']!r}")
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Vary": "Accept"}
+    if not_modified(if_none_match, if_modified_since, etag, entry["created_at"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if not wants_image:
+        qr_code_download_url, links = _qr_code_links(qr_filename)
+        body = orjson.dumps({
+            "message": "QR code found",
+            "qr_code_url": qr_code_download_url,
+            "links": links,
+            "url": entry["url"],
+            "fill_color": entry["fill_color"],
+            "back_color": entry["back_color"],
+            "size": entry["size"],
+            "format": format,
+            "error_correction": entry["error_correction"],
+            "mask": entry["mask"],
+            "size_bytes": entry["size_bytes"],
+            "created_at": _timestamp(entry["created_at"]),
+            "expires_at": _timestamp(entry["expires_at"]),
+        })
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(body, headers=headers, media_type="application/json")
+
+    headers["Accept-Ranges"] = "bytes"
+    file = None
+    if request.method == "HEAD":
+        size = entry["size_bytes"]
+    else:
+        try:
+            file, offset, size = get_storage().open_region(qr_filename)
+        except FileNotFoundError:
+            _forget(qr_filename)
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"QR code {qr_filename} not found")
+    # A Range is only honoured if the client's partial copy is of the current image
+    byte_range = None
+    if not if_range or if_range.strip() in (etag, last_modified):
+        try:
+            byte_range = parse_byte_range(range, size)
+        except RangeNotSatisfiableError:
+            if file is not None:
+                file.close()
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"}
+            )
+    start, end = byte_range or (0, size - 1)
+    status_code = status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if file is None:
+        headers["Content-Length"] = str(end - start + 1)
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return FileRegionResponse(file, offset + start, end - start + 1, status_code=status_code, headers=headers,
+                              media_type=media_type)
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field, validator
-from typing import Dict, Optional
+from pydantic import BaseModel, Field, conint, validator
+from datetime import datetime
+from typing import Dict, Literal, Optional, Union
+from app.config import settings
 
 class Token(BaseModel):
     access_token: str
@@ -13,6 +15,18 @@ class QRCodeRequest(BaseModel):
     fill_color: str = Field(default="black", description="Color of the QR code")
     back_color: str = Field(default="white", description="Background color of the QR code")
     size: int = Field(default=10, ge=1, le=100, description="Size of the QR code (1-100)")
+    format: Literal["png", "svg"] = Field(default="png", description="Output format: a two-color PNG or an SVG")
+    error_correction: Literal["L", "M", "Q", "H"] = Field(
+        default="M", description="Error correction level: about 7% (L), 15% (M), 25% (Q) or 30% (H) of the code can be damaged"
+    )
+    mask: Union[Literal["auto", "fast"], conint(ge=0, le=7)] = Field(
+        default="auto",
+        description='Mask pattern: "auto" picks the best one with the standard encoder, "fast" encodes much faster '
+                    'and picks the best one for a plain byte encoding, and 0-7 uses that pattern without scoring any'
+    )
+    ttl: Optional[int] = Field(
+        default=None, ge=1, description="Seconds after which the QR code expires and is deleted; by default it is kept"
+    )
 
     @validator('fill_color', 'back_color')
     def validate_colors(cls, v):
@@ -27,11 +41,29 @@ class QRCodeRequest(BaseModel):
             raise ValueError("URL must start with http:// or https://")
         return v
 
+    @validator('ttl')
+    def validate_ttl(cls, v):
+        if v is not None and v > settings.QR_MAX_TTL:
+            raise ValueError(f"TTL must be at most {settings.QR_MAX_TTL} seconds")
+        return v
+
 class QRCodeResponse(BaseModel):
     message: str = Field(..., description="Status message")
     qr_code_url: str = Field(..., description="URL to download the QR code")
     links: Dict[str, str] = Field(..., description="HATEOAS links")
 
+class QRCodeMetadata(QRCodeResponse):
+    url: str = Field(..., description="The URL encoded in the QR code")
+    fill_color: Optional[str] = Field(None, description="Color of the QR code, if known")
+    back_color: Optional[str] = Field(None, description="Background color of the QR code, if known")
+    size: Optional[int] = Field(None, description="Size of each box in the QR code grid, if known")
+    format: str = Field(..., description="Image format, png or svg")
+    error_correction: str = Field(..., description="Error correction level")
+    mask: str = Field(..., description="Mask pattern choice")
+    size_bytes: int = Field(..., description="Size of the stored image in bytes")
+    created_at: datetime = Field(..., description="When the QR code was stored")
+    expires_at: Optional[datetime] = Field(None, description="When the QR code expires, if it has a TTL")
+
 class Link(BaseModel):
     rel: str = Field(..., description="Relation type of the link.")
     href: str = Field(..., description="The URL of the link.")
@@ -0,0 +1,153 @@
+import math
+import time
+from typing import Dict, Iterable, Optional
+from app.config import settings
+from app.services.metrics import metrics
+
+# Route class of the expensive requests that render QR codes; every other request is "default"
+RENDER_CLASS = "render"
+DEFAULT_CLASS = "default"
+# Weight of the newest latency in the moving average
+LATENCY_SMOOTHING = 0.1
+# Factor applied to a route class's limit when its latency is over the target
+LIMIT_DECREASE = 0.9
+
+requests_admitted = metrics.counter(
+    "http_requests_admitted_total", "Requests let through by admission control", labels=("route_class",)
+)
+requests_shed = metrics.counter(
+    "http_requests_shed_total", "Requests rejected with 503 by admission control", labels=("route_class", "reason")
+)
+
+
+class AdaptiveLimit:
+    """
+    Concurrency limit of one route class, adapted to its recent latency.
+
+    Every finished request updates a moving average of the class's latency. While it
+    stays under the target, the limit grows by about one per limit's worth of
+    requests (additive increase); once it goes over, the limit is cut by
+    LIMIT_DECREASE (multiplicative decrease), at most once per average latency so
+    that the effect of one cut shows before the next. Queueing shows up as latency,
+    so the limit settles where requests stop waiting for the render workers.
+
+    Parameters:
+    - min_limit (int): Lowest the limit goes, so the class is never shut out.
+    - max_limit (int): Highest the limit goes, and where it starts.
+    - target_latency (float): Seconds of average latency above which the limit shrinks.
+    """
+
+    def __init__(self, min_limit: int, max_limit: int, target_latency: float):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self._last_decrease = 0.0
+
+    def record(self, latency: float, now: float):
+        """
+        Updates the moving average and the limit with the latency of a finished request.
+        """
+        self.latency = latency if self.latency is None else self.latency + LATENCY_SMOOTHING * (latency - self.latency)
+        if self.latency > self.target_latency:
+            if now - self._last_decrease >= self.latency:
+                self.limit = max(self.min_limit, self.limit * LIMIT_DECREASE)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+class AdmissionController:
+    """
+    Decides which requests a worker takes on, so that under overload it fails fast
+    instead of queueing work until every request times out.
+
+    Requests of all classes share max_in_flight slots, of which reserved_share is kept
+    for default (cheap) requests such as `/`, `/token` or listings: render requests may
+    only take the rest, and are further held to their adaptive limit. Each worker has
+    its own controller; it is only used from the event loop, so it needs no locking.
+
+    Parameters:
+    - max_in_flight (int): Requests of all classes handled at once (0 disables admission control).
+    - reserved_share (float): Fraction of max_in_flight that render requests may not use.
+    - render_limit (AdaptiveLimit): The limit of render requests.
+    - render_routes (Iterable[str]): "METHOD /path" of the routes in the render class.
+    """
+
+    def __init__(self, max_in_flight: int, reserved_share: float, render_limit: AdaptiveLimit, render_routes: Iterable[str]):
+        self.max_in_flight = max_in_flight
+        self.render_capacity = max_in_flight - math.ceil(max_in_flight * reserved_share)
+        self.limits: Dict[str, AdaptiveLimit] = {RENDER_CLASS: render_limit}
+        self.render_routes = {_route_key(*route.split(" ", 1)) for route in render_routes}
+        self.in_flight = 0
+
+    def route_class(self, method: str, path: str) -> str:
+        return RENDER_CLASS if _route_key(method, path) in self.render_routes else DEFAULT_CLASS
+
+    def admit(self, route_class: str) -> Optional[str]:
+        """
+        Takes a slot for a request of `route_class` if there is one.
+
+        Returns:
+        - None if the request was admitted, otherwise the reason it is shed: "capacity" (the
+          worker is full), "reserved" (only reserved slots are left) or "limit" (the class's limit is reached).
+        """
+        if self.max_in_flight:
+            limit = self.limits.get(route_class)
+            if self.in_flight >= self.max_in_flight:
+                reason = "capacity"
+            elif limit is not None and self.in_flight >= self.render_capacity:
+                reason = "reserved"
+            elif limit is not None and limit.in_flight >= int(limit.limit):
+                reason = "limit"
+            else:
+                reason = None
+            if reason is not None:
+                requests_shed.inc(route_class, reason)
+                return reason
+            if limit is not None:
+                limit.in_flight += 1
+        self.in_flight += 1
+        requests_admitted.inc(route_class)
+        return None
+
+    def release(self, route_class: str, latency: Optional[float]):
+        """
+        Frees the slot of an admitted request, learning from its latency unless it is None (failed requests).
+        """
+        self.in_flight -= 1
+        limit = self.limits.get(route_class)
+        if limit is not None and self.max_in_flight:
+            limit.in_flight -= 1
+            if latency is not None:
+                limit.record(latency, time.monotonic())
+
+    def retry_after(self, route_class: str) -> int:
+        """
+        Returns the seconds a shed client is asked to wait: about the class's recent latency, and at least one.
+        """
+        limit = self.limits.get(route_class)
+        latency = limit.latency if limit is not None and limit.latency is not None else 0
+        return max(1, math.ceil(latency))
+
+
+def _route_key(method: str, path: str) -> str:
+    return f"{method.upper()} {path.rstrip('/') or '/'}"
+
+
+# Admission control of this worker
+admission = AdmissionController(
+    settings.ADMISSION_MAX_IN_FLIGHT,
+    settings.ADMISSION_RESERVED_SHARE,
+    AdaptiveLimit(settings.ADMISSION_RENDER_MIN_IN_FLIGHT, settings.ADMISSION_RENDER_MAX_IN_FLIGHT,
+                  settings.ADMISSION_RENDER_TARGET_LATENCY),
+    settings.ADMISSION_RENDER_ROUTES,
+)
+
+metrics.gauge("http_requests_in_flight", "Requests being handled", lambda: admission.in_flight)
+metrics.gauge(
+    "http_admission_render_limit", "Adaptive limit on render requests handled at once, summed over workers",
+    lambda: int(admission.limits[RENDER_CLASS].limit)
+)
@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+from app.config import settings
+
+# Rough per-entry bookkeeping cost (dict slot, tuples, bytes object headers) counted against max_bytes
+ENTRY_OVERHEAD = 200
+
+
+class ModuleMatrixCache:
+    """
+    In-process LRU cache of computed QR module matrices, bounded by total size.
+
+    Building the matrix (data encoding, Reed-Solomon error correction and mask
+    scoring) is the expensive part of rendering and only depends on the data and
+    the error correction settings, so renders of the same data in other colors,
+    sizes or formats reuse it and only pay for rasterization. Matrices are stored
+    bit-packed, one bit per module: about 4 KB for the largest QR version.
+
+    Parameters:
+    - max_bytes (int): Maximum total size of cached matrices and their keys. 0 disables the cache.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # key -> (bit-packed modules, side length in modules, size counted against max_bytes)
+        self._entries: "OrderedDict[Hashable, Tuple[bytes, int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        """
+        Returns the cached module matrix for `key` as a square boolean numpy array, or None if it is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        import numpy as np
+
+        packed, side, _ = entry
+        return np.unpackbits(np.frombuffer(packed, dtype=np.uint8), count=side * side).reshape(side, side).astype(bool)
+
+    def put(self, key: Hashable, modules):
+        """
+        Caches a square module matrix under `key`, evicting least recently used entries to stay within max_bytes.
+        Parameters:
+        - key (Hashable): The data and error correction settings the matrix was computed from.
+        - modules: The matrix, as nested lists of booleans or a numpy array.
+        """
+        import numpy as np
+
+        matrix = np.asarray(modules, dtype=bool)
+        packed = np.packbits(matrix).tobytes()
+        cost = len(packed) + _key_size(key) + ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (packed, matrix.shape[0], cost)
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def _key_size(key: Hashable) -> int:
+    if isinstance(key, tuple):
+        return sum(_key_size(part) for part in key)
+    if isinstance(key, str):
+        return len(key.encode())
+    return 8
+
+
+# Matrix cache of this process; each render worker has its own
+matrix_cache = ModuleMatrixCache(settings.MATRIX_CACHE_MAX_BYTES)
+
+# Latest matrix cache stats reported by each render worker of this API process, keyed by pid
+_worker_stats: Dict[int, Dict[str, int]] = {}
+
+
+def record_worker_stats(stats: Optional[Dict[str, int]]):
+    """
+    Remembers the matrix cache stats a render worker sent back with a render.
+    """
+    if stats is not None:
+        _worker_stats[stats["pid"]] = stats
+
+
+def worker_stats_total(field: str) -> int:
+    """
+    Returns the sum of a matrix cache stat ("entries", "bytes", "hits" or "misses") over this process's render workers.
+    """
+    return sum(stats[field] for stats in list(_worker_stats.values()))
@@ -0,0 +1,253 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from app.config import settings
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-second renders
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    """
+    Monotonically increasing count, optionally split by labels.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], lock: threading.Lock):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._lock = lock
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def snapshot(self) -> List:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets, optionally split by labels.
+    Buckets are stored non-cumulatively and only made cumulative when exposed.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], lock: threading.Lock,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = lock
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *label_values: str) -> int:
+        entry = self._values.get(label_values)
+        return sum(entry[0]) if entry else 0
+
+    def snapshot(self) -> List:
+        with self._lock:
+            return [[list(labels), list(counts), total] for labels, (counts, total) in self._values.items()]
+
+
+class Gauge:
+    """
+    Value read from a callback whenever metrics are collected.
+
+    Parameters:
+    - callback (Callable): Returns the current value.
+    - shared (bool): True if every worker sees the same value (e.g. disk usage), in which case
+      it is only read by the worker answering the scrape; otherwise the workers' values are summed.
+    - kind (str): "counter" for a running total kept elsewhere (e.g. by render workers), otherwise "gauge".
+    """
+
+    def __init__(self, name: str, help: str, callback: Callable[[], float], shared: bool = False, kind: str = "gauge"):
+        self.name, self.help, self.labels = name, help, ()
+        self.callback = callback
+        self.shared = shared
+        self.kind = kind
+
+    def snapshot(self) -> List:
+        try:
+            return [[[], float(self.callback())]]
+        except Exception as e:
+            logging.warning(f"Could not read gauge {self.name}: {e}")
+            return []
+
+
+class MetricsRegistry:
+    """
+    Low-overhead in-process metrics registry with Prometheus text exposition.
+
+    Recording only touches in-memory dicts. To aggregate across gunicorn workers,
+    every worker periodically writes a JSON snapshot of its metrics to
+    `directory` (one file per pid), and the worker answering a scrape merges
+    its live values with the other workers' snapshots.
+
+    Parameters:
+    - directory (Optional[Path]): Where worker snapshots are shared; None for a single process.
+    - flush_interval (float): Minimum number of seconds between two snapshots of this worker.
+    """
+
+    def __init__(self, directory: Optional[Path] = None, flush_interval: float = 5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels, self._lock))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, self._lock, buckets))
+
+    def gauge(self, name: str, help: str, callback: Callable[[], float], shared: bool = False, kind: str = "gauge") -> Gauge:
+        return self._register(Gauge(name, help, callback, shared, kind))
+
+    def snapshot(self, include_shared: bool = True) -> Dict[str, List]:
+        """
+        Returns the current values of this process's metrics, keyed by metric name.
+        """
+        return {
+            name: metric.snapshot() for name, metric in list(self._metrics.items())
+            if include_shared or not getattr(metric, "shared", False)
+        }
+
+    def _snapshot_path(self, pid: int) -> Path:
+        return self.directory / f"{pid}.json"
+
+    def maybe_flush(self):
+        """
+        Writes this worker's snapshot if the flush interval has passed since the last one.
+        """
+        if self.directory is None or time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = time.monotonic()
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._snapshot_path(os.getpid())
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.snapshot(include_shared=False)))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write metrics snapshot: {e}")
+
+    def remove_snapshot(self, pid: Optional[int] = None):
+        """
+        Deletes the snapshot of an exited worker so its values stop being reported.
+        """
+        if self.directory is not None:
+            self._snapshot_path(pid or os.getpid()).unlink(missing_ok=True)
+
+    def collect(self) -> Dict[str, List]:
+        """
+        Merges this process's live metrics with the snapshots of the other workers.
+        """
+        snapshots = [self.snapshot()]
+        if self.directory is not None and self.directory.is_dir():
+            own = self._snapshot_path(os.getpid()).name
+            for path in self.directory.glob("*.json"):
+                if path.name == own:
+                    continue
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue  # Being replaced or removed by its worker
+        merged: Dict[str, Dict[LabelValues, list]] = {}
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                if name not in self._metrics:
+                    continue
+                series = merged.setdefault(name, {})
+                for sample in samples:
+                    labels, values = tuple(sample[0]), sample[1:]
+                    current = series.get(labels)
+                    if current is None:
+                        series[labels] = [list(v) if isinstance(v, list) else v for v in values]
+                    elif len(values) == 1:
+                        current[0] += values[0]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], values[0])]
+                        current[1] += values[1]
+        return {name: [[list(labels), *values] for labels, values in series.items()] for name, series in merged.items()}
+
+    def render(self) -> str:
+        """
+        Returns all metrics, merged across workers, in the Prometheus text exposition format.
+        """
+        collected = self.collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, *values in collected.get(name, []):
+                pairs = [f'{key}="{_escape(value)}"' for key, value in zip(metric.labels, labels)]
+                if metric.kind == "histogram":
+                    counts, total = values
+                    cumulative = 0
+                    for bound, count in zip((*metric.buckets, "+Inf"), counts):
+                        cumulative += count
+                        bucket_labels = ",".join((*pairs, f'le="{bound}"'))
+                        lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(pairs)} {total}")
+                    lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_labels(pairs)} {values[0]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: List[str]) -> str:
+    return f"{{{','.join(pairs)}}}" if pairs else ""
+
+
+# Shared registry of the application's metrics
+metrics = MetricsRegistry(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+
+request_latency = metrics.histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests", labels=("method", "route", "status")
+)
+render_stage_latency = metrics.histogram(
+    "qr_render_stage_duration_seconds", "Time spent in each stage of rendering a QR code", labels=("stage",)
+)
+auth_latency = metrics.histogram(
+    "qr_auth_duration_seconds", "Time spent authenticating bearer tokens", labels=("cache",)
+)
+token_cache_requests = metrics.counter(
+    "qr_token_cache_requests_total", "Bearer token lookups in the verified token cache", labels=("result",)
+)
+render_coalesced = metrics.counter(
+    "qr_render_coalesced_total",
+    "QR code creations answered by an identical render already in flight, in this worker or another one on the host",
+    labels=("scope",)
+)
@@ -0,0 +1,117 @@
+import itertools
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+
+# File extension of collapsed-stack reports, as read by flamegraph.pl and speedscope
+PROFILE_EXTENSION = ".folded"
+
+
+class StackProfiler:
+    """
+    Deterministic profiler that records the self time of every distinct call stack.
+
+    Use it as a context manager around the code to profile; it only sees calls made
+    by the current thread. The report is in the collapsed-stack format
+    ("outer;inner;innermost <microseconds>" per line), which flame graph tools
+    turn into a call tree.
+    """
+
+    def __init__(self):
+        self.stacks: Dict[Tuple[str, ...], float] = defaultdict(float)
+        # One [label, start time, time spent in callees] entry per active call
+        self._calls: List[list] = []
+
+    def __enter__(self) -> "StackProfiler":
+        sys.setprofile(self._callback)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.setprofile(None)
+
+    def _callback(self, frame, event: str, arg):
+        now = time.perf_counter()
+        if event == "call":
+            self._calls.append([_frame_label(frame), now, 0.0])
+        elif event == "c_call":
+            self._calls.append([f"{getattr(arg, '__module__', None) or 'builtins'}.{getattr(arg, '__qualname__', arg)}", now, 0.0])
+        elif event in ("return", "c_return", "c_exception") and self._calls:
+            stack = tuple(call[0] for call in self._calls)
+            _, start, callees = self._calls.pop()
+            elapsed = now - start
+            self.stacks[stack] += elapsed - callees
+            if self._calls:
+                self._calls[-1][2] += elapsed
+
+    def collapsed(self) -> str:
+        """
+        Returns the report in the collapsed-stack format, heaviest stacks first.
+        """
+        lines = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{';'.join(stack)} {round(seconds * 1e6)}\n" for stack, seconds in lines if seconds > 0)
+
+
+def _frame_label(frame) -> str:
+    """
+    Returns "module.qualified_name" for the function running in `frame`.
+    Code objects only have co_qualname from Python 3.11; older versions get the bare name.
+    """
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def save_report(report: str, label: str, directory: Optional[Path] = None, max_reports: Optional[int] = None) -> str:
+    """
+    Writes a profile report to the profile directory, deleting the oldest reports beyond `max_reports`.
+    Parameters:
+    - report (str): The collapsed-stack report.
+    - label (str): Short description included in the report's filename.
+    - directory (Optional[Path]): Where reports are kept; defaults to the PROFILE_DIR setting.
+    - max_reports (Optional[int]): Number of reports to keep; defaults to the PROFILE_MAX_REPORTS setting.
+
+    Returns:
+    - The filename of the saved report.
+    """
+    directory = directory or settings.PROFILE_DIR
+    max_reports = settings.PROFILE_MAX_REPORTS if max_reports is None else max_reports
+    directory.mkdir(parents=True, exist_ok=True)
+    filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10**9:09d}-{os.getpid()}-{label}{PROFILE_EXTENSION}"
+    (directory / filename).write_text(report)
+    reports = sorted(directory.glob(f"*{PROFILE_EXTENSION}"))
+    for old_report in reports[:max(0, len(reports) - max_reports)]:
+        old_report.unlink(missing_ok=True)
+    return filename
+
+
+def profiled_call(label: str, directory: Path, max_reports: int, func: Callable, *args, **kwargs) -> Tuple[Any, Optional[str]]:
+    """
+    Calls `func(*args, **kwargs)` under a StackProfiler and saves its report with save_report.
+    Runs in render pool workers, so the report covers the rendering itself; the report
+    location is passed in so the API process's settings apply.
+
+    Returns:
+    - A (result, report filename or None if it could not be saved) tuple.
+    """
+    with StackProfiler() as profiler:
+        result = func(*args, **kwargs)
+    try:
+        filename = save_report(profiler.collapsed(), label, directory, max_reports)
+    except OSError as e:
+        logging.warning(f"Could not save profile report: {e}")
+        filename = None
+    return result, filename
+
+
+# Decides which create_qr_code calls are profiled when sampling is enabled
+_sample_counter = itertools.count(1)
+
+def sample_profile() -> bool:
+    """
+    Returns True for 1 in PROFILE_SAMPLE_RATE calls; always False when sampling is disabled.
+    """
+    return settings.PROFILE_SAMPLE_RATE > 0 and next(_sample_counter) % settings.PROFILE_SAMPLE_RATE == 0
@@ -0,0 +1,176 @@
+"""
+Builds QR module matrices, either through qrcode's standard encoder or a faster path.
+
+The fast path encodes the data as a single byte segment, so the smallest
+version that fits is read off a precomputed capacity table instead of being
+searched for, and all eight mask patterns are scored with array operations on
+one data placement instead of placing the data eight times. Scoring uses the
+same penalty rules as qrcode, so for the same data segment it picks the same
+mask; a fixed mask skips scoring altogether.
+
+Only imported by the processes that render, as it needs qrcode and numpy.
+"""
+import bisect
+from functools import lru_cache
+from typing import List, Tuple, Union
+import numpy as np
+from qrcode import constants, exceptions, util
+from qrcode.main import QRCode, precomputed_qr_blanks
+
+# Error correction levels by name, from about 7% (L) to 30% (H) of the symbol recoverable
+ERROR_CORRECTION_LEVELS = {
+    "L": constants.ERROR_CORRECT_L,
+    "M": constants.ERROR_CORRECT_M,
+    "Q": constants.ERROR_CORRECT_Q,
+    "H": constants.ERROR_CORRECT_H,
+}
+
+# Same patterns as qrcode.util.mask_func, written for whole arrays of row (i) and column (j) indices
+_MASK_PATTERNS = (
+    lambda i, j: (i + j) % 2 == 0,
+    lambda i, j: i % 2 == 0,
+    lambda i, j: j % 3 == 0,
+    lambda i, j: (i + j) % 3 == 0,
+    lambda i, j: (i // 2 + j // 3) % 2 == 0,
+    lambda i, j: (i * j) % 2 + (i * j) % 3 == 0,
+    lambda i, j: ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+    lambda i, j: ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+)
+
+# 1:1:3:1:1 finder-like patterns next to four light modules, penalised by rule 3
+_FINDER_LIKE = (0b10111010000, 0b00001011101)
+
+Mask = Union[str, int]
+
+
+@lru_cache(maxsize=None)
+def byte_capacity(error_correction: int) -> Tuple[int, ...]:
+    """
+    Returns how many bytes a single byte segment can hold in each version (index 0 is unused).
+    """
+    return (0, *(
+        (util.BIT_LIMIT_TABLE[error_correction][version] - 4 - util.length_in_bits(util.MODE_8BIT_BYTE, version)) // 8
+        for version in range(1, 41)
+    ))
+
+
+def minimal_version(length: int, error_correction: int) -> int:
+    """
+    Returns the smallest version holding `length` bytes as a single byte segment.
+
+    Raises:
+    - DataOverflowError: If the data does not fit in any version.
+    """
+    version = bisect.bisect_left(byte_capacity(error_correction), length, 1)
+    if version > 40:
+        raise exceptions.DataOverflowError(f"{length} bytes do not fit in a QR code")
+    return version
+
+
+class _Layout:
+    """
+    The parts of a symbol that only depend on its version and error correction level.
+    """
+
+    def __init__(self, version: int, error_correction: int):
+        count = version * 4 + 17
+        qr = QRCode(version=version, error_correction=error_correction, border=0)
+        qr.modules_count = count
+        # Finder, alignment and timing patterns, then the format and version information
+        qr.makeImpl(True, 0)
+        function_patterns = np.array([[cell is not None for cell in row] for row in precomputed_qr_blanks[version]])
+        qr.modules = [[None] * count for _ in range(count)]
+        qr.setup_type_info(True, 0)
+        if version >= 7:
+            qr.setup_type_number(True)
+        self.info = np.array([[cell is not None for cell in row] for row in qr.modules])
+        self.data = ~(function_patterns | self.info)
+        i, j = np.indices((count, count))
+        self.masks = [pattern(i, j) & self.data for pattern in _MASK_PATTERNS]
+        self.info_values: List[np.ndarray] = []
+        for mask in range(8):
+            qr.modules = [[False] * count for _ in range(count)]
+            qr.setup_type_info(False, mask)
+            if version >= 7:
+                qr.setup_type_number(False)
+            self.info_values.append(np.array(qr.modules, dtype=bool))
+
+
+@lru_cache(maxsize=None)
+def _layout(version: int, error_correction: int) -> _Layout:
+    return _Layout(version, error_correction)
+
+
+def _run_penalty(matrix: np.ndarray) -> int:
+    # Row-wise run lengths: every row gets a boundary at its start and end, and the
+    # gap between the end of one row and the start of the next is a harmless run of 1
+    rows, count = matrix.shape
+    boundaries = np.ones((rows, count + 1), dtype=bool)
+    boundaries[:, 1:count] = matrix[:, 1:] != matrix[:, :-1]
+    lengths = np.diff(np.flatnonzero(boundaries))
+    long_runs = lengths[lengths >= 5]
+    return int((long_runs - 2).sum())
+
+
+def _finder_like_count(matrix: np.ndarray) -> int:
+    count = matrix.shape[1]
+    if count < 11:
+        return 0
+    bits = matrix.astype(np.int32)
+    codes = np.zeros((matrix.shape[0], count - 10), dtype=np.int32)
+    for offset in range(11):
+        codes = (codes << 1) | bits[:, offset:offset + count - 10]
+    return int(np.isin(codes, _FINDER_LIKE).sum())
+
+
+def penalty(matrix: np.ndarray) -> int:
+    """
+    Returns the mask penalty score of a module matrix, as computed by qrcode.util.lost_point.
+    """
+    count = matrix.shape[0]
+    score = _run_penalty(matrix) + _run_penalty(matrix.T)
+    top_left = matrix[:-1, :-1]
+    blocks = (top_left == matrix[1:, :-1]) & (top_left == matrix[:-1, 1:]) & (top_left == matrix[1:, 1:])
+    score += 3 * int(blocks.sum())
+    score += 40 * (_finder_like_count(matrix) + _finder_like_count(matrix.T))
+    dark_percent = float(matrix.sum()) / count ** 2 * 100
+    score += int(abs(dark_percent - 50) / 5) * 10
+    return score
+
+
+def encode_modules(data: str, error_correction: str = "M", mask: Mask = "auto") -> np.ndarray:
+    """
+    Builds the module matrix of the QR code encoding `data`, without the quiet zone.
+    Parameters:
+    - data (str): The data to encode.
+    - error_correction (str): "L", "M", "Q" or "H".
+    - mask (Union[str, int]): "auto" runs qrcode's standard encoder, which optimizes the data
+      segments and scores every mask; "fast" takes the fast path and picks the best-scoring mask;
+      0-7 takes the fast path with that fixed mask.
+
+    Returns:
+    - A square boolean array, True for dark modules.
+    """
+    level = ERROR_CORRECTION_LEVELS[error_correction]
+    if mask == "auto":
+        qr = QRCode(version=1, error_correction=level, border=0)
+        qr.add_data(data)
+        qr.make(fit=True)
+        return np.array(qr.modules, dtype=bool)
+
+    raw = data.encode("utf-8")
+    version = minimal_version(len(raw), level)
+    qr = QRCode(version=version, error_correction=level, border=0)
+    qr.add_data(util.QRData(raw, mode=util.MODE_8BIT_BYTE))
+    if mask != "fast":
+        qr.makeImpl(False, int(mask))
+        return np.array(qr.modules, dtype=bool)
+
+    # Place the data once with mask 0, then derive the other masks from the unmasked data.
+    # Like qrcode, candidates are scored with the format and version information left light.
+    qr.makeImpl(False, 0)
+    layout = _layout(version, level)
+    unmasked = np.array(qr.modules, dtype=bool) ^ layout.masks[0]
+    scores = [penalty((unmasked ^ pattern) & ~layout.info) for pattern in layout.masks]
+    best = scores.index(min(scores))
+    return np.where(layout.info, layout.info_values[best], unmasked ^ layout.masks[best])
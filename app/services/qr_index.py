@@ -0,0 +1,374 @@
+import base64
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from app.config import settings
+from app.services.storage import QRCodeStorage
+from app.utils.common import decode_qr_code_filename, is_sharded_filename
+
+# Bumped whenever the schema changes; 0 means the database was created with the current
+# schema but the codes stored before it existed have not been indexed yet (see backfill)
+SCHEMA_VERSION = 3
+# How long a starting worker waits for another one's backfill to finish, in milliseconds
+BACKFILL_BUSY_TIMEOUT = 10 * 60 * 1000
+
+# Columns added by each schema version, applied in order to older databases
+MIGRATIONS = {
+    2: [
+        "ALTER TABLE qr_codes ADD COLUMN error_correction TEXT DEFAULT 'M'",
+        "ALTER TABLE qr_codes ADD COLUMN mask TEXT DEFAULT 'auto'",
+    ],
+    3: [
+        "ALTER TABLE qr_codes ADD COLUMN expires_at REAL",
+        "ALTER TABLE qr_codes ADD COLUMN last_access REAL",
+        "UPDATE qr_codes SET last_access = created_at",
+    ],
+}
+
+# Columns written when recording a QR code
+COLUMNS = ("filename", "url", "fill_color", "back_color", "size", "size_bytes", "error_correction", "mask",
+           "expires_at", "created_at", "last_access")
+_INSERT = f"INSERT OR REPLACE INTO qr_codes ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+# Columns known for a code found in storage without an index entry
+_EXISTING_COLUMNS = ("filename", "url", "fill_color", "back_color", "size", "size_bytes", "created_at", "last_access")
+_INSERT_EXISTING = (
+    f"INSERT OR IGNORE INTO qr_codes ({', '.join(_EXISTING_COLUMNS)}) VALUES ({', '.join('?' * len(_EXISTING_COLUMNS))})"
+)
+
+
+class QRCodeIndex:
+    """
+    Embedded SQLite index of the QR codes stored in QR_DIRECTORY.
+
+    It holds the metadata of every stored code so that listing never has to
+    scan or decode the directory. The index is kept up to date by the create
+    and delete paths; codes stored before it existed are added by backfill,
+    which the app runs once at startup.
+
+    Parameters:
+    - db_path (Path): Location of the SQLite database file.
+    - directory (Path): The QR code directory the index describes.
+    """
+
+    def __init__(self, db_path: Path, directory: Path):
+        self.db_path = db_path
+        self.directory = directory
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # filename -> last access time, not written to the database yet
+        self._touched: Dict[str, float] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections are opened lazily so they are never shared across forked workers
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS qr_codes (
+                    filename TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    fill_color TEXT,
+                    back_color TEXT,
+                    size INTEGER,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    error_correction TEXT DEFAULT 'M',
+                    mask TEXT DEFAULT 'auto',
+                    expires_at REAL,
+                    last_access REAL
+                );
+                CREATE INDEX IF NOT EXISTS qr_codes_created ON qr_codes (created_at, filename);
+                CREATE INDEX IF NOT EXISTS qr_codes_url ON qr_codes (url);
+            """)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if 0 < version < SCHEMA_VERSION:
+                self._migrate(conn)
+            # Created after migrating, as older databases only have these columns from then on
+            conn.executescript("""
+                CREATE INDEX IF NOT EXISTS qr_codes_expires ON qr_codes (expires_at) WHERE expires_at IS NOT NULL;
+                CREATE INDEX IF NOT EXISTS qr_codes_last_access ON qr_codes (last_access);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """
+        Brings a database created by an older version up to SCHEMA_VERSION.
+        The write lock is taken first, so concurrently starting workers migrate it only once.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                for statement in MIGRATIONS.get(target, []):
+                    conn.execute(statement)
+                logging.info(f"Migrated the QR code index to schema version {target}")
+            conn.execute(f"PRAGMA user_version={max(version, SCHEMA_VERSION)}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def backfill(self, storage: QRCodeStorage) -> int:
+        """
+        Indexes the QR codes stored before the index existed, once per database.
+        It walks the whole storage, so it is run as a startup step instead of on first use.
+        The write lock is taken first and the version checked again under it, so when several
+        workers start at once only the first one scans and the others wait for it to finish.
+
+        Parameters:
+        - storage (QRCodeStorage): The storage backend holding the codes.
+
+        Returns:
+        - The number of QR codes indexed, 0 if the index was already backfilled.
+        """
+        with self._lock:
+            conn = self._connection()
+            if conn.execute("PRAGMA user_version").fetchone()[0] != 0:
+                return 0
+            conn.execute(f"PRAGMA busy_timeout={BACKFILL_BUSY_TIMEOUT}")
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            finally:
+                conn.execute("PRAGMA busy_timeout=5000")
+            try:
+                count = 0
+                if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+                    for filename, size_bytes, mtime in storage.scan():
+                        row = _existing_row(filename, size_bytes, mtime)
+                        if row is not None:
+                            conn.execute(_INSERT_EXISTING, row)
+                            count += 1
+                    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+                    logging.info(f"Indexed {count} existing QR code(s)")
+                conn.execute("COMMIT")
+                return count
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def add_existing(self, filename: str, size_bytes: int, mtime: float):
+        """
+        Records a QR code found in storage without an index entry, keeping the entry if there is one.
+        """
+        row = _existing_row(filename, size_bytes, mtime)
+        if row is not None:
+            with self._lock:
+                self._connection().execute(_INSERT_EXISTING, row)
+
+    def add(self, filename: str, url: str, fill_color: str, back_color: str, size: int, size_bytes: int,
+            created_at: Optional[float] = None, error_correction: str = "M", mask: Union[str, int] = "auto",
+            expires_at: Optional[float] = None):
+        """
+        Records a newly stored QR code, replacing any previous entry with the same filename.
+        """
+        created_at = created_at or time.time()
+        with self._lock:
+            self._touched.pop(filename, None)
+            self._connection().execute(
+                _INSERT,
+                (filename, url, fill_color, back_color, size, size_bytes, error_correction, str(mask), expires_at,
+                 created_at, created_at)
+            )
+
+    def add_many(self, entries: List[Tuple[str, str, str, str, int, int, str, str, Optional[float]]]):
+        """
+        Records many newly stored QR codes in one transaction. Each entry is a
+        (filename, url, fill_color, back_color, size, size_bytes, error_correction, mask, expires_at) tuple.
+        """
+        if not entries:
+            return
+        created_at = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(_INSERT, [(*entry, created_at, created_at) for entry in entries])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def touch(self, filename: str):
+        """
+        Notes that a QR code was used, for least-recently-used eviction.
+        Only kept in memory until the next flush_touches(), so it costs no write.
+        """
+        self._touched[filename] = time.time()
+
+    def flush_touches(self):
+        """
+        Writes the access times noted by touch() since the last flush, in one transaction.
+        """
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            if not touched:
+                return
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "UPDATE qr_codes SET last_access = ? WHERE filename = ? AND (last_access IS NULL OR last_access < ?)",
+                    [(accessed, filename, accessed) for filename, accessed in touched.items()]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def expired(self, limit: int, now: Optional[float] = None) -> List[Dict]:
+        """
+        Returns up to `limit` QR codes whose TTL has run out, those that expired first first.
+        """
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT * FROM qr_codes WHERE expires_at <= ? ORDER BY expires_at LIMIT ?", (now or time.time(), limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def least_recently_used(self, limit: int) -> List[Dict]:
+        """
+        Returns the `limit` QR codes that were used the longest time ago.
+        """
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT * FROM qr_codes ORDER BY last_access LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove_if_unchanged(self, entry: Dict) -> bool:
+        """
+        Forgets a QR code only if it was not stored again since `entry` was read.
+
+        Returns:
+        - True if the entry was removed.
+        """
+        with self._lock:
+            cursor = self._connection().execute(
+                "DELETE FROM qr_codes WHERE filename = ? AND created_at = ?", (entry["filename"], entry["created_at"])
+            )
+        return cursor.rowcount > 0
+
+    def remove(self, filename: str):
+        """
+        Forgets a deleted QR code.
+        """
+        with self._lock:
+            self._connection().execute("DELETE FROM qr_codes WHERE filename = ?", (filename,))
+
+    def rename(self, old_filename: str, new_filename: str):
+        """
+        Moves the entry of a QR code that was stored under a new filename.
+        """
+        with self._lock:
+            self._connection().execute(
+                "UPDATE OR REPLACE qr_codes SET filename = ? WHERE filename = ?", (new_filename, old_filename)
+            )
+
+    def get(self, filename: str) -> Optional[Dict]:
+        """
+        Returns the indexed metadata of a QR code, or None if it is not indexed.
+        """
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM qr_codes WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list(self, limit: int, cursor: Optional[str] = None, url_prefix: Optional[str] = None,
+             created_since: Optional[float] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Returns one page of indexed QR codes, oldest first.
+        Parameters:
+        - limit (int): Maximum number of entries to return.
+        - cursor (Optional[str]): Opaque cursor returned with the previous page.
+        - url_prefix (Optional[str]): Only return codes whose URL starts with this prefix.
+        - created_since (Optional[float]): Only return codes created at or after this Unix timestamp.
+        Expired codes are left out, even before the sweeper has deleted them.
+
+        Returns:
+        - A (entries, next_cursor) tuple; next_cursor is None on the last page.
+
+        Raises:
+        - ValueError: If the cursor is malformed.
+        """
+        clauses, params = ["(expires_at IS NULL OR expires_at > ?)"], [time.time()]
+        if cursor:
+            created_at, filename = _decode_cursor(cursor)
+            clauses.append("(created_at, filename) > (?, ?)")
+            params += [created_at, filename]
+        if url_prefix:
+            # A range instead of LIKE keeps the comparison case-sensitive and able to use the url index
+            clauses.append("url >= ? AND url < ?")
+            params += [url_prefix, url_prefix + "\U0010ffff"]
+        if created_since is not None:
+            clauses.append("created_at >= ?")
+            params.append(created_since)
+        where = f"WHERE {' AND '.join(clauses)}"
+        query = f"SELECT * FROM qr_codes {where} ORDER BY created_at, filename LIMIT ?"
+        with self._lock:
+            rows = self._connection().execute(query, (*params, limit + 1)).fetchall()
+        entries = [dict(row) for row in rows[:limit]]
+        next_cursor = _encode_cursor(entries[-1]) if len(rows) > limit else None
+        return entries, next_cursor
+
+    def totals(self) -> Tuple[int, int]:
+        """
+        Returns the number of indexed QR codes and their total size in bytes.
+        """
+        with self._lock:
+            count, size_bytes = self._connection().execute("SELECT COUNT(*), TOTAL(size_bytes) FROM qr_codes").fetchone()
+        return count, int(size_bytes)
+
+    def close(self):
+        self.flush_touches()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _existing_row(filename: str, size_bytes: int, mtime: float) -> Optional[Tuple]:
+    """
+    Builds the index row of a QR code found in storage, or returns None if its name is not recognised.
+    Only flat names of default-style codes have their style recorded; for the others it is unknown,
+    and sharded names are hashes, so their URL is unknown too and recorded as empty.
+    """
+    if is_sharded_filename(filename):
+        return filename, "", None, None, None, size_bytes, mtime, mtime
+    try:
+        url = decode_qr_code_filename(filename)
+    except Exception:
+        logging.warning(f"Skipping unrecognised file while indexing QR codes: {filename}")
+        return None
+    default_style = filename.count(".") == 1
+    return (filename, url, "black" if default_style else None, "white" if default_style else None,
+            10 if default_style else None, size_bytes, mtime, mtime)
+
+
+def is_expired(entry: Dict, now: Optional[float] = None) -> bool:
+    """
+    Tells whether an indexed QR code's TTL has run out.
+    """
+    return entry["expires_at"] is not None and entry["expires_at"] <= (now or time.time())
+
+
+def _encode_cursor(entry: Dict) -> str:
+    return base64.urlsafe_b64encode(f"{entry['created_at']!r}|{entry['filename']}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        created_at, filename = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(created_at), filename
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+# Shared index of the QR codes stored in QR_DIRECTORY
+qr_index = QRCodeIndex(settings.QR_INDEX_PATH, settings.QR_DIRECTORY)
@@ -1,73 +1,202 @@
-import os
-from typing import List
-import qrcode
+import asyncio
+import io
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import logging
 from pathlib import Path
 from app.config import settings
+from app.services.storage import QRCodeStorage, get_storage
 
-def list_qr_codes(directory_path: Path) -> List[str]:
+# A named logger, so its success messages can be sampled in logging.conf
+logger = logging.getLogger(__name__)
+
+# Width of the quiet zone around QR codes, in modules
+QR_BORDER = 5
+
+def list_qr_codes(storage: Optional[QRCodeStorage] = None) -> List[str]:
     """
-    Lists all QR code images in the specified directory by returning their filenames.
+    Lists all stored QR code images (PNG and SVG) by returning their filenames.
     Parameters:
-    - directory_path (Path): The filesystem path to the directory containing QR code images.
+    - storage (Optional[QRCodeStorage]): The storage backend; defaults to the configured one.
 
     Returns:
-    - A list of filenames (str) for QR codes found in the directory.
+    - A list of filenames (str) for the stored QR codes.
     """
+    storage = storage or get_storage()
     try:
-        # Create directory if it doesn't exist
-        directory_path.mkdir(parents=True, exist_ok=True)
-        # List all files ending with '.png' in the specified directory.
-        return [f for f in os.listdir(directory_path) if f.endswith('.png')]
-    except FileNotFoundError:
-        logging.error(f"Directory not found: {directory_path}")
-        raise
+        return storage.list()
     except OSError as e:
-        logging.error(f"An OS error occurred while listing QR codes: {e}")
+        logger.error(f"An OS error occurred while listing QR codes: {e}")
         raise
 
-def generate_qr_code(data: str, path: Path, fill_color: str = 'black', back_color: str = 'white', size: int = 10):
+def render_qr_code(data: str, fill_color: str = 'black', back_color: str = 'white', size: int = 10,
+                   engine: Optional[str] = None, format: str = 'png', error_correction: str = 'M',
+                   mask: Union[str, int] = 'auto', timings: Optional[Dict[str, float]] = None) -> bytes:
+    """
+    Renders a QR code for the provided data into an in-memory image.
+    Parameters:
+    - data (str): The data to encode in the QR code.
+    - fill_color (str): Color of the QR code.
+    - back_color (str): Background color of the QR code.
+    - size (int): The size of each box in the QR code grid.
+    - engine (Optional[str]): "fast" or "pil" for PNG output; defaults to the QR_RENDER_ENGINE setting.
+    - format (str): "png" or "svg".
+    - error_correction (str): Error correction level, "L", "M", "Q" or "H".
+    - mask (Union[str, int]): "auto", "fast" or a fixed mask pattern 0-7 (see qr_encoder.encode_modules).
+    - timings (Optional[Dict[str, float]]): If given, receives the seconds spent in the "make", "rasterize" and "encode" stages.
+
+    Returns:
+    - The PNG or SVG image bytes.
+    """
+    # numpy and the rasterizer are only imported by the processes that actually render,
+    # which keeps them out of the API workers' import time
+    from app.services.rasterizer import modules_to_svg, rasterize_png
+
+    timings = {} if timings is None else timings
+    # Every engine draws the same module matrix, so a mask choice such as "fast" means the same whatever draws it
+    start = time.perf_counter()
+    modules = module_matrix(data, error_correction, mask)
+    timings["make"] = time.perf_counter() - start
+    if format == "svg":
+        start = time.perf_counter()
+        image_bytes = modules_to_svg(modules, size, QR_BORDER, fill_color, back_color)
+        timings["encode"] = time.perf_counter() - start
+        return image_bytes
+    if (engine or settings.QR_RENDER_ENGINE) == "fast":
+        return rasterize_png(modules, size, QR_BORDER, fill_color, back_color, compress_level=9, timings=timings)
+    return _draw_png_with_pil(modules, size, fill_color, back_color, timings)
+
+def _draw_png_with_pil(modules, size: int, fill_color: str, back_color: str, timings: Dict[str, float]) -> bytes:
+    """
+    Draws a module matrix through qrcode's PIL image factory, one box per dark module.
+    """
+    from qrcode.image.pil import PilImage
+
+    start = time.perf_counter()
+    img = PilImage(QR_BORDER, len(modules), size, qrcode_modules=modules, fill_color=fill_color, back_color=back_color)
+    for row, column in zip(*modules.nonzero()):
+        img.drawrect(row, column)
+    timings["rasterize"] = time.perf_counter() - start
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    img.save(buffer)
+    timings["encode"] = time.perf_counter() - start
+    return buffer.getvalue()
+
+def module_matrix(data: str, error_correction: str = 'M', mask: Union[str, int] = 'auto'):
+    """
+    Returns the module matrix (True for dark modules, without the quiet zone) of the QR code
+    encoding `data`, from this process's matrix cache when it was computed before.
+    """
+    from app.services.matrix_cache import matrix_cache
+    from app.services.qr_encoder import encode_modules
+
+    key = (data, error_correction, mask)
+    modules = matrix_cache.get(key)
+    if modules is None:
+        modules = encode_modules(data, error_correction, mask)
+        matrix_cache.put(key, modules)
+    return modules
+
+def generate_qr_code(data: str, qr_filename: str, fill_color: str = 'black', back_color: str = 'white', size: int = 10,
+                     format: str = 'png', error_correction: str = 'M', mask: Union[str, int] = 'auto',
+                     timings: Optional[Dict[str, float]] = None, storage: Optional[QRCodeStorage] = None) -> bytes:
     """
-    Generates a QR code based on the provided data and saves it to a specified file path.
+    Generates a QR code based on the provided data and stores it under the given filename.
     Parameters:
     - data (str): The data to encode in the QR code.
-    - path (Path): The filesystem path where the QR code image will be saved.
+    - qr_filename (str): The filename the QR code is stored under.
     - fill_color (str): Color of the QR code.
     - back_color (str): Background color of the QR code.
     - size (int): The size of each box in the QR code grid.
+    - format (str): "png" or "svg".
+    - error_correction (str): Error correction level, "L", "M", "Q" or "H".
+    - mask (Union[str, int]): "auto", "fast" or a fixed mask pattern 0-7.
+    - timings (Optional[Dict[str, float]]): If given, receives the seconds spent in each rendering stage and in the "write" stage.
+    - storage (Optional[QRCodeStorage]): The storage backend; defaults to the configured one.
+
+    Returns:
+    - The image bytes that were stored.
+    """
+    logger.debug("QR code generation started")
+    try:
+        timings = {} if timings is None else timings
+        image_bytes = render_qr_code(data, fill_color, back_color, size, format=format,
+                                     error_correction=error_correction, mask=mask, timings=timings)
+        start = time.perf_counter()
+        store_qr_code(qr_filename, image_bytes, format, storage)
+        timings["write"] = time.perf_counter() - start
+        return image_bytes
+    except Exception as e:
+        logger.error(f"Failed to generate/save QR code: {e}")
+        raise
+
+def with_stage_timings(func: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, float], Dict[str, int]]:
+    """
+    Calls a render function with a fresh `timings` dict and returns (result, timings, matrix cache stats).
+    Used to send the stage timings of renders run in pool workers, and the state of the
+    worker's matrix cache, back to the API process.
+    """
+    from app.services.matrix_cache import matrix_cache
+
+    timings: Dict[str, float] = {}
+    return func(*args, timings=timings, **kwargs), timings, matrix_cache.stats()
+
+def store_qr_code(qr_filename: str, image_bytes: bytes, format: str = 'png', storage: Optional[QRCodeStorage] = None):
+    """
+    Stores a rendered QR code image in the storage backend, replacing any previous one.
+    Parameters:
+    - qr_filename (str): The QR code filename.
+    - image_bytes (bytes): The rendered image.
+    - format (str): "png" or "svg".
+    - storage (Optional[QRCodeStorage]): The storage backend; defaults to the configured one.
     """
-    logging.debug("QR code generation started")
     try:
-        # Create directory if it doesn't exist
-        path.parent.mkdir(parents=True, exist_ok=True)
-        
-        qr = qrcode.QRCode(version=1, box_size=size, border=5)
-        qr.add_data(data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color=fill_color, back_color=back_color)
-        img.save(str(path))
-        logging.info(f"QR code successfully saved to {path}")
+        (storage or get_storage()).save(qr_filename, image_bytes, format)
+        logger.info(f"QR code successfully saved as {qr_filename}")
     except Exception as e:
-        logging.error(f"Failed to generate/save QR code: {e}")
+        logger.error(f"Failed to save QR code: {e}")
         raise
 
-def delete_qr_code(file_path: Path):
+def remove_qr_code(qr_filename: str, storage: Optional[QRCodeStorage] = None):
     """
-    Deletes the specified QR code image file.
+    Deletes a stored QR code image.
     Parameters:
-    - file_path (Path): The filesystem path to the QR code image file to delete.
+    - qr_filename (str): The QR code filename.
+    - storage (Optional[QRCodeStorage]): The storage backend; defaults to the configured one.
+
+    Raises:
+    - FileNotFoundError: If the QR code does not exist.
     """
     try:
-        if file_path.exists():
-            file_path.unlink()
-            logging.info(f"Successfully deleted QR code: {file_path}")
-        else:
-            logging.warning(f"QR code not found: {file_path}")
-            raise FileNotFoundError(f"QR code not found: {file_path}")
+        (storage or get_storage()).delete(qr_filename)
+        logger.info(f"Successfully deleted QR code: {qr_filename}")
+    except FileNotFoundError:
+        logger.warning(f"QR code not found: {qr_filename}")
+        raise
     except Exception as e:
-        logging.error(f"Failed to delete QR code: {e}")
+        logger.error(f"Failed to delete QR code: {e}")
         raise
 
+async def save_qr_code(qr_filename: str, image_bytes: bytes, format: str = 'png', storage: Optional[QRCodeStorage] = None):
+    """
+    Like store_qr_code, but runs off the event loop.
+    """
+    # Runs on the event loop's default thread pool in a single hop, carrying over the request id for logging
+    await asyncio.to_thread(store_qr_code, qr_filename, image_bytes, format, storage)
+
+async def delete_qr_code(qr_filename: str, storage: Optional[QRCodeStorage] = None):
+    """
+    Deletes a stored QR code image without blocking the event loop.
+    Parameters:
+    - qr_filename (str): The QR code filename.
+    - storage (Optional[QRCodeStorage]): The storage backend; defaults to the configured one.
+
+    Raises:
+    - FileNotFoundError: If the QR code does not exist.
+    """
+    await asyncio.to_thread(remove_qr_code, qr_filename, storage)
+
 def create_directory(directory_path: Path):
     """
     Creates a directory at the specified path if it doesn't already exist.
@@ -76,7 +205,7 @@ def create_directory(directory_path: Path):
     """
     try:
         directory_path.mkdir(parents=True, exist_ok=True)
-        logging.info(f"Directory created/verified: {directory_path}")
+        logger.info(f"Directory created/verified: {directory_path}")
     except Exception as e:
-        logging.error(f"Failed to create directory {directory_path}: {e}")
+        logger.error(f"Failed to create directory {directory_path}: {e}")
         raise
\ No newline at end of file
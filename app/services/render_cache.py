@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from app.config import settings
+
+
+class RenderCache:
+    """
+    In-process LRU cache of recently rendered QR code images, bounded by total size.
+
+    Entries are keyed by QR code filename, which is derived from the full
+    (url, fill_color, back_color, size, format, error_correction, mask) cache key.
+
+    Parameters:
+    - max_bytes (int): Maximum total size of cached images. 0 disables the cache.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the cached image for `key`, or None if it is not cached.
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes):
+        """
+        Caches `data` under `key`, evicting least recently used entries to stay within max_bytes.
+        Images larger than the whole cache are not stored.
+        """
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def invalidate(self, key: str):
+        """
+        Drops `key` from the cache, e.g. after the QR code was deleted.
+        """
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is not None:
+                self._bytes -= len(data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Shared cache of rendered QR codes used by the API endpoints
+render_cache = RenderCache(settings.RENDER_CACHE_MAX_BYTES)
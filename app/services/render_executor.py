@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from app.config import settings
+
+
+class RenderQueueFullError(RuntimeError):
+    """
+    Raised when a render is submitted while the pool and its queue are already full.
+    """
+
+
+class RenderExecutor:
+    """
+    Runs CPU-bound QR rendering off the event loop on a bounded process pool.
+
+    At most `pool_size + queue_depth` renders may be in flight at once; further
+    submissions are rejected with RenderQueueFullError instead of piling up
+    behind the ones already waiting.
+
+    Parameters:
+    - pool_size (int): Number of worker processes. 0 renders on the event loop's default thread pool instead.
+    - queue_depth (int): Number of renders allowed to wait for a free worker.
+    """
+
+    def __init__(self, pool_size: int, queue_depth: int):
+        self.pool_size = pool_size
+        self.queue_depth = queue_depth
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of renders that may be running or queued at once."""
+        return max(self.pool_size, 1) + self.queue_depth
+
+    @property
+    def pending(self) -> int:
+        """Number of renders currently running or waiting for a worker."""
+        return self._pending
+
+    def _get_executor(self) -> Optional[Executor]:
+        # The pool is created on first use so that importing the app (or forking
+        # gunicorn workers) never starts worker processes.
+        if self.pool_size <= 0:
+            return None
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                    self._executor = ProcessPoolExecutor(max_workers=self.pool_size, mp_context=context)
+                    logging.info(f"Started render pool with {self.pool_size} worker(s)")
+        return self._executor
+
+    async def submit(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs `func(*args, **kwargs)` on the render pool and awaits its result.
+        `func` and its arguments must be picklable when a process pool is used.
+
+        Raises:
+        - RenderQueueFullError: If the pool and its queue are already full.
+        """
+        if self._pending >= self.capacity:
+            raise RenderQueueFullError(f"Render queue is full ({self._pending} renders pending)")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+        finally:
+            self._pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops the worker processes, if they were ever started.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+            logging.info("Render pool shut down")
+
+
+# Shared executor used by the API endpoints
+render_executor = RenderExecutor(settings.RENDER_POOL_SIZE, settings.RENDER_QUEUE_DEPTH)
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from app.config import settings
+from app.services.metrics import render_coalesced
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where only in-process coalescing is done
+    fcntl = None
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key within one process.
+
+    The first caller for a key starts the work as its own task; callers arriving
+    while it is in flight await that same task instead of repeating the work.
+    The task is shielded, so a caller that goes away does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Returns the result of `func()`, sharing it with every concurrent call for `key`.
+        """
+        task = self._tasks.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            render_coalesced.inc("worker")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+@asynccontextmanager
+async def host_lock(key: str, lock_dir: Optional[Path] = None, stripes: Optional[int] = None) -> AsyncIterator[bool]:
+    """
+    Holds an exclusive flock shared by every worker on this host while the block runs.
+
+    Keys are hashed onto a fixed number of lock files so they never need cleaning up;
+    unrelated keys occasionally share a lock, which only makes one wait for the other.
+    The lock is polled rather than waited for on a thread, so waiting ties up nothing.
+    Without fcntl or a lock directory this does no locking.
+
+    Parameters:
+    - key (str): What is being locked, e.g. a QR code filename.
+    - lock_dir (Optional[Path]): Directory of the lock files; defaults to the RENDER_LOCK_DIR setting.
+    - stripes (Optional[int]): Number of lock files; defaults to the RENDER_LOCK_STRIPES setting.
+
+    Yields:
+    - True if the lock was held by someone else and had to be waited for.
+    """
+    lock_dir = lock_dir or settings.RENDER_LOCK_DIR
+    stripes = stripes or settings.RENDER_LOCK_STRIPES
+    if fcntl is None or lock_dir is None:
+        yield False
+        return
+
+    stripe = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=4).digest(), "big") % stripes
+    path = lock_dir / f"{stripe}.lock"
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        waited = False
+        delay = 0.002
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                waited = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        yield waited
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+# Coalesces identical QR code creations within this worker
+render_flights = SingleFlight()
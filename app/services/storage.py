@@ -0,0 +1,514 @@
+"""
+Storage backends holding the rendered QR code images.
+
+"directory" keeps every code as its own file under QR_DIRECTORY, where nginx
+serves it directly. "segments" appends codes to large packed segment files
+instead, with a SQLite index of where each one starts; this avoids one inode,
+one directory entry and one rename per code, and reads are slices of a
+memory-mapped segment. Deleting from a segment only drops the index entry, and
+compaction later rewrites the live records of mostly dead segments.
+"""
+import gzip
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from app.config import settings
+from app.utils.common import QR_CODE_EXTENSIONS, qr_code_relpath
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where only a single process may append
+    fcntl = None
+
+# Levels of prefix directories of the sharded layout
+SHARD_DEPTH = 2
+# Segment record header: magic, filename length, image length, followed by the filename and the image
+RECORD_HEADER = struct.Struct("<4sHI")
+RECORD_MAGIC = b"QRS1"
+SEGMENT_SUFFIX = ".seg"
+# Memory maps of segments kept open per process
+MAX_MAPPED_SEGMENTS = 64
+# Records moved per step of a compaction, between which appends may go ahead
+COMPACT_BATCH = 256
+
+
+def gzip_sidecar_path(path: Path) -> Path:
+    """
+    Returns the path of the precompressed copy of a QR code image, as served by nginx gzip_static.
+    """
+    return path.with_name(path.name + ".gz")
+
+def _fsync_directory(directory: Path):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def write_file_atomic(path: Path, data: bytes, fsync: Optional[str] = None):
+    """
+    Writes `data` to a temporary file next to `path` and renames it into place, so readers
+    such as nginx only ever see the old file or the complete new one.
+    Missing parent directories are created on demand rather than checked before every write.
+    Parameters:
+    - path (Path): The final location of the file.
+    - data (bytes): The file contents.
+    - fsync (Optional[str]): "none", "file" (flush the data before the rename) or "full" (also flush
+      the directory after it); defaults to the QR_FSYNC setting.
+    """
+    fsync = fsync or settings.QR_FSYNC
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if fsync != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if fsync == "full":
+        _fsync_directory(path.parent)
+
+
+class QRCodeStorage(ABC):
+    """
+    Where rendered QR code images are kept, addressed by their QR code filename.
+    """
+
+    @abstractmethod
+    def save(self, qr_filename: str, image_bytes: bytes, format: str = 'png'):
+        """
+        Durably stores an image (as set by QR_FSYNC), replacing any previous one under the same name.
+        """
+
+    @abstractmethod
+    def delete(self, qr_filename: str):
+        """
+        Removes an image.
+
+        Raises:
+        - FileNotFoundError: If no image is stored under that name.
+        """
+
+    @abstractmethod
+    def exists(self, qr_filename: str) -> bool:
+        """
+        Tells whether an image is stored under that name.
+        """
+
+    @abstractmethod
+    def list(self) -> List[str]:
+        """
+        Returns the filenames of all stored images.
+        """
+
+    @abstractmethod
+    def scan(self) -> Iterator[Tuple[str, int, float]]:
+        """
+        Walks every stored image, e.g. to index codes stored before the index existed.
+
+        Returns:
+        - An iterator of (filename, size in bytes, modification time) tuples.
+        """
+
+    @abstractmethod
+    def read(self, qr_filename: str) -> Union[bytes, memoryview]:
+        """
+        Returns a stored image.
+
+        Raises:
+        - FileNotFoundError: If no image is stored under that name.
+        """
+
+    @abstractmethod
+    def open_region(self, qr_filename: str) -> Tuple[BinaryIO, int, int]:
+        """
+        Opens the file holding a stored image, so it can be sent without reading it into memory.
+
+        Returns:
+        - (file, offset, length) of the image within the file; the caller closes the file.
+
+        Raises:
+        - FileNotFoundError: If no image is stored under that name.
+        """
+
+    def compact(self, min_dead_ratio: float) -> int:
+        """
+        Reclaims the space of deleted images, if the backend leaves any behind.
+
+        Returns:
+        - The number of bytes reclaimed.
+        """
+        return 0
+
+    def close(self):
+        pass
+
+
+class DirectoryStorage(QRCodeStorage):
+    """
+    One file per QR code, at its flat or sharded path under the directory.
+    SVG images also get a precompressed ".gz" sidecar when QR_SVG_GZIP_SIDECAR is enabled.
+
+    Parameters:
+    - directory (Optional[Path]): The directory holding the images; defaults to QR_DIRECTORY.
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        self._directory = directory
+
+    @property
+    def directory(self) -> Path:
+        return self._directory if self._directory is not None else settings.QR_DIRECTORY
+
+    def path(self, qr_filename: str) -> Path:
+        return self.directory / qr_code_relpath(qr_filename)
+
+    def save(self, qr_filename: str, image_bytes: bytes, format: str = 'png'):
+        path = self.path(qr_filename)
+        if format == "svg" and settings.QR_SVG_GZIP_SIDECAR:
+            # Written first so the image never appears without its sidecar
+            write_file_atomic(gzip_sidecar_path(path), gzip.compress(image_bytes, compresslevel=9, mtime=0))
+        write_file_atomic(path, image_bytes)
+
+    def delete(self, qr_filename: str):
+        path = self.path(qr_filename)
+        path.unlink()
+        gzip_sidecar_path(path).unlink(missing_ok=True)
+
+    def exists(self, qr_filename: str) -> bool:
+        return self.path(qr_filename).is_file()
+
+    def list(self) -> List[str]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return [qr_filename for qr_filename, _, _ in self.scan()]
+
+    def scan(self) -> Iterator[Tuple[str, int, float]]:
+        # Flat names are at the top level, sharded ones two prefix directories down
+        if self.directory.is_dir():
+            yield from _scan_directory(self.directory, SHARD_DEPTH)
+
+    def read(self, qr_filename: str) -> bytes:
+        return self.path(qr_filename).read_bytes()
+
+    def open_region(self, qr_filename: str) -> Tuple[BinaryIO, int, int]:
+        file = open(self.path(qr_filename), "rb")
+        return file, 0, os.fstat(file.fileno()).st_size
+
+
+class SegmentStorage(QRCodeStorage):
+    """
+    Append-only packed segment files with an offset index.
+
+    Every image is appended to the newest segment as a record (header, filename,
+    image), and the SQLite offset index in the same directory maps the filename
+    to its segment, offset and length. A new segment is started once the newest
+    one reaches max_segment_bytes. Appends from all processes on the host are
+    serialized by a lock file.
+
+    Reads slice a per-process memory map of the segment, so an image is never
+    copied into Python objects on its way out. Segments are only ever appended
+    to and are deleted whole by compaction, after their records have been moved,
+    so a slice stays valid for as long as it is held.
+
+    Parameters:
+    - directory (Path): The directory holding the segments and the offset index.
+    - max_segment_bytes (int): Size after which a new segment is started.
+    """
+
+    def __init__(self, directory: Path, max_segment_bytes: int):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._append_threads = threading.Lock()
+        # segment number -> memory map of it, least recently used first
+        self._maps: "OrderedDict[int, mmap.mmap]" = OrderedDict()
+        self._maps_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily so it is never shared across forked workers
+        if self._conn is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.directory / "offsets.sqlite"), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS records (
+                    filename TEXT PRIMARY KEY,
+                    segment INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS records_segment ON records (segment);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"{segment:08d}{SEGMENT_SUFFIX}"
+
+    def segments(self) -> List[int]:
+        """
+        Returns the numbers of the existing segments, oldest first.
+        """
+        if not self.directory.is_dir():
+            return []
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+
+    @contextmanager
+    def _append_lock(self) -> Iterator[None]:
+        # A lock file opened per use, so threads of one process exclude each other too
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._append_threads:
+            if fcntl is None:
+                yield
+                return
+            fd = os.open(self.directory / "append.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _append(self, records: List[Tuple[str, bytes]]) -> List[Tuple[str, int, int, int]]:
+        """
+        Appends records to the newest segment, starting a new one when it is full.
+        Must be called with the append lock held.
+
+        Returns:
+        - (filename, segment, offset, length) of each image, for the offset index.
+        """
+        segments = self.segments()
+        segment = segments[-1] if segments else 1
+        placed = []
+        fd = os.open(self._segment_path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        created = not segments
+        try:
+            offset = os.fstat(fd).st_size
+            for qr_filename, image_bytes in records:
+                if offset >= self.max_segment_bytes:
+                    self._flush(fd)
+                    os.close(fd)
+                    segment += 1
+                    fd = os.open(self._segment_path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                    offset, created = 0, True
+                name = qr_filename.encode()
+                _write_all(fd, b"".join((RECORD_HEADER.pack(RECORD_MAGIC, len(name), len(image_bytes)), name, image_bytes)))
+                data_offset = offset + RECORD_HEADER.size + len(name)
+                placed.append((qr_filename, segment, data_offset, len(image_bytes)))
+                offset = data_offset + len(image_bytes)
+            self._flush(fd)
+        finally:
+            os.close(fd)
+        if created and settings.QR_FSYNC == "full":
+            _fsync_directory(self.directory)
+        return placed
+
+    @staticmethod
+    def _flush(fd: int):
+        if settings.QR_FSYNC != "none":
+            os.fsync(fd)
+
+    def save(self, qr_filename: str, image_bytes: bytes, format: str = 'png'):
+        with self._append_lock():
+            (placed,) = self._append([(qr_filename, image_bytes)])
+            with self._lock:
+                self._connection().execute(
+                    "INSERT OR REPLACE INTO records (filename, segment, offset, length) VALUES (?, ?, ?, ?)", placed
+                )
+
+    def delete(self, qr_filename: str):
+        # The record stays in its segment until compaction
+        with self._lock:
+            deleted = self._connection().execute("DELETE FROM records WHERE filename = ?", (qr_filename,)).rowcount
+        if not deleted:
+            raise FileNotFoundError(qr_filename)
+
+    def exists(self, qr_filename: str) -> bool:
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM records WHERE filename = ?", (qr_filename,)).fetchone() is not None
+
+    def list(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._connection().execute("SELECT filename FROM records")]
+
+    def scan(self) -> Iterator[Tuple[str, int, float]]:
+        # Records carry no timestamp, so each image gets the time its segment was last written
+        with self._lock:
+            rows = self._connection().execute("SELECT filename, segment, length FROM records ORDER BY segment").fetchall()
+        mtimes: Dict[int, float] = {}
+        for qr_filename, segment, length in rows:
+            if segment not in mtimes:
+                try:
+                    mtimes[segment] = self._segment_path(segment).stat().st_mtime
+                except FileNotFoundError:
+                    continue  # Compacted meanwhile; its records were moved to a segment read later
+            yield qr_filename, length, mtimes[segment]
+
+    def read(self, qr_filename: str) -> memoryview:
+        _, offset, length, mapped = self._locate(qr_filename, self._map)
+        return memoryview(mapped)[offset:offset + length]
+
+    def open_region(self, qr_filename: str) -> Tuple[BinaryIO, int, int]:
+        # The open file stays readable even if compaction deletes the segment meanwhile
+        _, offset, length, file = self._locate(qr_filename, lambda segment, end: open(self._segment_path(segment), "rb"))
+        return file, offset, length
+
+    def _locate(self, qr_filename: str, opener: Callable[[int, int], Any]) -> Tuple[int, int, int, Any]:
+        """
+        Looks up where an image is stored and opens its segment with `opener(segment, end)`.
+        """
+        for attempt in range(2):
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT segment, offset, length FROM records WHERE filename = ?", (qr_filename,)
+                ).fetchone()
+            if row is None:
+                raise FileNotFoundError(qr_filename)
+            segment, offset, length = row
+            try:
+                return segment, offset, length, opener(segment, offset + length)
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                # Compacted away between the lookup and the opening; the index now points to the moved record
+
+    def _map(self, segment: int, end: int) -> mmap.mmap:
+        """
+        Returns a memory map of a segment covering at least `end` bytes, mapping it again if it has grown.
+        Maps that are replaced or evicted are not closed: slices handed out keep them alive until released.
+        """
+        with self._maps_lock:
+            mapped = self._maps.get(segment)
+            if mapped is not None and len(mapped) >= end:
+                self._maps.move_to_end(segment)
+                return mapped
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+            self._maps.move_to_end(segment)
+            while len(self._maps) > MAX_MAPPED_SEGMENTS:
+                self._maps.popitem(last=False)
+            return mapped
+
+    def dead_ratios(self) -> List[Tuple[int, int, float]]:
+        """
+        Returns (segment, size, fraction of it no longer referenced by the index) for every segment.
+        """
+        with self._lock:
+            live = dict(self._connection().execute(
+                f"SELECT segment, SUM(length + LENGTH(CAST(filename AS BLOB)) + {RECORD_HEADER.size}) FROM records GROUP BY segment"
+            ).fetchall())
+        ratios = []
+        for segment in self.segments():
+            size = self._segment_path(segment).stat().st_size
+            ratios.append((segment, size, 1 - live.get(segment, 0) / size if size else 1.0))
+        return ratios
+
+    def compact(self, min_dead_ratio: float) -> int:
+        """
+        Moves the live records of every segment (other than the newest) whose dead fraction is at
+        least `min_dead_ratio` to the end of the newest segment, then deletes it.
+
+        Records are moved in small batches, each under the append lock, so saves are
+        only held up for one batch at a time. A record saved again while its segment
+        is being compacted keeps its new location.
+        """
+        reclaimed = 0
+        candidates = [(segment, size) for segment, size, ratio in self.dead_ratios()[:-1] if ratio >= min_dead_ratio]
+        for segment, size in candidates:
+            moved = records = 0
+            while True:
+                with self._append_lock():
+                    with self._lock:
+                        rows = self._connection().execute(
+                            "SELECT filename, offset, length FROM records WHERE segment = ? LIMIT ?", (segment, COMPACT_BATCH)
+                        ).fetchall()
+                    if not rows:
+                        self._segment_path(segment).unlink(missing_ok=True)
+                        break
+                    mapped = self._map(segment, max(offset + length for _, offset, length in rows))
+                    placed = self._append([(name, mapped[offset:offset + length]) for name, offset, length in rows])
+                    with self._lock:
+                        conn = self._connection()
+                        conn.execute("BEGIN IMMEDIATE")
+                        try:
+                            # Records deleted meanwhile are not brought back
+                            conn.executemany(
+                                "UPDATE records SET segment = ?, offset = ?, length = ? "
+                                "WHERE filename = ? AND segment = ? AND offset = ?",
+                                [(new_segment, new_offset, length, name, segment, offset)
+                                 for (name, new_segment, new_offset, length), (_, offset, _) in zip(placed, rows)]
+                            )
+                            conn.execute("COMMIT")
+                        except BaseException:
+                            conn.execute("ROLLBACK")
+                            raise
+                    records += len(rows)
+                    moved += sum(RECORD_HEADER.size + len(name.encode()) + length for name, _, length in rows)
+            with self._maps_lock:
+                self._maps.pop(segment, None)
+            reclaimed += size - moved
+            logging.info(f"Compacted QR code segment {segment}: moved {records} record(s), reclaimed {size - moved} bytes")
+        return reclaimed
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        with self._maps_lock:
+            self._maps.clear()
+
+
+def _scan_directory(directory: Union[str, Path], depth: int) -> Iterator[Tuple[str, int, float]]:
+    """
+    Yields (filename, size, modification time) of the QR code files in a directory and,
+    `depth` levels down, in its shard prefix directories.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(QR_CODE_EXTENSIONS) and entry.is_file():
+                stat = entry.stat()
+                yield entry.name, stat.st_size, stat.st_mtime
+            elif depth and len(entry.name) == 2 and entry.is_dir():
+                yield from _scan_directory(entry.path, depth - 1)
+
+
+_storage: Optional[QRCodeStorage] = None
+
+def get_storage() -> QRCodeStorage:
+    """
+    Returns this process's storage backend, as chosen by QR_STORAGE_BACKEND.
+    Created on first use, so forked workers each open their own.
+    """
+    global _storage
+    if _storage is None:
+        if settings.QR_STORAGE_BACKEND == "segments":
+            _storage = SegmentStorage(settings.QR_SEGMENT_DIRECTORY, settings.QR_SEGMENT_MAX_BYTES)
+        else:
+            _storage = DirectoryStorage()
+    return _storage
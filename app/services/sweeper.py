@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.qr_index import QRCodeIndex, qr_index
+from app.services.qr_service import delete_qr_code
+from app.services.render_cache import render_cache
+from app.services.single_flight import host_lock
+from app.services.storage import get_storage
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where every worker sweeps
+    fcntl = None
+
+qr_codes_swept = metrics.counter(
+    "qr_codes_swept_total", "QR codes deleted by the sweeper, because they expired or to stay within the disk quota",
+    labels=("reason",)
+)
+segment_bytes_compacted = metrics.counter(
+    "qr_segment_bytes_compacted_total", "Bytes of deleted QR codes reclaimed by compacting storage segments"
+)
+
+
+class Sweeper:
+    """
+    Background task that deletes expired QR codes, then the least recently used ones while
+    the stored codes exceed QR_DISK_QUOTA_BYTES.
+
+    Candidates come from the index (by expiry time and by last access), so the directory
+    is never scanned. Work is done in small batches with a pause in between, and every
+    file is deleted on a thread, so a large backlog never holds up requests. Each
+    deletion takes the same host lock as creating the code, and the index entry is only
+    dropped if the code was not created again in the meantime.
+
+    Every worker runs a sweeper to write out its access times, but only the one holding
+    the sweeper lock file deletes anything at a time. It then compacts the storage
+    segments that deleted codes have left mostly dead, on a thread.
+
+    Parameters:
+    - index (QRCodeIndex): The index of stored QR codes.
+    - interval (float): Seconds between two sweeps.
+    - batch_size (int): Codes removed per batch.
+    - batch_pause (float): Seconds of rest between batches.
+    - quota_bytes (Optional[int]): Total size the stored codes are kept under; None for no quota.
+    """
+
+    def __init__(self, index: QRCodeIndex, interval: float, batch_size: int, batch_pause: float,
+                 quota_bytes: Optional[int] = None):
+        self.index = index
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.quota_bytes = quota_bytes
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """
+        Starts sweeping every `interval` seconds on the running event loop.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logging.error(f"QR code sweep failed: {e}")
+
+    async def sweep(self) -> Dict[str, int]:
+        """
+        Runs one sweep.
+
+        Returns:
+        - Counts of QR codes deleted because they "expired" or to meet the "quota".
+        """
+        counts = {"expired": 0, "quota": 0}
+        self.index.flush_touches()
+        lock_fd = _try_lock_sweeper()
+        if lock_fd is False:
+            return counts
+        try:
+            while True:
+                batch = self.index.expired(self.batch_size)
+                for entry in batch:
+                    counts["expired"] += await self._remove(entry, "expired")
+                if len(batch) < self.batch_size:
+                    break
+                await asyncio.sleep(self.batch_pause)
+
+            while self.quota_bytes is not None:
+                excess = self.index.totals()[1] - self.quota_bytes
+                if excess <= 0:
+                    break
+                removed = 0
+                for entry in self.index.least_recently_used(self.batch_size):
+                    if excess <= 0:
+                        break
+                    if await self._remove(entry, "quota"):
+                        excess -= entry["size_bytes"]
+                        removed += 1
+                counts["quota"] += removed
+                if not removed:
+                    break  # Nothing left that could be removed
+                await asyncio.sleep(self.batch_pause)
+
+            # Reclaims the space deleted codes leave in packed segments (nothing to do for the directory backend)
+            reclaimed = await asyncio.get_running_loop().run_in_executor(
+                None, get_storage().compact, settings.QR_SEGMENT_COMPACT_RATIO
+            )
+            if reclaimed:
+                segment_bytes_compacted.inc(amount=reclaimed)
+        finally:
+            if lock_fd is not None:
+                os.close(lock_fd)
+        if any(counts.values()):
+            logging.info(f"Swept {counts['expired']} expired QR code(s) and {counts['quota']} over the disk quota")
+        return counts
+
+    async def _remove(self, entry: Dict, reason: str) -> bool:
+        qr_filename = entry["filename"]
+        async with host_lock(qr_filename):
+            if not self.index.remove_if_unchanged(entry):
+                return False  # Created again since it was picked
+            render_cache.invalidate(qr_filename)
+            try:
+                await delete_qr_code(qr_filename)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Could not delete swept QR code {qr_filename}: {e}")
+        qr_codes_swept.inc(reason)
+        return True
+
+
+def _try_lock_sweeper():
+    """
+    Takes the host-wide sweeper lock without waiting.
+
+    Returns:
+    - The locked file descriptor, None if there is nothing to lock with, or False if another worker holds it.
+    """
+    if fcntl is None or settings.RENDER_LOCK_DIR is None:
+        return None
+    settings.RENDER_LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(settings.RENDER_LOCK_DIR / "sweeper.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except BlockingIOError:
+        os.close(fd)
+        return False
+
+
+# Sweeps the QR codes stored in QR_DIRECTORY
+sweeper = Sweeper(
+    qr_index, settings.SWEEP_INTERVAL, settings.SWEEP_BATCH_SIZE, settings.SWEEP_BATCH_PAUSE, settings.QR_DISK_QUOTA_BYTES
+)
@@ -0,0 +1,70 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.config import settings
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of access tokens whose signature has already been verified.
+
+    Entries are keyed by a hash of the token, so raw tokens are never kept in
+    memory, and each entry is only valid until the token's own expiry time.
+
+    Parameters:
+    - max_entries (int): Maximum number of tokens to remember. 0 disables the cache.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[str]:
+        """
+        Returns the username of a previously verified, unexpired token, or None.
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, username: str, expires_at: float):
+        """
+        Remembers a verified token until `expires_at` (a Unix timestamp).
+        """
+        if self.max_entries <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (username, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared cache of verified access tokens
+token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_MAX_ENTRIES)
@@ -1,23 +1,44 @@
+import configparser
 import logging.config
+import logging.handlers
 import os
+import queue
 import base64
-from typing import List, Dict
-from dotenv import load_dotenv
+import hashlib
+from typing import List, Dict, Optional, Tuple, Union
 from jose import jwt
 from datetime import datetime, timedelta
-from app.config import ADMIN_PASSWORD, ADMIN_USER, ALGORITHM, SECRET_KEY
+from email.utils import parsedate_to_datetime
+from app.config import ADMIN_PASSWORD, ADMIN_USER, ALGORITHM, SECRET_KEY, settings
+from app.utils.log_handlers import BoundedQueueHandler, RequestIdFilter, SamplingFilter
 import validators  # Make sure to install this package
 from urllib.parse import urlparse, urlunparse, quote, unquote
 import logging
 
-# Load environment variables from .env file for security and configuration.
-load_dotenv()
+# Media types of the supported QR code output formats
+QR_CODE_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+# File extensions of stored QR code images
+QR_CODE_EXTENSIONS = tuple(f".{format}" for format in QR_CODE_MEDIA_TYPES)
+# Version of the renderer's output, part of the ETag of images rendered on the fly. Bump it with
+# every change to the encoder or rasterizer that changes the bytes produced for the same parameters,
+# so clients and CDNs fetch the new image instead of revalidating the old one
+RENDER_VERSION = 1
+
+# Queue listeners started by setup_logging, stopped by stop_logging
+_log_listeners: List[logging.handlers.QueueListener] = []
 
 def setup_logging():
     """
     Sets up logging for the application using a configuration file.
     This ensures standardized logging across the entire application.
+
+    Besides the standard sections, logging.conf may have a [queue] section, which hands records
+    to a background listener thread so that logging never blocks on a slow log pipe, and a
+    [sampling] section, which keeps only 1 in N low-level records of chatty loggers. Every
+    record gets the id of the request it was logged in. Must run in each worker process, as
+    the listener threads do not survive a fork.
     """
+    stop_logging()
     # Construct the path to 'logging.conf', assuming it's in the project's root.
     logging_config_path = os.path.join(os.path.dirname(__file__), '..', '..', 'logging.conf')
     # Normalize the path to handle any '..' correctly.
@@ -25,6 +46,46 @@ def setup_logging():
     # Apply the logging configuration.
     logging.config.fileConfig(normalized_path, disable_existing_loggers=False)
 
+    parser = configparser.ConfigParser()
+    parser.optionxform = str  # Logger names are case-sensitive
+    parser.read(normalized_path)
+    filters: List[logging.Filter] = [RequestIdFilter()]
+    if parser.has_section("sampling"):
+        filters.append(SamplingFilter({name: parser.getint("sampling", name) for name in parser.options("sampling")}))
+    loggers = [
+        logging.getLogger(None if key == "root" else parser.get(f"logger_{key}", "qualname"))
+        for key in (key.strip() for key in parser.get("loggers", "keys").split(","))
+    ]
+
+    if not parser.getboolean("queue", "enabled", fallback=False):
+        for handler in {handler for logger in loggers for handler in logger.handlers}:
+            for log_filter in filters:
+                handler.addFilter(log_filter)
+        return
+
+    # Loggers writing to the same handlers share a queue and a listener thread
+    queue_handlers: Dict[tuple, BoundedQueueHandler] = {}
+    for logger in loggers:
+        if not logger.handlers:
+            continue
+        handlers = tuple(logger.handlers)
+        if handlers not in queue_handlers:
+            queue_handler = BoundedQueueHandler(queue.Queue(parser.getint("queue", "size", fallback=10000)))
+            for log_filter in filters:
+                queue_handler.addFilter(log_filter)
+            listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+            listener.start()
+            _log_listeners.append(listener)
+            queue_handlers[handlers] = queue_handler
+        logger.handlers = [queue_handlers[handlers]]
+
+def stop_logging():
+    """
+    Writes out the records still queued and stops the listener threads started by setup_logging.
+    """
+    while _log_listeners:
+        _log_listeners.pop().stop()
+
 def authenticate_user(username: str, password: str):
     """
     Placeholder for user authentication logic.
@@ -102,6 +163,181 @@ def decode_filename_to_url(filename: str) -> str:
         logging.error(f"Error decoding filename to URL: {e}")
         raise
 
+def qr_code_filename(url: str, fill_color: str = "black", back_color: str = "white", size: int = 10,
+                     format: str = "png", error_correction: str = "M", mask: Union[str, int] = "auto", layout: Optional[str] = None) -> str:
+    """
+    Builds the filename for a QR code from its full cache key (url, fill_color, back_color, size, format,
+    error_correction, mask).
+
+    With the "flat" layout, codes in the default style keep the plain URL-based name and other
+    styles get a short style hash appended, so different variants of the same URL never overwrite
+    each other. With the "sharded" layout the name is a fixed-length hash of the whole key, which
+    stays within filesystem name limits for URLs of any length. The format is the file extension.
+    The encoding options only enter the key when they differ from the defaults, so codes created
+    before they existed keep their names.
+
+    Parameters:
+    - url (str): The URL encoded in the QR code
+    - fill_color (str): Color of the QR code
+    - back_color (str): Background color of the QR code
+    - size (int): The size of each box in the QR code grid
+    - format (str): The image format, "png" or "svg"
+    - error_correction (str): The error correction level, "L", "M", "Q" or "H"
+    - mask (Union[str, int]): The mask choice, "auto", "fast" or 0-7
+    - layout (Optional[str]): "flat" or "sharded"; defaults to the QR_STORAGE_LAYOUT setting
+
+    Returns:
+    - str: The filename, e.g. "<encoded-url>.png", "<encoded-url>.<style-hash>.svg" or "<key-hash>.png"
+    """
+    style = [fill_color, back_color, str(size)]
+    if (error_correction, mask) != ("M", "auto"):
+        style += [error_correction, str(mask)]
+    if (layout or settings.QR_STORAGE_LAYOUT) == "sharded":
+        key = "\0".join((url, *style))
+        return f"{hashlib.sha256(key.encode()).hexdigest()[:32]}.{format}"
+    encoded_url = encode_url_to_filename(url)
+    if style == ["black", "white", "10"]:
+        return f"{encoded_url}.{format}"
+    style_hash = hashlib.blake2b("|".join(style).encode(), digest_size=6).hexdigest()
+    return f"{encoded_url}.{style_hash}.{format}"
+
+def is_sharded_filename(qr_filename: str) -> bool:
+    """
+    Tells whether a filename was built for the sharded layout (a 32 character hex hash plus extension).
+    Flat names never qualify since the base64 of a URL always contains uppercase letters.
+    """
+    stem = qr_filename.split(".", 1)[0]
+    return len(stem) == 32 and all(c in "0123456789abcdef" for c in stem)
+
+def qr_code_relpath(qr_filename: str) -> str:
+    """
+    Returns where a QR code is stored relative to QR_DIRECTORY (and to the download folder).
+    Sharded names live under two levels of prefix directories, e.g. "ab/cd/abcd....png";
+    flat names, including ones not migrated yet, live directly in the directory.
+
+    Parameters:
+    - qr_filename (str): The QR code filename
+
+    Returns:
+    - str: The relative path, using "/" as separator
+    """
+    if is_sharded_filename(qr_filename):
+        return f"{qr_filename[:2]}/{qr_filename[2:4]}/{qr_filename}"
+    return qr_filename
+
+def decode_qr_code_filename(qr_filename: str) -> str:
+    """
+    Recovers the URL from a filename built by qr_code_filename.
+
+    Parameters:
+    - qr_filename (str): The QR code filename
+
+    Returns:
+    - str: The original URL
+    """
+    return decode_filename_to_url(qr_filename.split(".", 1)[0])
+
+def qr_code_etag(qr_filename: str, stored_at: Optional[float] = None) -> str:
+    """
+    Builds a strong ETag for a QR code image from its filename, which encodes every parameter
+    that affects the image, and from the renderer that produced it. An image rendered now gets
+    RENDER_VERSION; a stored image keeps the bytes of whichever renderer stored it, so it is
+    identified by when it was stored instead.
+
+    Parameters:
+    - qr_filename (str): The QR code filename
+    - stored_at (Optional[float]): For a stored image, the Unix timestamp it was stored at
+
+    Returns:
+    - str: The quoted ETag value
+    """
+    version = f"stored:{stored_at!r}" if stored_at is not None else f"render:{RENDER_VERSION}"
+    return '"' + hashlib.blake2b(f"{qr_filename}|{version}".encode(), digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Checks an If-None-Match header value against an ETag, using weak comparison as RFC 9110 requires.
+
+    Parameters:
+    - if_none_match (Optional[str]): The If-None-Match request header, if any
+    - etag (str): The current quoted ETag of the resource
+
+    Returns:
+    - bool: True if the client's cached copy is still current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def not_modified(if_none_match: Optional[str], if_modified_since: Optional[str], etag: str, last_modified: float) -> bool:
+    """
+    Evaluates the conditional request headers of a GET or HEAD request as RFC 9110 orders them:
+    If-Modified-Since is only considered when there is no If-None-Match.
+
+    Parameters:
+    - if_none_match (Optional[str]): The If-None-Match request header, if any
+    - if_modified_since (Optional[str]): The If-Modified-Since request header, if any
+    - etag (str): The current quoted ETag of the resource
+    - last_modified (float): Unix timestamp of the last change to the resource
+
+    Returns:
+    - bool: True if a 304 Not Modified response should be sent
+    """
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False  # Invalid dates are ignored
+    if since.tzinfo is None:
+        return False
+    # HTTP dates have a resolution of one second
+    return int(last_modified) <= since.timestamp()
+
+class RangeNotSatisfiableError(ValueError):
+    """Raised when a Range request asks for bytes past the end of the representation."""
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a Range request header for a representation of `size` bytes.
+    Only single byte ranges are served; multiple or malformed ranges are ignored,
+    which RFC 9110 allows, and the whole representation is sent instead.
+
+    Parameters:
+    - range_header (Optional[str]): The Range request header, if any
+    - size (int): The length of the representation
+
+    Returns:
+    - Optional[Tuple[int, int]]: The first and last byte position (inclusive), or None to send everything
+
+    Raises:
+    - RangeNotSatisfiableError: If the range starts past the end of the representation
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, separator, last = spec.strip().partition("-")
+    if not separator or not (first.isdigit() or first == "") or not (last.isdigit() or last == "") or first == last == "":
+        return None
+    if first == "":
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiableError(range_header)
+        return max(0, size - int(last)), size - 1
+    start, end = int(first), int(last) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiableError(range_header)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
 def generate_links(action: str, qr_filename: str, base_url: str, download_url: str) -> Dict[str, str]:
     """
     Generates HATEOAS links for QR code resources.
@@ -0,0 +1,124 @@
+"""
+Logging building blocks used by setup_logging: a queue handler that hands records
+to a background listener thread, request ids, per-logger sampling and JSON output.
+"""
+import contextvars
+import copy
+import itertools
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional
+import orjson
+from app.services.metrics import metrics
+
+# Id of the request being handled, set by RequestIdMiddleware and attached to every record
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+log_records_dropped = metrics.counter(
+    "log_records_dropped_total", "Log records dropped because the logging queue was full"
+)
+log_records_sampled_out = metrics.counter(
+    "log_records_sampled_out_total", "Log records left out by per-logger sampling", labels=("logger",)
+)
+
+_traceback_formatter = logging.Formatter()
+
+# Attributes every LogRecord has; anything else on a record was passed through `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds the current request id (or "-" outside of requests) to records as `request_id`.
+    Runs on the thread that logs, where the request's context is visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only 1 in N records at INFO level or below for the configured loggers (and their children).
+    Warnings and errors are always kept.
+
+    Parameters:
+    - rates (Dict[str, int]): Logger name -> N.
+    """
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = {name: rate for name, rate in rates.items() if rate > 1}
+        self._counters: Dict[str, Iterator[int]] = {name: itertools.count() for name in self.rates}
+
+    def _sampled_logger(self, name: str) -> Optional[str]:
+        while name:
+            if name in self.rates:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        name = self._sampled_logger(record.name)
+        if name is None:
+            return True
+        # next() on itertools.count is atomic, so concurrent threads never share a slot
+        if next(self._counters[name]) % self.rates[name] == 0:
+            return True
+        log_records_sampled_out.inc(name)
+        return False
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks the thread logging: when the queue is full, because the
+    listener cannot write out records as fast as they come, new records are dropped and counted.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the base class, which bakes in a fully formatted message, only the arguments are
+        # merged into the message and the traceback turned into text (exc_info cannot be pickled
+        # or outlive its frames); formatting is left to the listener's handlers
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, with the time, level, logger, request id,
+    message, any traceback and any fields passed through `extra`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        return orjson.dumps(entry, default=str).decode()
@@ -0,0 +1,51 @@
+import mmap
+from typing import BinaryIO, Mapping, Optional
+from fastapi import status
+from fastapi.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Bytes handed to the server per body message
+CHUNK_SIZE = 256 * 1024
+
+
+class FileRegionResponse(Response):
+    """
+    Sends `length` bytes of an open file starting at `offset`, e.g. one image in a segment
+    or part of an image file for a Range request, and closes the file afterwards.
+
+    When the server supports the ASGI zero-copy extension the region is handed over as
+    the file itself, for the server to sendfile() it; otherwise it is sent as memoryview
+    chunks of a read-only memory map, so it is never read into Python objects either way.
+
+    Parameters:
+    - file (BinaryIO): The open file; the response takes ownership of it.
+    - offset (int): Where the region starts in the file.
+    - length (int): Size of the region.
+    """
+
+    def __init__(self, file: BinaryIO, offset: int, length: int, status_code: int = status.HTTP_200_OK,
+                 headers: Optional[Mapping[str, str]] = None, media_type: Optional[str] = None):
+        self.file, self.offset, self.length = file, offset, length
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"] == "HEAD" or not self.length:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            elif "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopy", "file": self.file, "offset": self.offset,
+                            "count": self.length, "more_body": False})
+            else:
+                # Mapped from the start of the file, as map offsets must be page aligned
+                mapped = mmap.mmap(self.file.fileno(), self.offset + self.length, access=mmap.ACCESS_READ)
+                await _send_chunks(memoryview(mapped)[self.offset:self.offset + self.length], send)
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
+
+
+async def _send_chunks(buffer: memoryview, send: Send):
+    for start in range(0, len(buffer), CHUNK_SIZE):
+        await send({"type": "http.response.body", "body": buffer[start:start + CHUNK_SIZE], "more_body": True})
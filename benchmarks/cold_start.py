@@ -0,0 +1,57 @@
+"""
+Measures how long a fresh worker process takes to boot and serve its first request.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 5]
+
+Every run starts a new interpreter that imports app.main, runs the startup
+hooks and serves GET / and the first login in-process, so the numbers include
+everything a new gunicorn or uvicorn worker pays before it can take traffic.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+_PROBE = """
+import json, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.config import settings
+with TestClient(app) as client:
+    started = time.perf_counter()
+    client.get("/").raise_for_status()
+    served = time.perf_counter()
+    credentials = {"username": settings.ADMIN_USER, "password": settings.ADMIN_PASSWORD}
+    client.post("/token", data=credentials).raise_for_status()
+    logged_in = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "startup": started - imported,
+    "first request": served - start,
+    "first login": logged_in - start,
+}))
+"""
+
+
+def _run_once() -> dict:
+    output = subprocess.run([sys.executable, "-c", _PROBE], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure worker cold-start time.")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh processes to time")
+    args = parser.parse_args(argv)
+
+    runs = [_run_once() for _ in range(args.runs)]
+    for stage in runs[0]:
+        timings = [run[stage] for run in runs]
+        print(f"{stage:<14} mean {statistics.mean(timings) * 1000:7.1f} ms   min {min(timings) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Measures how a burst of logins affects the latency of QR endpoints on the same worker.
+
+Usage:
+    python -m benchmarks.login_burst [--logins 20] [--probes 200]
+
+The app is driven in-process through an ASGI client, so no server or network
+is needed. Probe latency of GET /qr-codes/ is measured while idle and while a
+burst of concurrent logins is in flight, once with password verification on
+the password thread pool and once with the old inline verification for
+comparison.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from contextlib import contextmanager
+import httpx
+from app.config import settings
+from app.main import app
+from app.routers import oauth
+
+
+async def _probe_latencies(client: httpx.AsyncClient, headers: dict, probes: int, interval: float = 0.005) -> list:
+    """
+    Sends probes on a fixed schedule and measures each one from its scheduled start,
+    so time spent waiting for a blocked event loop counts towards its latency.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for i in range(probes):
+        scheduled = start + i * interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        response = await client.get("/qr-codes/", params={"limit": 1}, headers=headers)
+        latencies.append(time.perf_counter() - scheduled)
+        response.raise_for_status()
+    return latencies
+
+
+def _summary(latencies: list) -> str:
+    quantiles = statistics.quantiles(latencies, n=100)
+    return f"p50 {quantiles[49] * 1000:7.2f} ms   p99 {quantiles[98] * 1000:7.2f} ms   max {max(latencies) * 1000:7.2f} ms"
+
+
+@contextmanager
+def _pooled_verification():
+    yield
+
+
+@contextmanager
+def _inline_verification():
+    # The behaviour before password checks moved off the event loop
+    async def verify_inline(plain_password, hashed_password):
+        return oauth.verify_password(plain_password, hashed_password)
+
+    original = oauth.verify_password_async
+    oauth.verify_password_async = verify_inline
+    try:
+        yield
+    finally:
+        oauth.verify_password_async = original
+
+
+async def _run(logins: int, probes: int):
+    credentials = {"username": settings.ADMIN_USER, "password": settings.ADMIN_PASSWORD}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        token = (await client.post("/token", data=credentials)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        await _probe_latencies(client, headers, 10)
+
+        print(f"idle                    {_summary(await _probe_latencies(client, headers, probes))}")
+        for label, context in (("login burst (pool)", _pooled_verification()), ("login burst (inline)", _inline_verification())):
+            with context:
+                probe = asyncio.ensure_future(_probe_latencies(client, headers, probes))
+                burst = [asyncio.ensure_future(_delayed_login(client, credentials, i * 0.01)) for i in range(logins)]
+                latencies = await probe
+                statuses = [response.status_code for response in await asyncio.gather(*burst)]
+            print(f"{label:<24}{_summary(latencies)}   logins: {statuses.count(200)} ok, {statuses.count(503)} shed")
+
+
+async def _delayed_login(client: httpx.AsyncClient, credentials: dict, delay: float) -> httpx.Response:
+    # Logins are spread over the probe window so they overlap with the probes
+    await asyncio.sleep(delay)
+    return await client.post("/token", data=credentials)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure QR endpoint latency during a burst of logins.")
+    parser.add_argument("--logins", type=int, default=20, help="number of concurrent logins in the burst")
+    parser.add_argument("--probes", type=int, default=200, help="number of probe requests per phase")
+    args = parser.parse_args(argv)
+    asyncio.run(_run(args.logins, args.probes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Benchmark suite for the render, filename encoding, listing, storage and end-to-end paths.
+
+Usage:
+    python -m benchmarks.suite [--output benchmarks/baseline.json] [--quick] [--filter render/]
+    python -m benchmarks.suite --compare benchmarks/baseline.json [--threshold 0.1]
+
+Everything runs locally against temporary directories, with the app driven
+in-process through an ASGI client, so no server or network is needed.
+Without --compare the results are written to --output as JSON; with
+--compare they are checked against a previous run instead, and the command
+exits with status 1 if any benchmark got slower by more than --threshold.
+
+Every result is a time per operation in seconds, so lower is always better.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+# URLs of increasing length; longer data needs larger QR versions
+URL_LENGTHS = {"short": 25, "medium": 200, "long": 1000}
+BOX_SIZES = (5, 10, 20)
+# "auto" is qrcode's standard encoder, the others take the fast path
+ENCODE_MASKS = ("auto", "fast", 0)
+LIST_SIZES = (1_000, 100_000)
+E2E_CONCURRENCY = 8
+# Number of QR codes returned by one listing request in the e2e/list_page benchmark
+LIST_PAGE_SIZE = 10_000
+# Codes saved and read back per storage backend, and the size of each
+STORED_CODES = 2_000
+STORED_IMAGE_BYTES = 1_500
+
+
+def _url(length: int, salt: str = "") -> str:
+    base = f"https://example.com/{salt}"
+    return base + "a" * max(0, length - len(base))
+
+
+def _measure(func: Callable[[], object], repeat: int, number: int = 1) -> Dict[str, float]:
+    """
+    Times `func` and returns the median and minimum time per call in seconds.
+    Parameters:
+    - func (Callable): The operation to time.
+    - repeat (int): Number of samples to take.
+    - number (int): Number of calls averaged into each sample.
+    """
+    func()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(samples), "min": min(samples), "samples": repeat}
+
+
+def bench_generate(workdir: Path, quick: bool) -> Dict[str, Dict[str, float]]:
+    from app.services.qr_service import generate_qr_code
+    from app.services.storage import DirectoryStorage
+
+    results = {}
+    storage = DirectoryStorage(workdir / "generate")
+    for label, length in URL_LENGTHS.items():
+        for size in BOX_SIZES:
+            qr_filename = f"generate-{label}-{size}.png"
+            url = _url(length)
+            results[f"render/generate_qr_code/{label}/size{size}"] = _measure(
+                lambda: generate_qr_code(url, qr_filename, size=size, storage=storage), repeat=3 if quick else 10
+            )
+    return results
+
+
+def bench_encode(quick: bool) -> Dict[str, Dict[str, float]]:
+    from app.services.qr_encoder import encode_modules
+
+    # Encoding alone, bypassing the matrix cache, for each mask choice
+    results = {}
+    for label, length in URL_LENGTHS.items():
+        url = _url(length)
+        for mask in ENCODE_MASKS:
+            results[f"render/encode/{label}/{mask if isinstance(mask, str) else f'mask{mask}'}"] = _measure(
+                lambda: encode_modules(url, "M", mask), repeat=3 if quick else 10
+            )
+    return results
+
+
+def bench_filenames(quick: bool) -> Dict[str, Dict[str, float]]:
+    from app.utils.common import decode_filename_to_url, encode_url_to_filename
+
+    results = {}
+    number = 1_000 if quick else 10_000
+    for label, length in URL_LENGTHS.items():
+        url = _url(length)
+        filename = encode_url_to_filename(url)
+        results[f"filename/encode/{label}"] = _measure(lambda: encode_url_to_filename(url), repeat=5, number=number)
+        results[f"filename/decode/{label}"] = _measure(lambda: decode_filename_to_url(filename), repeat=5, number=number)
+    return results
+
+
+def bench_list(workdir: Path, quick: bool) -> Dict[str, Dict[str, float]]:
+    from app.services.qr_service import list_qr_codes
+    from app.services.storage import DirectoryStorage
+    from app.utils.common import encode_url_to_filename
+
+    results = {}
+    for count in LIST_SIZES[:1] if quick else LIST_SIZES:
+        directory = workdir / f"list-{count}"
+        directory.mkdir()
+        for i in range(count):
+            (directory / f"{encode_url_to_filename(_url(60, str(i)))}.png").touch()
+        storage = DirectoryStorage(directory)
+        results[f"list/list_qr_codes/{count}"] = _measure(lambda: list_qr_codes(storage), repeat=3 if quick else 10)
+    return results
+
+
+def bench_storage(workdir: Path, quick: bool) -> Dict[str, Dict[str, float]]:
+    from app.services.storage import DirectoryStorage, SegmentStorage
+
+    # Saving and reading back a PNG-sized image, in each storage backend
+    results = {}
+    image = os.urandom(STORED_IMAGE_BYTES)
+    count = 200 if quick else STORED_CODES
+    for name, storage in (("directory", DirectoryStorage(workdir / "storage-directory")),
+                          ("segments", SegmentStorage(workdir / "storage-segments", 64 * 1024 * 1024))):
+        filenames = [f"{i:032x}.png" for i in range(count)]
+        names = iter(filenames)
+        results[f"storage/save/{name}"] = _measure(lambda: storage.save(next(names), image), repeat=5, number=count // 10)
+        reads = iter(filenames * 2)
+        results[f"storage/read/{name}"] = _measure(lambda: bytes(storage.read(next(reads))), repeat=5, number=count // 10)
+        storage.close()
+    return results
+
+
+async def _e2e(operations: int) -> Dict[str, Dict[str, float]]:
+    import httpx
+    from app.config import settings
+    from app.main import app
+    from app.services.qr_index import qr_index
+    from app.utils.common import qr_code_filename
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        credentials = {"username": settings.ADMIN_USER, "password": settings.ADMIN_PASSWORD}
+        token = (await client.post("/token", data=credentials)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        slots = asyncio.Semaphore(E2E_CONCURRENCY)
+
+        async def timed(method: str, url: str, expected: int, **kwargs) -> float:
+            async with slots:
+                start = time.perf_counter()
+                response = await client.request(method, url, headers=headers, **kwargs)
+                elapsed = time.perf_counter() - start
+            if response.status_code != expected:
+                raise RuntimeError(f"{method} {url} returned {response.status_code}: {response.text}")
+            return elapsed
+
+        # The first render also starts the render pool, which is not what is being measured
+        await timed("POST", "/qr-codes/", 201, json={"url": _url(40, "warm-up")})
+
+        urls = [_url(40, f"e2e-{i}") for i in range(operations)]
+        phases = {
+            "create": [("POST", "/qr-codes/", 201, {"json": {"url": url}}) for url in urls],
+            "list": [("GET", "/qr-codes/", 200, {"params": {"limit": 100}})] * operations,
+            "delete": [("DELETE", f"/qr-codes/{qr_code_filename(url)}", 204, {}) for url in urls],
+        }
+        results = {}
+        for phase, calls in phases.items():
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(timed(method, url, expected, **kwargs) for method, url, expected, kwargs in calls))
+            wall = time.perf_counter() - start
+            results[f"e2e/{phase}/latency"] = {"median": statistics.median(latencies), "min": min(latencies), "samples": len(latencies)}
+            # Wall time per operation is the inverse of throughput at this concurrency
+            results[f"e2e/{phase}/per_op"] = {"median": wall / len(calls), "min": wall / len(calls), "samples": 1}
+
+        # One large page, where serializing the response is most of the work
+        page_size = min(LIST_PAGE_SIZE, settings.LIST_MAX_LIMIT)
+        qr_index.add_many([
+            (qr_code_filename(url), url, "black", "white", 10, 100, "M", "auto", None)
+            for url in (_url(60, f"page-{i}") for i in range(page_size))
+        ])
+        samples = []
+        for _ in range(5 if operations < 100 else 15):
+            samples.append(await timed("GET", "/qr-codes/", 200, params={"limit": page_size}))
+        results[f"e2e/list_page/{page_size}"] = {"median": statistics.median(samples), "min": min(samples), "samples": len(samples)}
+    return results
+
+
+def bench_e2e(quick: bool) -> Dict[str, Dict[str, float]]:
+    return asyncio.run(_e2e(50 if quick else 200))
+
+
+def run(workdir: Path, quick: bool = False, name_filter: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Runs every benchmark whose name starts with `name_filter` and returns the results by name.
+    """
+    groups = {
+        "render/": lambda: {**bench_generate(workdir, quick), **bench_encode(quick)},
+        "filename/": lambda: bench_filenames(quick),
+        "list/": lambda: bench_list(workdir, quick),
+        "storage/": lambda: bench_storage(workdir, quick),
+        "e2e/": lambda: bench_e2e(quick),
+    }
+    results = {}
+    for prefix, group in groups.items():
+        if name_filter and not (prefix.startswith(name_filter) or name_filter.startswith(prefix)):
+            continue
+        for name, result in group().items():
+            if not name_filter or name.startswith(name_filter):
+                results[name] = result
+                print(f"{name:<48} {result['median'] * 1e6:12.1f} us", flush=True)
+    return results
+
+
+def compare(baseline: Dict[str, Dict[str, float]], current: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """
+    Compares two sets of results and returns the names of benchmarks that regressed.
+    Parameters:
+    - baseline (Dict): Results of the reference run.
+    - current (Dict): Results of the new run.
+    - threshold (float): Allowed slowdown as a fraction of the baseline, e.g. 0.1 for 10%.
+
+    Returns:
+    - The names of benchmarks whose median is more than `threshold` slower than the baseline.
+    """
+    regressions = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        change = result["median"] / baseline[name]["median"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{name:<48} {baseline[name]['median'] * 1e6:12.1f} us -> {result['median'] * 1e6:12.1f} us  {change:+7.1%}  {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--output", type=Path, default=DEFAULT_BASELINE, help="where to write the results as JSON")
+    parser.add_argument("--compare", type=Path, nargs="?", const=DEFAULT_BASELINE, help="compare against this baseline instead of writing one")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown that counts as a regression (default 0.1 = 10%%)")
+    parser.add_argument("--quick", action="store_true", help="fewer samples and smaller inputs")
+    parser.add_argument("--filter", dest="name_filter", help="only run benchmarks whose name starts with this, e.g. e2e/")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="qr-benchmarks-") as tmp:
+        workdir = Path(tmp)
+        # Point the app at scratch storage before anything imports its settings
+        os.environ["QR_DIRECTORY"] = str(workdir / "qr_codes")
+        os.environ["QR_INDEX_PATH"] = str(workdir / "qr_index.sqlite")
+        os.environ["LIST_MAX_LIMIT"] = str(LIST_PAGE_SIZE)
+        results = run(workdir, quick=args.quick, name_filter=args.name_filter)
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        print(f"\nCompared with {args.compare} ({baseline['meta']['created']}):")
+        regressions = compare(baseline["results"], results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+        return 0
+
+    meta = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+    }
+    args.output.write_text(json.dumps({"meta": meta, "results": results}, indent=2) + "\n")
+    print(f"\nWrote {len(results)} result(s) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
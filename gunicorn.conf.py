@@ -0,0 +1,27 @@
+# Production server settings: gunicorn -c gunicorn.conf.py app.main:app
+import os
+
+bind = os.getenv("BIND", ":8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app once in the master and fork the workers from it, so each worker
+# starts without paying for the imports again. Every worker still runs the startup
+# hook itself. Without a configured SECRET_KEY this also gives all workers the same
+# generated key, so tokens issued by one worker are accepted by the others.
+preload_app = True
+
+# Workers share their metrics through snapshot files so /metrics reports totals for the
+# whole server, whichever worker answers the scrape
+metrics_dir = os.environ.setdefault("METRICS_DIR", "/tmp/qr-api-metrics")
+
+
+def on_starting(server):
+    # Drop snapshots left behind by a previous run
+    import shutil
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def child_exit(server, worker):
+    # Stop reporting the metrics of workers that exited
+    from app.services.metrics import metrics
+    metrics.remove_snapshot(worker.pid)
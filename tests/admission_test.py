@@ -0,0 +1,91 @@
+import asyncio
+from app.middleware import AdmissionMiddleware
+from app.services.admission import AdaptiveLimit, AdmissionController, requests_admitted, requests_shed
+
+RENDER_ROUTES = ["POST /qr-codes/", "GET /qr-codes/render"]
+
+
+def _controller(max_in_flight=4, reserved_share=0.5, limit=None):
+    return AdmissionController(max_in_flight, reserved_share, limit or AdaptiveLimit(1, 10, 1.0), RENDER_ROUTES)
+
+
+def test_limit_shrinks_while_slow_and_grows_back():
+    limit = AdaptiveLimit(min_limit=2, max_limit=10, target_latency=0.5)
+    limit.record(2.0, now=100.0)
+    assert limit.limit == 9
+    # Cut at most once per average latency, so a cut can take effect before the next one
+    limit.record(2.0, now=100.5)
+    assert limit.limit == 9
+    for second in range(101, 200):
+        limit.record(2.0, now=second * 3.0)
+    assert limit.limit == 2
+    for _ in range(200):
+        limit.record(0.01, now=1000.0)
+    assert 2 < limit.limit <= 10
+
+
+def test_render_requests_cannot_take_the_reserved_share():
+    controller = _controller()
+    assert controller.route_class("POST", "/qr-codes") == "render"
+    assert controller.route_class("GET", "/qr-codes/") == "default"
+    shed_before = requests_shed.value("render", "reserved")
+    assert controller.admit("render") is None
+    assert controller.admit("render") is None
+    assert controller.admit("render") == "reserved"
+    assert controller.admit("default") is None
+    assert controller.admit("default") is None
+    assert controller.admit("default") == "capacity"
+    assert requests_shed.value("render", "reserved") == shed_before + 1
+    controller.release("render", 0.1)
+    # Still only reserved slots left while the cheap requests hold the others
+    assert controller.admit("render") == "reserved"
+    controller.release("default", 0.01)
+    controller.release("default", 0.01)
+    assert controller.admit("render") is None
+
+
+def test_middleware_sheds_renders_over_the_limit_but_serves_cheap_routes():
+    # Created in scenario(), as before Python 3.10 an Event is bound to the loop current at construction
+    release = None
+
+    async def app(scope, receive, send):
+        if scope["path"] == "/qr-codes/":
+            await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = AdmissionMiddleware(app, _controller(max_in_flight=8, limit=AdaptiveLimit(1, 2, 1.0)))
+
+    async def request(method, path):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware({"type": "http", "method": method, "path": path, "headers": []}, None, send)
+        return messages[0]
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        admitted_before = requests_admitted.value("default")
+        held = [asyncio.ensure_future(request("POST", "/qr-codes/")) for _ in range(2)]
+        await asyncio.sleep(0)
+        shed = await request("POST", "/qr-codes/")
+        cheap = await request("GET", "/")
+        release.set()
+        assert [(await future)["status"] for future in held] == [200, 200]
+        assert requests_admitted.value("default") == admitted_before + 1
+        return shed, cheap
+
+    shed, cheap = asyncio.run(scenario())
+    assert shed["status"] == 503 and dict(shed["headers"])[b"retry-after"] == b"1"
+    assert cheap["status"] == 200
+    assert middleware.controller.in_flight == 0
+
+
+def test_metrics_expose_admission_counts(client):
+    client.get("/")
+    text = client.get("/metrics").text
+    assert 'http_requests_admitted_total{route_class="default"}' in text
+    assert "http_admission_render_limit" in text
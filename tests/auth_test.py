@@ -0,0 +1,95 @@
+from datetime import timedelta
+from app.routers.oauth import create_access_token
+from app.services.token_cache import token_cache, VerifiedTokenCache
+
+
+def test_qr_endpoints_reject_invalid_tokens(client):
+    headers = {"Authorization": "Bearer not-a-jwt"}
+    assert client.get("/qr-codes/", headers=headers).status_code == 401
+
+
+def test_qr_endpoints_reject_expired_tokens(client):
+    token = create_access_token({"sub": "admin"}, expires_delta=timedelta(minutes=-1))
+    response = client.get("/qr-codes/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+def test_qr_endpoints_reject_unknown_users(client):
+    token = create_access_token({"sub": "nobody"}, expires_delta=timedelta(minutes=5))
+    assert client.get("/qr-codes/", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+
+def test_verified_tokens_are_cached(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    token_cache.clear()
+    before = token_cache.stats()
+    assert client.get("/qr-codes/", headers=headers).status_code == 200
+    assert client.get("/qr-codes/", headers=headers).status_code == 200
+    after = token_cache.stats()
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+
+def test_cache_entries_expire_with_the_token():
+    cache = VerifiedTokenCache(max_entries=1)
+    cache.put("expired", "admin", 0)
+    assert cache.get("expired") is None
+    cache.put("a", "admin", 2 ** 40)
+    cache.put("b", "admin", 2 ** 40)
+    assert cache.get("a") is None
+    assert cache.get("b") == "admin"
+
+
+def test_login_returns_503_when_password_checks_are_saturated(client, monkeypatch):
+    from app.config import settings
+    from app.routers import oauth
+    monkeypatch.setattr(oauth, "_password_slots", None)
+    monkeypatch.setattr(settings, "LOGIN_POOL_SIZE", 0)
+    monkeypatch.setattr(settings, "LOGIN_QUEUE_TIMEOUT", 0.01)
+    response = client.post("/token", data={"username": settings.ADMIN_USER, "password": settings.ADMIN_PASSWORD})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_admin_password_is_not_hashed_at_import():
+    import subprocess
+    import sys
+    code = (
+        "import app.main, sys\n"
+        "from app.routers import oauth\n"
+        "assert oauth._admin_password_hash is None\n"
+        "assert 'qrcode' not in sys.modules and 'numpy' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_configured_admin_password_hash_is_used(client, monkeypatch):
+    from app.config import settings
+    from app.routers import oauth
+    user = {"username": settings.ADMIN_USER, "hashed_password": oauth.pwd_context.hash("configured")}
+    monkeypatch.setitem(oauth.fake_users_db, settings.ADMIN_USER, user)
+    monkeypatch.setattr(oauth, "_admin_password_hash", None)
+    response = client.post("/token", data={"username": settings.ADMIN_USER, "password": "configured"})
+    assert response.status_code == 200
+    assert oauth.hash_admin_password().result() == user["hashed_password"]
+
+
+def test_password_slots_belong_to_the_running_loop(monkeypatch):
+    import asyncio
+    from app.routers import oauth
+    monkeypatch.setattr(oauth, "_password_slots", None)
+
+    async def slots():
+        # Contended, so that the semaphore has to create a future in the loop
+        semaphore = oauth.password_slots()
+        held = [await semaphore.acquire() for _ in range(oauth.settings.LOGIN_POOL_SIZE)]
+        waiter = asyncio.ensure_future(semaphore.acquire())
+        await asyncio.sleep(0)
+        for _ in held:
+            semaphore.release()
+        await waiter
+        semaphore.release()
+        return semaphore
+
+    first, second = asyncio.run(slots()), asyncio.run(slots())
+    assert first is not second
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import pytest
+from app.config import settings
+from app.routers.qr_code import BatchLineTooLongError, _iter_batch_items
+
+
+def test_batch_create_from_json_list(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    items = [
+        {"url": "https://example.com/batch/1"},
+        {"url": "https://example.com/batch/2", "fill_color": "red"},
+        {"url": "not-a-url"},
+    ]
+    response = client.post("/qr-codes/batch", json=items, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda r: r["index"])
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert results[0]["status"] in [200, 201]
+    assert "qr_code_url" in results[1] and "links" in results[1]
+    assert results[2]["status"] == 422
+
+
+def test_batch_create_from_ndjson_stream(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/x-ndjson"}
+    body = '{"url": "https://example.com/batch/ndjson"}\n{not json}\n'
+    response = client.post("/qr-codes/batch", content=body, headers=headers)
+    assert response.status_code == 200
+    statuses = {r["index"]: r["status"] for r in map(json.loads, response.text.splitlines())}
+    assert statuses[0] in [200, 201]
+    assert statuses[1] == 422
+
+
+def test_batch_rejects_non_list_body(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.post("/qr-codes/batch", json={"url": "https://example.com"}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_batch_ndjson_line_too_long_is_413(client, access_token, isolated_storage, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_LINE_BYTES", 64)
+    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/x-ndjson"}
+    response = client.post("/qr-codes/batch", content=b"x" * 100, headers=headers)
+    assert response.status_code == 413
+
+    # Once results are streaming, the overlong line ends the response with a 413 result
+    body = '{"url": "https://example.com/batch/short"}\n' + '{"url": "' + "x" * 100 + '"}\n{"url": "https://example.com/batch/after"}\n'
+    response = client.post("/qr-codes/batch", content=body, headers=headers)
+    assert response.status_code == 200
+    statuses = {r["index"]: r["status"] for r in map(json.loads, response.text.splitlines())}
+    assert statuses[0] in [200, 201]
+    assert statuses[1] == 413
+    assert 2 not in statuses
+
+
+def test_batch_ndjson_lines_split_across_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_LINE_BYTES", 16)
+
+    class ChunkedRequest:
+        def __init__(self, chunks):
+            self.chunks = chunks
+
+        async def stream(self):
+            for chunk in self.chunks:
+                yield chunk
+
+    async def items(chunks):
+        return [item async for item in _iter_batch_items(ChunkedRequest(chunks), None)]
+
+    chunks = [b'{"a"', b": 1}\n\n[2", b"]\n", b"3"]
+    assert asyncio.run(items(chunks)) == [(0, {"a": 1}), (1, [2]), (2, 3)]
+    # A line only counts once it has grown past the limit, however it was split
+    with pytest.raises(BatchLineTooLongError):
+        asyncio.run(items([b'"' + b"x" * 10, b"x" * 10 + b'"\n']))
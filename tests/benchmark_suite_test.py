@@ -0,0 +1,14 @@
+from benchmarks.suite import bench_filenames, compare
+
+
+def test_compare_flags_only_slowdowns_past_the_threshold():
+    baseline = {"fast": {"median": 1.0}, "slow": {"median": 1.0}, "gone": {"median": 1.0}}
+    current = {"fast": {"median": 0.5}, "slow": {"median": 1.2}, "new": {"median": 9.0}}
+    assert compare(baseline, current, threshold=0.1) == ["slow"]
+    assert compare(baseline, current, threshold=0.5) == []
+
+
+def test_filename_benchmarks_report_time_per_call():
+    results = bench_filenames(quick=True)
+    assert set(results) == {f"filename/{op}/{label}" for op in ("encode", "decode") for label in ("short", "medium", "long")}
+    assert all(0 < result["min"] <= result["median"] for result in results.values())
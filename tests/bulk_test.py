@@ -0,0 +1,43 @@
+import io
+import json
+from app.bulk import Checkpoint, run
+from app.config import settings
+from app.services.qr_index import QRCodeIndex
+from app.utils.common import qr_code_filename
+
+
+def _jsonl(urls):
+    return io.StringIO("".join(json.dumps({"url": url, "size": 2}) + "\n" for url in urls))
+
+
+def test_bulk_renders_skips_existing_and_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "QR_DIRECTORY", tmp_path / "qr_codes")
+    index = QRCodeIndex(tmp_path / "index.sqlite", tmp_path / "qr_codes")
+    urls = [f"https://example.com/bulk/{i}" for i in range(5)]
+    checkpoint = Checkpoint(tmp_path / "input.checkpoint")
+
+    counts = run(_jsonl(urls + ["not-a-url", urls[0]]), "jsonl", index, workers=1, checkpoint=checkpoint, chunk_size=2)
+    assert counts == {"rendered": 5, "skipped": 1, "failed": 1}
+    assert Checkpoint(tmp_path / "input.checkpoint").rows == 7
+    for url in urls:
+        qr_filename = qr_code_filename(url, size=2)
+        assert (tmp_path / "qr_codes" / qr_filename).stat().st_size == index.get(qr_filename)["size_bytes"]
+
+    # Without a checkpoint every row is read again, but nothing is rendered twice
+    counts = run(_jsonl(urls), "jsonl", index, workers=1, checkpoint=Checkpoint(None))
+    assert counts == {"rendered": 0, "skipped": 5, "failed": 0}
+    index.close()
+
+
+def test_bulk_resumes_from_checkpoint_and_reads_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "QR_DIRECTORY", tmp_path / "qr_codes")
+    index = QRCodeIndex(tmp_path / "index.sqlite", tmp_path / "qr_codes")
+    checkpoint = Checkpoint(tmp_path / "input.checkpoint")
+    checkpoint.save(2)
+    csv_input = io.StringIO("url,fill_color,size\n" + "".join(f"https://example.com/csv/{i},,3\n" for i in range(4)))
+
+    counts = run(csv_input, "csv", index, workers=1, checkpoint=checkpoint)
+    assert counts == {"rendered": 2, "skipped": 0, "failed": 0}
+    assert index.get(qr_code_filename("https://example.com/csv/1", size=3)) is None
+    assert index.get(qr_code_filename("https://example.com/csv/3", size=3))["fill_color"] == "black"
+    index.close()
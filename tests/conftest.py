@@ -2,6 +2,10 @@
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.config import settings
+from app.services import storage as storage_module
+from app.services.qr_index import qr_index
+from app.services.storage import DirectoryStorage
 
 @pytest.fixture
 def client():
@@ -11,4 +15,28 @@ def client():
 def get_access_token_for_test(client):
     form_data = {"username": "admin", "password": "secret"}
     response = client.post("/token", data=form_data)
-    return response.json()["access_token"]
\ No newline at end of file
+    return response.json()["access_token"]
+
+@pytest.fixture
+def access_token(client):
+    form_data = {"username": settings.ADMIN_USER, "password": settings.ADMIN_PASSWORD}
+    response = client.post("/token", data=form_data)
+    return response.json()["access_token"]
+
+@pytest.fixture
+def isolated_storage(tmp_path, monkeypatch):
+    """
+    Points the QR code directory, the shared index and the storage backend at tmp_path, so codes
+    created through the app do not end up in the repository's qr_codes/ and qr_index.sqlite.
+    Returns the QR code directory.
+    """
+    directory = tmp_path / "qr_codes"
+    monkeypatch.setattr(settings, "QR_DIRECTORY", directory)
+    monkeypatch.setattr(settings, "QR_INDEX_PATH", tmp_path / "qr_index.sqlite")
+    monkeypatch.setattr(storage_module, "_storage", DirectoryStorage(directory))
+    monkeypatch.setattr(qr_index, "db_path", tmp_path / "qr_index.sqlite")
+    monkeypatch.setattr(qr_index, "directory", directory)
+    monkeypatch.setattr(qr_index, "_conn", None)
+    monkeypatch.setattr(qr_index, "_touched", {})
+    yield directory
+    qr_index.close()
@@ -0,0 +1,76 @@
+import json
+import logging
+import queue
+import sys
+import pytest
+from app.utils.common import setup_logging, stop_logging
+from app.utils.log_handlers import (BoundedQueueHandler, JSONFormatter, SamplingFilter, log_records_dropped,
+                                    request_id)
+
+
+@pytest.fixture
+def restore_logging():
+    loggers = [logging.getLogger(), logging.getLogger("uvicorn.access")]
+    saved = [(logger, logger.handlers[:], logger.level, logger.propagate) for logger in loggers]
+    yield
+    stop_logging()
+    for logger, handlers, level, propagate in saved:
+        logger.handlers, logger.level, logger.propagate = handlers, level, propagate
+
+
+def _record(name: str, level: int = logging.INFO, msg: str = "done", **extra) -> logging.LogRecord:
+    record = logging.LogRecord(name, level, __file__, 1, msg, (), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_sampling_keeps_one_in_n_low_level_records():
+    sampler = SamplingFilter({"app.services": 4})
+    kept = [sampler.filter(_record("app.services.qr_service")) for _ in range(8)]
+    assert kept.count(True) == 2
+    assert sampler.filter(_record("app.services.qr_service", logging.WARNING))
+    assert all(sampler.filter(_record("app.routers.qr_code")) for _ in range(3))
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=1))
+    before = log_records_dropped.value()
+    handler.handle(_record("app", msg="first"))
+    handler.handle(_record("app", msg="second"))
+    assert handler.queue.get_nowait().getMessage() == "first"
+    assert log_records_dropped.value() == before + 1
+
+
+def test_json_formatter_includes_extra_fields_and_traceback():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("app", logging.ERROR, __file__, 1, "failed %s", ("x",), sys.exc_info())
+    record.request_id = "abc"
+    record.qr_filename = "code.png"
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry["message"] == "failed x" and entry["level"] == "ERROR"
+    assert entry["request_id"] == "abc" and entry["qr_filename"] == "code.png"
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_records_are_written_by_the_listener_with_their_request_id(restore_logging, capsys):
+    setup_logging()
+    assert logging.getLogger().handlers[0].__class__ is BoundedQueueHandler
+    token = request_id.set("req-42")
+    try:
+        logging.getLogger("app.test").info("created")
+    finally:
+        request_id.reset(token)
+    logging.getLogger("app.test").info("outside")
+    stop_logging()
+    lines = capsys.readouterr().out.splitlines()
+    assert any(line.endswith("req-42 - created") for line in lines)
+    assert any(line.endswith("- - outside") for line in lines)
+
+
+def test_request_id_header(client):
+    response = client.get("/", headers={"X-Request-ID": "from-nginx"})
+    assert response.headers["x-request-id"] == "from-nginx"
+    generated = client.get("/", headers={"X-Request-ID": "x" * 100}).headers["x-request-id"]
+    assert len(generated) == 32 and generated != client.get("/").headers["x-request-id"]
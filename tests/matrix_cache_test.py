@@ -0,0 +1,62 @@
+import uuid
+import numpy as np
+import qrcode
+from app.services.matrix_cache import ModuleMatrixCache, matrix_cache
+from app.services.qr_service import module_matrix, render_qr_code
+
+
+def test_matrix_round_trips_through_bit_packing():
+    qr = qrcode.QRCode(border=0)
+    qr.add_data("https://example.com/" + "x" * 100)
+    qr.make(fit=True)
+    cache = ModuleMatrixCache(max_bytes=1 << 20)
+    cache.put("key", qr.modules)
+    cached = cache.get("key")
+    assert cached.dtype == bool
+    assert np.array_equal(cached, np.asarray(qr.modules, dtype=bool))
+    # One bit per module, rounded up to whole bytes
+    assert cache.stats()["bytes"] < (qr.modules_count ** 2 + 7) // 8 + 300
+
+
+def test_cache_evicts_least_recently_used_over_cap():
+    matrix = np.ones((21, 21), dtype=bool)
+    cache = ModuleMatrixCache(max_bytes=600)
+    cache.put("a", matrix)
+    cache.put("b", matrix)
+    assert cache.get("a") is not None
+    cache.put("c", matrix)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] <= 600
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_style_variants_reuse_the_matrix():
+    url = f"https://example.com/{uuid.uuid4()}"
+    before = matrix_cache.stats()
+    red = render_qr_code(url, fill_color="red", size=4, engine="fast")
+    blue = render_qr_code(url, fill_color="blue", size=6, engine="fast")
+    svg = render_qr_code(url, size=6, format="svg")
+    after = matrix_cache.stats()
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 2)
+    assert len({red, blue, svg}) == 3
+    # The cached matrix is the one qrcode builds from scratch
+    qr = qrcode.QRCode(border=0)
+    qr.add_data(url)
+    qr.make(fit=True)
+    assert np.array_equal(module_matrix(url), np.asarray(qr.modules, dtype=bool))
+
+
+def test_metrics_expose_matrix_cache(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    url = f"https://example.com/{uuid.uuid4()}"
+    for color in ("red", "green"):
+        response = client.get("/qr-codes/render", params={"url": url, "fill_color": color, "size": 3}, headers=headers)
+        assert response.status_code == 200
+    text = client.get("/metrics").text
+    assert "# TYPE qr_matrix_cache_hits_total counter" in text
+    values = {line.split()[0]: float(line.split()[1]) for line in text.splitlines() if line.startswith("qr_matrix_cache_")}
+    assert values["qr_matrix_cache_hits_total"] >= 1
+    assert values["qr_matrix_cache_misses_total"] >= 1
+    assert values["qr_matrix_cache_bytes"] > 0
@@ -0,0 +1,66 @@
+import os
+import re
+from app.services.metrics import MetricsRegistry, render_stage_latency, request_latency
+from app.services.token_cache import token_cache
+
+
+def test_metrics_endpoint_exposes_request_latency_by_route(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    before = request_latency.count("DELETE", "/qr-codes/{qr_filename}", "404")
+    client.delete("/qr-codes/does-not-exist.png", headers=headers)
+    assert request_latency.count("DELETE", "/qr-codes/{qr_filename}", "404") == before + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="DELETE",route="/qr-codes/{qr_filename}",status="404"}' in response.text
+    assert "# TYPE qr_render_queue_depth gauge" in response.text
+    assert "qr_codes_stored_bytes " in response.text
+
+
+def test_renders_record_stage_timings(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    before = {stage: render_stage_latency.count(stage) for stage in ("make", "rasterize", "encode", "queue")}
+    response = client.get("/qr-codes/render", params={"url": "https://example.com/metrics-stages", "size": 3}, headers=headers)
+    assert response.status_code == 200
+    assert all(render_stage_latency.count(stage) == count + 1 for stage, count in before.items())
+
+
+def test_metrics_endpoint_exposes_token_cache_hits_and_misses(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    def scrape():
+        text = client.get("/metrics").text
+        return {
+            result: float(re.search(rf'^qr_token_cache_requests_total{{result="{result}"}} (\S+)$', text, re.M).group(1))
+            if f'result="{result}"' in text else 0.0
+            for result in ("hit", "miss")
+        }
+
+    token_cache.clear()
+    before = scrape()
+    for _ in range(2):
+        assert client.get("/qr-codes/does-not-exist.png", headers=headers).status_code == 404
+    after = scrape()
+    assert after == {"hit": before["hit"] + 1, "miss": before["miss"] + 1}
+    assert "# TYPE qr_token_cache_requests_total counter" in client.get("/metrics").text
+
+
+def test_worker_snapshots_are_merged(tmp_path):
+    worker = MetricsRegistry(tmp_path, flush_interval=0)
+    worker.counter("renders_total", "Renders", labels=("format",)).inc("png", amount=2)
+    worker.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(0.5)
+    worker.maybe_flush()
+    # Pretend the snapshot was written by another worker process
+    os.replace(tmp_path / f"{os.getpid()}.json", tmp_path / "1.json")
+
+    scraper = MetricsRegistry(tmp_path, flush_interval=0)
+    scraper.counter("renders_total", "Renders", labels=("format",)).inc("png")
+    scraper.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(0.05)
+    scraper.gauge("stored", "Stored", lambda: 7, shared=True)
+    text = scraper.render()
+    assert 'renders_total{format="png"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1.0"} 2' in text
+    assert "latency_seconds_count 2" in text
+    assert "stored 7.0" in text
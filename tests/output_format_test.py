@@ -0,0 +1,52 @@
+import asyncio
+import gzip
+import re
+import xml.etree.ElementTree as ElementTree
+import qrcode
+from app.services.qr_service import delete_qr_code, generate_qr_code, render_qr_code
+from app.services.rasterizer import modules_to_svg
+from app.services.storage import DirectoryStorage
+from app.utils.common import qr_code_filename
+
+
+def test_svg_merges_runs_of_dark_modules():
+    qr = qrcode.QRCode(border=5)
+    qr.add_data("https://example.com/svg")
+    qr.make(fit=True)
+    svg = modules_to_svg(qr.modules, 10, 5, "red", "white")
+    root = ElementTree.fromstring(svg)
+    path = root.find("{http://www.w3.org/2000/svg}path")
+    assert path.get("stroke") == "#ff0000"
+    segments = re.findall(r"M(\d+) (\d+)\.5h(\d+)", path.get("d"))
+    assert 0 < len(segments) < sum(map(sum, qr.modules))
+    drawn = [[False] * qr.modules_count for _ in range(qr.modules_count)]
+    for x, y, length in segments:
+        for column in range(int(x) - 5, int(x) - 5 + int(length)):
+            drawn[int(y) - 5][column] = True
+    assert drawn == qr.modules
+    assert root.get("width") == str((qr.modules_count + 10) * 10)
+
+
+def test_svg_filename_and_gzip_sidecar(tmp_path, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "QR_SVG_GZIP_SIDECAR", True)
+    assert qr_code_filename("https://example.com", format="svg", layout="flat").endswith(".svg")
+    storage = DirectoryStorage(tmp_path)
+    svg = generate_qr_code("https://example.com", "code.svg", format="svg", storage=storage)
+    sidecar = tmp_path / "code.svg.gz"
+    assert gzip.decompress(sidecar.read_bytes()) == svg == (tmp_path / "code.svg").read_bytes()
+    asyncio.run(delete_qr_code("code.svg", storage=storage))
+    assert not sidecar.exists()
+
+
+def test_png_is_compact():
+    data = "https://example.com/compact"
+    assert len(render_qr_code(data, "red", "white", 10, engine="fast")) * 3 < len(render_qr_code(data, "red", "white", 10, engine="pil"))
+
+
+def test_render_endpoint_serves_svg(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.get("/qr-codes/render", params={"url": "https://example.com", "format": "svg"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("image/svg+xml")
+    assert client.get("/qr-codes/render", params={"url": "https://example.com", "format": "gif"}, headers=headers).status_code == 422
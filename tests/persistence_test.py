@@ -0,0 +1,53 @@
+import asyncio
+import os
+import pytest
+from app.services.qr_service import delete_qr_code, save_qr_code
+from app.services.storage import DirectoryStorage, write_file_atomic
+from app.utils.common import qr_code_relpath
+
+
+@pytest.mark.parametrize("fsync", ["none", "file", "full"])
+def test_atomic_write_creates_missing_directories(tmp_path, fsync):
+    path = tmp_path / "ab" / "cd" / "code.png"
+    write_file_atomic(path, b"first", fsync=fsync)
+    write_file_atomic(path, b"second", fsync=fsync)
+    assert path.read_bytes() == b"second"
+    assert os.listdir(path.parent) == ["code.png"]
+
+
+def test_failed_write_leaves_no_partial_file(tmp_path, monkeypatch):
+    path = tmp_path / "code.png"
+    path.write_bytes(b"old")
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        write_file_atomic(path, b"new")
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["code.png"]
+
+
+def test_async_save_and_delete(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    path = tmp_path / "code.png"
+    asyncio.run(save_qr_code("code.png", b"image", storage=storage))
+    assert path.read_bytes() == b"image"
+    asyncio.run(delete_qr_code("code.png", storage=storage))
+    assert not path.exists()
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(delete_qr_code("code.png", storage=storage))
+
+
+def test_create_renders_again_when_the_stored_image_went_missing(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    request = {"url": "https://example.com/went-missing", "size": 2}
+    response = client.post("/qr-codes/", json=request, headers=headers)
+    assert response.status_code == 201
+    path = isolated_storage / qr_code_relpath(response.json()["links"]["self"].rsplit("/", 1)[1])
+    # Deleted outside the API, so only the index still knows about it
+    path.unlink()
+    response = client.post("/qr-codes/", json=request, headers=headers)
+    assert response.status_code == 201
+    assert path.is_file()
@@ -0,0 +1,73 @@
+import sys
+import uuid
+from types import SimpleNamespace
+import pytest
+from app.config import settings
+from app.routers.oauth import create_access_token, fake_users_db
+from app.services.profiler import StackProfiler, _frame_label
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_DIR", tmp_path)
+    return tmp_path
+
+
+def _inner():
+    return sum(range(1000))
+
+
+def _outer():
+    return _inner() + _inner()
+
+
+def test_stack_profiler_reports_collapsed_stacks():
+    with StackProfiler() as profiler:
+        _outer()
+    lines = profiler.collapsed().splitlines()
+    stacks = {line.rsplit(" ", 1)[0] for line in lines}
+    assert "tests.profiling_test._outer;tests.profiling_test._inner" in stacks
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+
+
+def test_frame_label_without_qualified_names():
+    # Code objects before Python 3.11 have no co_qualname
+    frame = SimpleNamespace(f_code=SimpleNamespace(co_name="_inner"), f_globals={"__name__": "tests.profiling_test"})
+    assert _frame_label(frame) == "tests.profiling_test._inner"
+
+
+def test_admin_can_profile_a_render(client, access_token, profile_dir):
+    headers = {"Authorization": f"Bearer {access_token}", "X-Profile": "1"}
+    response = client.get("/qr-codes/render", params={"url": "https://example.com/" + "p" * 300, "size": 2}, headers=headers)
+    assert response.status_code == 200
+    report_name = response.headers["X-Profile-Report"]
+    assert (profile_dir / report_name).is_file()
+
+    auth = {"Authorization": f"Bearer {access_token}"}
+    assert client.get("/profiles/", headers=auth).json() == [report_name]
+    report = client.get(f"/profiles/{report_name}", headers=auth)
+    assert report.status_code == 200
+    # Functions are only qualified by their class from Python 3.11
+    assert ("qrcode.main.QRCode.make" if sys.version_info >= (3, 11) else "qrcode.main.make") in report.text
+
+
+def test_profiling_requires_the_admin(client, profile_dir, monkeypatch):
+    monkeypatch.setitem(fake_users_db, "viewer", {"username": "viewer", "hashed_password": None})
+    token = create_access_token({"sub": "viewer"})
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/qr-codes/render", params={"url": "https://example.com/p", "profile": "true"}, headers=headers)
+    assert response.status_code == 403
+    assert client.get("/profiles/", headers=headers).status_code == 403
+
+
+def test_sampled_creates_are_profiled_and_rotated(client, access_token, profile_dir, monkeypatch, isolated_storage):
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 1)
+    monkeypatch.setattr(settings, "PROFILE_MAX_REPORTS", 2)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    run = uuid.uuid4().hex
+    for i in range(3):
+        response = client.post("/qr-codes/", json={"url": f"https://example.com/sampled-{run}-{i}", "size": 2}, headers=headers)
+        assert response.status_code == 201
+        assert "X-Profile-Report" not in response.headers
+    reports = sorted(profile_dir.glob("*-create-sampled.folded"))
+    assert len(reports) == 2
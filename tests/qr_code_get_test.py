@@ -0,0 +1,83 @@
+import uuid
+import pytest
+from app.services.storage import get_storage
+
+
+@pytest.fixture
+def headers(access_token):
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+@pytest.fixture
+def qr_code(client, headers, isolated_storage):
+    response = client.post("/qr-codes/", json={"url": f"https://example.com/get-{uuid.uuid4()}", "size": 3}, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+def _path(link):
+    return "/qr-codes/" + link.rsplit("/", 1)[1]
+
+
+def test_self_link_serves_metadata(client, headers, qr_code):
+    response = client.get(_path(qr_code["links"]["self"]), headers=headers)
+    assert response.status_code == 200
+    metadata = response.json()
+    assert metadata["links"] == qr_code["links"]
+    assert metadata["url"].startswith("https://example.com/get-")
+    assert metadata["format"] == "png" and metadata["size"] == 3 and metadata["size_bytes"] > 0
+    assert metadata["expires_at"] is None
+    assert response.headers["etag"] and response.headers["last-modified"]
+
+    head = client.head(_path(qr_code["links"]["self"]), headers=headers)
+    assert head.status_code == 200 and head.content == b""
+    assert head.headers["content-length"] == response.headers["content-length"]
+    assert head.headers["etag"] == response.headers["etag"]
+
+
+def test_conditional_requests_get_304(client, headers, qr_code):
+    path = _path(qr_code["links"]["self"])
+    first = client.get(path, headers=headers)
+    for conditional in ({"If-None-Match": first.headers["etag"]}, {"If-Modified-Since": first.headers["last-modified"]}):
+        response = client.get(path, headers={**headers, **conditional})
+        assert response.status_code == 304
+        assert response.headers["etag"] == first.headers["etag"]
+    # If-None-Match takes precedence over If-Modified-Since
+    response = client.get(path, headers={**headers, "If-None-Match": '"other"', "If-Modified-Since": first.headers["last-modified"]})
+    assert response.status_code == 200
+
+
+def test_image_body_and_ranges(client, headers, qr_code):
+    path = _path(qr_code["links"]["self"])
+    image = get_storage().read(path.rsplit("/", 1)[1])
+    image_headers = {**headers, "Accept": "image/png"}
+
+    response = client.get(path, headers=image_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == image
+
+    head = client.head(path, headers=image_headers)
+    assert head.status_code == 200 and head.content == b""
+    assert int(head.headers["content-length"]) == len(image)
+
+    partial = client.get(path, headers={**image_headers, "Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(image)}"
+    assert partial.content == image[10:20]
+    suffix = client.get(path, headers={**image_headers, "Range": "bytes=-5"})
+    assert suffix.status_code == 206 and suffix.content == image[-5:]
+
+    # A Range for another version of the image is ignored
+    stale = client.get(path, headers={**image_headers, "Range": "bytes=10-19", "If-Range": '"other"'})
+    assert stale.status_code == 200 and stale.content == image
+
+    unsatisfiable = client.get(path, headers={**image_headers, "Range": f"bytes={len(image)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(image)}"
+
+
+def test_unknown_qr_code_is_404(client, headers, isolated_storage):
+    assert client.get("/qr-codes/missing.png", headers=headers).status_code == 404
+    assert client.head("/qr-codes/missing.png", headers=headers).status_code == 404
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import qrcode
+from qrcode import util
+from app.services.qr_encoder import ERROR_CORRECTION_LEVELS, encode_modules, minimal_version, penalty
+from app.utils.common import qr_code_filename
+
+URLS = ["https://example.com/" + "a1/?=&" * repeat for repeat in (0, 5, 30, 150)]
+
+
+def _reference(url, error_correction, mask_pattern=None):
+    # qrcode's own encoder, given the same single byte segment as the fast path
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECTION_LEVELS[error_correction], border=0, mask_pattern=mask_pattern)
+    qr.add_data(util.QRData(url.encode(), mode=util.MODE_8BIT_BYTE))
+    qr.make(fit=True)
+    return qr
+
+
+@pytest.mark.parametrize("url", URLS)
+@pytest.mark.parametrize("error_correction", ["L", "H"])
+def test_fast_encoding_matches_qrcode(url, error_correction):
+    reference = _reference(url, error_correction)
+    assert minimal_version(len(url), ERROR_CORRECTION_LEVELS[error_correction]) == reference.version
+    assert np.array_equal(encode_modules(url, error_correction, "fast"), np.array(reference.modules, dtype=bool))
+    assert penalty(np.array(reference.modules, dtype=bool)) == util.lost_point(reference.modules)
+    for mask in (0, 7):
+        fixed = _reference(url, error_correction, mask_pattern=mask)
+        assert np.array_equal(encode_modules(url, error_correction, mask), np.array(fixed.modules, dtype=bool))
+
+
+def test_oversized_data_is_rejected():
+    with pytest.raises(qrcode.exceptions.DataOverflowError):
+        encode_modules("https://example.com/" + "a" * 3000, "H", "fast")
+
+
+def test_encoding_options_only_change_non_default_names():
+    url = "https://example.com/encoding"
+    assert qr_code_filename(url, error_correction="M", mask="auto") == qr_code_filename(url)
+    names = {qr_code_filename(url, error_correction="H"), qr_code_filename(url, mask="fast"), qr_code_filename(url, mask=3)}
+    assert len(names) == 3 and qr_code_filename(url) not in names
+
+
+def test_create_with_encoding_options(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    qr_request = {"url": "https://example.com/encoding-options", "error_correction": "Q", "mask": "fast", "size": 2}
+    response = client.post("/qr-codes/", json=qr_request, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["qr_code_url"].endswith(qr_code_filename(qr_request["url"], size=2, error_correction="Q", mask="fast"))
+    invalid = client.post("/qr-codes/", json={**qr_request, "mask": 8}, headers=headers)
+    assert invalid.status_code == 422
+    rendered = client.get("/qr-codes/render", params={**qr_request, "mask": "5"}, headers=headers)
+    assert rendered.status_code == 200 and rendered.headers["content-type"] == "image/png"
@@ -0,0 +1,143 @@
+import pytest
+from app.services.qr_index import QRCodeIndex
+from app.services.storage import DirectoryStorage, SegmentStorage
+from app.utils.common import qr_code_filename
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = QRCodeIndex(tmp_path / "index.sqlite", tmp_path / "qr_codes")
+    yield index
+    index.close()
+
+
+def test_list_paginates_with_cursor(index):
+    for i in range(5):
+        url = f"https://example.com/{i}"
+        index.add(qr_code_filename(url), url, "black", "white", 10, 100, created_at=1000 + i)
+    seen, cursor = [], None
+    while True:
+        entries, cursor = index.list(2, cursor=cursor)
+        seen += [entry["url"] for entry in entries]
+        if cursor is None:
+            break
+    assert seen == [f"https://example.com/{i}" for i in range(5)]
+
+
+def test_list_filters_by_prefix_and_creation_time(index):
+    index.add("a.png", "https://a.example.com/x", "black", "white", 10, 100, created_at=1000)
+    index.add("b.png", "https://b.example.com/x", "black", "white", 10, 100, created_at=2000)
+    index.add("c.png", "https://a.example.com/y", "black", "white", 10, 100, created_at=3000)
+    entries, _ = index.list(10, url_prefix="https://a.example.com/")
+    assert [entry["filename"] for entry in entries] == ["a.png", "c.png"]
+    entries, _ = index.list(10, created_since=2000)
+    assert [entry["filename"] for entry in entries] == ["b.png", "c.png"]
+    index.remove("c.png")
+    assert index.get("c.png") is None
+
+
+def test_existing_files_are_backfilled(tmp_path):
+    directory = tmp_path / "qr_codes"
+    storage = DirectoryStorage(directory)
+    storage.save(qr_code_filename("https://example.com/old"), b"png")
+    sharded = qr_code_filename("https://example.com/sharded", layout="sharded")
+    storage.save(sharded, b"sharded")
+    index = QRCodeIndex(tmp_path / "index.sqlite", directory)
+    # Nothing is scanned on first use
+    assert index.list(10)[0] == []
+    assert index.backfill(storage) == 2
+    # Only once per database, even for another process's index
+    assert QRCodeIndex(tmp_path / "index.sqlite", directory).backfill(storage) == 0
+    entries, _ = index.list(10)
+    index.close()
+    assert sorted((entry["url"], entry["size_bytes"]) for entry in entries) == [("", 7), ("https://example.com/old", 3)]
+    assert sharded in {entry["filename"] for entry in entries}
+
+
+def test_segment_stored_codes_are_backfilled(tmp_path):
+    segments = SegmentStorage(tmp_path / "segments", max_segment_bytes=1 << 20)
+    qr_filename = qr_code_filename("https://example.com/segment")
+    segments.save(qr_filename, b"image")
+    index = QRCodeIndex(tmp_path / "index.sqlite", tmp_path / "qr_codes")
+    assert index.backfill(segments) == 1
+    assert index.get(qr_filename)["url"] == "https://example.com/segment"
+    index.close()
+    segments.close()
+
+
+def test_list_endpoint_pages_and_rejects_bad_cursor(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    created = set()
+    for i in range(3):
+        response = client.post("/qr-codes/", json={"url": f"https://example.com/page/{i}"}, headers=headers)
+        assert response.status_code == 201
+        created.add(response.json()["links"]["self"])
+    client.post("/qr-codes/", json={"url": "https://example.com/other"}, headers=headers)
+
+    pages, params = [], {"limit": 2, "url_prefix": "https://example.com/page/"}
+    while True:
+        response = client.get("/qr-codes/", params=params, headers=headers)
+        assert response.status_code == 200
+        pages.append([item["links"]["self"] for item in response.json()])
+        if "x-next-cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["x-next-cursor"]
+    assert [len(page) for page in pages] == [2, 1]
+    assert set(pages[0] + pages[1]) == created
+    assert client.get("/qr-codes/", params={"cursor": "???"}, headers=headers).status_code == 400
+
+
+def test_version_1_database_is_migrated(tmp_path):
+    import sqlite3
+
+    db_path = tmp_path / "index.sqlite"
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE qr_codes (filename TEXT PRIMARY KEY, url TEXT NOT NULL, fill_color TEXT, back_color TEXT,
+                               size INTEGER, size_bytes INTEGER NOT NULL, created_at REAL NOT NULL);
+        INSERT INTO qr_codes VALUES ('old.png', 'https://example.com/old', 'black', 'white', 10, 100, 1000);
+        PRAGMA user_version=1;
+    """)
+    conn.close()
+    index = QRCodeIndex(db_path, tmp_path / "qr_codes")
+    assert index.get("old.png")["error_correction"] == "M"
+    index.add("new.png", "https://example.com/new", "black", "white", 10, 100, error_correction="H", mask=3)
+    assert (index.get("new.png")["error_correction"], index.get("new.png")["mask"]) == ("H", "3")
+    index.close()
+
+
+def test_list_endpoint_items_match_the_documented_model(client, access_token, isolated_storage):
+    from app.schema import QRCodeResponse
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    client.post("/qr-codes/", json={"url": "https://example.com/page/model", "size": 2}, headers=headers)
+    response = client.get("/qr-codes/", params={"url_prefix": "https://example.com/page/model"}, headers=headers)
+    assert response.headers["content-type"] == "application/json"
+    items = response.json()
+    assert len(items) == 1 and all(QRCodeResponse.model_validate(item).model_dump() == item for item in items)
+    schema = client.get("/openapi.json").json()["paths"]["/qr-codes/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema["items"]["$ref"] == "#/components/schemas/QRCodeResponse"
+
+
+def test_backfill_waits_for_another_workers_backfill(tmp_path):
+    import sqlite3
+    import threading
+
+    storage = DirectoryStorage(tmp_path / "qr_codes")
+    storage.save(qr_code_filename("https://example.com/waits"), b"png")
+    index = QRCodeIndex(tmp_path / "index.sqlite", tmp_path / "qr_codes")
+    index.get("warm-up")
+    # Another worker holds the write lock while it backfills
+    other = sqlite3.connect(tmp_path / "index.sqlite", isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    results = []
+    thread = threading.Thread(target=lambda: results.append(index.backfill(storage)))
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+    other.execute("PRAGMA user_version=3")
+    other.execute("COMMIT")
+    thread.join(5)
+    other.close()
+    index.close()
+    assert results == [0]
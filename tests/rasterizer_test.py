@@ -0,0 +1,40 @@
+import io
+import pytest
+from PIL import Image
+from app.services.qr_service import render_qr_code
+
+
+def _pixels(png_bytes):
+    with Image.open(io.BytesIO(png_bytes)) as img:
+        return img.size, img.convert("RGB").tobytes()
+
+
+@pytest.mark.parametrize("fill_color,back_color,size", [
+    ("black", "white", 10),
+    ("black", "white", 1),
+    ("red", "white", 3),
+    ("#1a2b3c", "yellow", 7),
+    ("white", "black", 2),
+])
+def test_fast_engine_matches_pil_pixels(fill_color, back_color, size):
+    data = "https://example.com/" + "path/" * 20
+    fast = render_qr_code(data, fill_color, back_color, size, engine="fast")
+    pil = render_qr_code(data, fill_color, back_color, size, engine="pil")
+    assert _pixels(fast) == _pixels(pil)
+
+
+@pytest.mark.parametrize("mask", ["fast", 3])
+def test_pil_engine_draws_the_requested_mask(mask):
+    # Long digit runs make "fast" (one byte segment) encode differently from "auto"
+    data = "https://example.com/" + "1234567890" * 5
+    fast = render_qr_code(data, size=2, engine="fast", mask=mask)
+    pil = render_qr_code(data, size=2, engine="pil", mask=mask)
+    assert _pixels(fast) == _pixels(pil)
+
+
+def test_fast_engine_writes_one_bit_images():
+    with Image.open(io.BytesIO(render_qr_code("https://example.com", "blue", "white", 5, engine="fast"))) as img:
+        assert img.mode == "P"
+        assert len(img.getpalette()) == 6
+    with Image.open(io.BytesIO(render_qr_code("https://example.com", engine="fast"))) as img:
+        assert img.mode == "1"
@@ -0,0 +1,47 @@
+from app.services.render_cache import RenderCache, render_cache
+from app.utils.common import decode_qr_code_filename, qr_code_filename
+
+
+def test_filename_depends_on_style():
+    default = qr_code_filename("https://example.com")
+    assert default == "aHR0cHMlM0EvL2V4YW1wbGUuY29t.png"
+    red = qr_code_filename("https://example.com", fill_color="red")
+    large = qr_code_filename("https://example.com", size=20)
+    assert len({default, red, large}) == 3
+    assert all(decode_qr_code_filename(name) == "https://example.com" for name in (default, red, large))
+
+
+def test_cache_evicts_least_recently_used_over_cap():
+    cache = RenderCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_repeated_create_returns_the_stored_code(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    qr_request = {"url": "https://example.com/render-cache", "fill_color": "purple", "size": 7}
+    first = client.post("/qr-codes/", json=qr_request, headers=headers)
+    second = client.post("/qr-codes/", json=qr_request, headers=headers)
+    assert first.status_code in [200, 201]
+    assert second.status_code == 200
+    assert second.json()["qr_code_url"] == first.json()["qr_code_url"]
+    other_style = client.post("/qr-codes/", json={**qr_request, "fill_color": "blue"}, headers=headers)
+    assert other_style.json()["qr_code_url"] != first.json()["qr_code_url"]
+
+
+def test_created_code_is_rendered_from_cache(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    qr_request = {"url": "https://example.com/render-cache-hit", "fill_color": "purple", "size": 7}
+    created = client.post("/qr-codes/", json=qr_request, headers=headers)
+    assert created.status_code == 201
+    before = render_cache.stats()
+    rendered = client.get("/qr-codes/render", params=qr_request, headers=headers)
+    assert rendered.status_code == 200
+    after = render_cache.stats()
+    assert (after["hits"], after["misses"]) == (before["hits"] + 1, before["misses"])
+    assert rendered.content == isolated_storage.joinpath(created.json()["links"]["self"].rsplit("/", 1)[1]).read_bytes()
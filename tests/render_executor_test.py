@@ -0,0 +1,28 @@
+import asyncio
+import time
+import pytest
+from app.services.render_executor import RenderExecutor, RenderQueueFullError
+
+
+def test_submit_runs_on_pool():
+    executor = RenderExecutor(pool_size=1, queue_depth=1)
+    try:
+        assert asyncio.run(executor.submit(pow, 2, 10)) == 1024
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
+
+
+def test_submit_rejects_when_queue_is_full():
+    executor = RenderExecutor(pool_size=0, queue_depth=1)
+
+    async def run():
+        first = asyncio.ensure_future(executor.submit(time.sleep, 0.2))
+        second = asyncio.ensure_future(executor.submit(time.sleep, 0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(RenderQueueFullError):
+            await executor.submit(time.sleep, 0.2)
+        await asyncio.gather(first, second)
+
+    asyncio.run(run())
+    assert executor.pending == 0
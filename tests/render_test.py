@@ -0,0 +1,33 @@
+def test_render_returns_png_with_cache_headers(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    params = {"url": "https://example.com/render", "fill_color": "blue", "size": 4}
+    response = client.get("/qr-codes/render", params=params, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
+    assert "max-age" in response.headers["cache-control"]
+
+    etag = response.headers["etag"]
+    assert client.get("/qr-codes/render", params=params, headers=headers).headers["etag"] == etag
+    cached = client.get("/qr-codes/render", params=params, headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    other = client.get("/qr-codes/render", params={**params, "size": 5}, headers=headers)
+    assert other.headers["etag"] != etag
+
+
+def test_render_validates_parameters(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.get("/qr-codes/render", params={"url": "not-a-url"}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_etag_changes_with_the_renderer_and_the_stored_version(monkeypatch):
+    from app.utils import common
+
+    etag = common.qr_code_etag("code.png")
+    monkeypatch.setattr(common, "RENDER_VERSION", common.RENDER_VERSION + 1)
+    assert common.qr_code_etag("code.png") != etag
+    # A stored image keeps the ETag of when it was stored, whatever renders now
+    assert common.qr_code_etag("code.png", 1000.0) == common.qr_code_etag("code.png", 1000.0)
+    assert common.qr_code_etag("code.png", 1000.0) != common.qr_code_etag("code.png", 2000.0)
@@ -0,0 +1,66 @@
+import asyncio
+import uuid
+import httpx
+from app.main import app
+from app.services.metrics import render_coalesced, render_stage_latency
+from app.services.qr_index import qr_index
+from app.services.single_flight import SingleFlight, host_lock
+from app.services.storage import get_storage
+from app.utils.common import qr_code_filename
+
+
+def test_single_flight_shares_one_call():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+        assert len(flights) == 0
+        return results
+
+    assert asyncio.run(main()) == [1] * 5
+
+
+def test_concurrent_identical_creates_render_once(access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    qr_request = {"url": f"https://example.com/viral-{uuid.uuid4().hex}", "size": 2}
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/qr-codes/", json=qr_request, headers=headers) for _ in range(10)))
+
+    renders = render_stage_latency.count("make")
+    coalesced = render_coalesced.value("worker")
+    responses = asyncio.run(main())
+    assert [response.status_code for response in responses] == [201] * 10
+    assert render_stage_latency.count("make") == renders + 1
+    assert render_coalesced.value("worker") == coalesced + 9
+
+
+def test_create_waits_for_another_worker_holding_the_lock(access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    url = f"https://example.com/other-worker-{uuid.uuid4().hex}"
+    qr_filename = qr_code_filename(url, size=2)
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Stands in for another worker that is rendering the same code
+            async with host_lock(qr_filename):
+                create = asyncio.ensure_future(client.post("/qr-codes/", json={"url": url, "size": 2}, headers=headers))
+                await asyncio.sleep(0.05)
+                assert not create.done()
+                get_storage().save(qr_filename, b"image")
+                qr_index.add(qr_filename, url, "black", "white", 2, 100)
+            return await create
+
+    coalesced = render_coalesced.value("host")
+    response = asyncio.run(main())
+    assert response.status_code == 200
+    assert render_coalesced.value("host") == coalesced + 1
@@ -0,0 +1,55 @@
+from app.migrate_storage import migrate
+from app.services.qr_index import QRCodeIndex
+from app.utils.common import qr_code_filename, qr_code_relpath
+
+
+def test_sharded_names_have_fixed_length():
+    long_url = "https://example.com/" + "x" * 2000
+    name = qr_code_filename(long_url, layout="sharded")
+    assert len(name) == len("0" * 32 + ".png")
+    assert name != qr_code_filename(long_url, fill_color="red", layout="sharded")
+    assert qr_code_relpath(name) == f"{name[:2]}/{name[2:4]}/{name}"
+
+
+def test_flat_names_resolve_in_place():
+    name = qr_code_filename("https://example.com", layout="flat")
+    assert qr_code_relpath(name) == name
+
+
+def test_migrate_moves_flat_files_into_shards(tmp_path):
+    directory = tmp_path / "qr_codes"
+    directory.mkdir()
+    index = QRCodeIndex(tmp_path / "index.sqlite", directory)
+    default_name = qr_code_filename("https://example.com/a", layout="flat")
+    styled_name = qr_code_filename("https://example.com/b", fill_color="red", size=3, layout="flat")
+    (directory / default_name).write_bytes(b"a")
+    (directory / styled_name).write_bytes(b"b")
+    index.add(styled_name, "https://example.com/b", "red", "white", 3, 1)
+
+    counts = migrate(directory, index)
+
+    assert counts == {"moved": 2, "duplicates": 0, "skipped": 0}
+    sharded_default = qr_code_filename("https://example.com/a", layout="sharded")
+    sharded_styled = qr_code_filename("https://example.com/b", fill_color="red", size=3, layout="sharded")
+    assert (directory / qr_code_relpath(sharded_default)).read_bytes() == b"a"
+    assert (directory / qr_code_relpath(sharded_styled)).read_bytes() == b"b"
+    assert not (directory / default_name).exists()
+    assert index.get(sharded_styled)["url"] == "https://example.com/b"
+    # The default-style file had no index entry, and gets one under its new name
+    entry = index.get(sharded_default)
+    assert (entry["url"], entry["size"], entry["size_bytes"]) == ("https://example.com/a", 10, 1)
+    assert index.get(default_name) is None
+    index.close()
+
+
+def test_create_and_delete_with_sharded_layout(client, access_token, monkeypatch, isolated_storage):
+    from app.config import settings
+    monkeypatch.setattr(settings, "QR_STORAGE_LAYOUT", "sharded")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    url = "https://example.com/sharded/" + "y" * 400
+    response = client.post("/qr-codes/", json={"url": url}, headers=headers)
+    assert response.status_code in [200, 201]
+    name = qr_code_filename(url, layout="sharded")
+    assert response.json()["qr_code_url"].endswith(f"/{qr_code_relpath(name)}")
+    assert (settings.QR_DIRECTORY / qr_code_relpath(name)).exists()
+    assert client.delete(f"/qr-codes/{name}", headers=headers).status_code == 204
@@ -0,0 +1,81 @@
+import uuid
+import pytest
+from app.config import settings
+from app.services import storage as storage_module
+from app.services.storage import DirectoryStorage, SegmentStorage
+from app.utils import responses
+
+
+@pytest.fixture
+def segments(tmp_path):
+    storage = SegmentStorage(tmp_path / "segments", max_segment_bytes=4096)
+    yield storage
+    storage.close()
+
+
+def test_segments_round_trip_and_replace(segments):
+    segments.save("a.png", b"first")
+    segments.save("b.svg", b"<svg/>", format="svg")
+    segments.save("a.png", b"second")
+    assert sorted(segments.list()) == ["a.png", "b.svg"]
+    image = segments.read("a.png")
+    assert isinstance(image, memoryview) and image == b"second"
+    segments.delete("b.svg")
+    with pytest.raises(FileNotFoundError):
+        segments.read("b.svg")
+    with pytest.raises(FileNotFoundError):
+        segments.delete("b.svg")
+
+
+def test_segments_roll_over_and_compact(segments):
+    for i in range(12):
+        segments.save(f"{i:02d}.png", bytes([i]) * 1000)
+    assert segments.segments() == [1, 2, 3]
+    held = segments.read("00.png")
+    for i in range(1, 8):
+        segments.delete(f"{i:02d}.png")
+
+    # Only the first two segments are mostly dead; the newest one is never compacted
+    assert segments.compact(0.5) > 0
+    assert segments.segments()[0] == 3
+    for name in ["00.png"] + [f"{i:02d}.png" for i in range(8, 12)]:
+        assert segments.read(name) == bytes([int(name[:2])]) * 1000
+    # A slice read before compaction still holds the old mapping
+    assert held == bytes([0]) * 1000
+    assert segments.compact(0.5) == 0
+
+
+def test_directory_storage_matches_the_download_layout(tmp_path):
+    storage = DirectoryStorage(tmp_path)
+    name = "0123456789abcdef0123456789abcdef.png"
+    storage.save(name, b"image")
+    assert (tmp_path / "01" / "23" / name).read_bytes() == b"image"
+    assert storage.read(name) == b"image"
+    storage.delete(name)
+    assert not storage.list()
+
+
+def test_download_route_streams_from_segments(client, access_token, tmp_path, monkeypatch):
+    segments = SegmentStorage(tmp_path / "segments", max_segment_bytes=1 << 20)
+    monkeypatch.setattr(storage_module, "_storage", segments)
+    monkeypatch.setattr(responses, "CHUNK_SIZE", 100)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.post("/qr-codes/", json={"url": f"https://example.com/segments-{uuid.uuid4()}", "size": 3}, headers=headers)
+    assert response.status_code == 201
+    download_url = response.json()["qr_code_url"]
+    qr_filename = download_url.rsplit("/", 1)[1]
+    assert not (settings.QR_DIRECTORY / qr_filename).exists()
+
+    path = download_url.split(settings.SERVER_BASE_URL, 1)[1]
+    download = client.get(path)
+    assert download.status_code == 200
+    assert download.headers["content-type"] == "image/png"
+    assert download.content == segments.read(qr_filename)
+    assert int(download.headers["content-length"]) == len(download.content) > 100
+    assert client.get(path, headers={"If-None-Match": download.headers["etag"]}).status_code == 304
+    # Only the path a code is linked under is served
+    assert client.get(f"/{settings.SERVER_DOWNLOAD_FOLDER}/ab/{qr_filename}").status_code == 404
+
+    assert client.delete(f"/qr-codes/{qr_filename}", headers=headers).status_code == 204
+    assert client.get(path).status_code == 404
+    segments.close()
@@ -0,0 +1,65 @@
+import asyncio
+import time
+import pytest
+from app.config import settings
+from app.services.qr_index import QRCodeIndex, qr_index
+from app.services.sweeper import Sweeper
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "QR_DIRECTORY", tmp_path / "qr_codes")
+    monkeypatch.setattr(settings, "RENDER_LOCK_DIR", tmp_path / "locks")
+    settings.QR_DIRECTORY.mkdir()
+    index = QRCodeIndex(tmp_path / "index.sqlite", settings.QR_DIRECTORY)
+    yield index
+    index.close()
+
+
+def _store(index, name, size_bytes=100, created_at=None, expires_at=None):
+    (settings.QR_DIRECTORY / name).write_bytes(b"x" * size_bytes)
+    index.add(name, f"https://example.com/{name}", "black", "white", 10, size_bytes,
+              created_at=created_at, expires_at=expires_at)
+
+
+def test_expired_codes_are_swept_in_batches(index):
+    now = time.time()
+    for i in range(5):
+        _store(index, f"expired{i}.png", expires_at=now - 10)
+    _store(index, "later.png", expires_at=now + 3600)
+    _store(index, "forever.png")
+    assert [entry["filename"] for entry in index.list(10)[0]] == ["later.png", "forever.png"]
+
+    counts = asyncio.run(Sweeper(index, interval=60, batch_size=2, batch_pause=0).sweep())
+    assert counts == {"expired": 5, "quota": 0}
+    assert sorted(path.name for path in settings.QR_DIRECTORY.iterdir()) == ["forever.png", "later.png"]
+    assert index.get("expired0.png") is None
+
+
+def test_quota_evicts_least_recently_used(index):
+    for i, name in enumerate(["a.png", "b.png", "c.png", "d.png"]):
+        _store(index, name, created_at=1000 + i)
+    index.touch("a.png")
+    counts = asyncio.run(Sweeper(index, interval=60, batch_size=10, batch_pause=0, quota_bytes=250).sweep())
+    assert counts == {"expired": 0, "quota": 2}
+    assert sorted(path.name for path in settings.QR_DIRECTORY.iterdir()) == ["a.png", "d.png"]
+    assert index.totals() == (2, 200)
+
+
+def test_codes_created_again_are_not_swept(index):
+    _store(index, "a.png", expires_at=time.time() - 10)
+    stale_entry = index.expired(10)[0]
+    _store(index, "a.png", created_at=time.time() + 1)
+    assert not index.remove_if_unchanged(stale_entry)
+    assert (settings.QR_DIRECTORY / "a.png").exists()
+
+
+def test_create_with_ttl(client, access_token, isolated_storage):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    qr_request = {"url": f"https://example.com/ttl-{time.time_ns()}", "size": 2, "ttl": 60}
+    response = client.post("/qr-codes/", json=qr_request, headers=headers)
+    assert response.status_code == 201
+    filename = response.json()["links"]["self"].rsplit("/", 1)[1]
+    assert 50 < qr_index.get(filename)["expires_at"] - time.time() <= 60
+    too_long = client.post("/qr-codes/", json={**qr_request, "ttl": settings.QR_MAX_TTL + 1}, headers=headers)
+    assert too_long.status_code == 422